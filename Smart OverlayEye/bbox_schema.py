@@ -0,0 +1,62 @@
+"""
+Output constraints for the bbox reply: a GBNF grammar and a JSON schema for the exact
+{"label", "x", "y", "w", "h", "confidence"} object, plus a max_tokens bound derived from them.
+
+With a grammar the server can only sample tokens that keep the reply valid, so the reply always
+parses and decoding stops at the closing brace.
+"""
+
+LABEL_MAX_CHARS = 48
+COORD_MAX_DIGITS = 5  # up to 99999 px
+
+BBOX_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "label": {"type": "string", "maxLength": LABEL_MAX_CHARS},
+        "x": {"type": "integer", "minimum": 0},
+        "y": {"type": "integer", "minimum": 0},
+        "w": {"type": "integer", "minimum": 0},
+        "h": {"type": "integer", "minimum": 0},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": ["label", "x", "y", "w", "h", "confidence"],
+    "additionalProperties": False,
+}
+
+# Fixed key order, optional single space after separators, bounded label and digit counts.
+BBOX_GBNF = rf"""
+root   ::= "{{" ws "\"label\":" ws label "," ws "\"x\":" ws coord "," ws "\"y\":" ws coord "," ws "\"w\":" ws coord "," ws "\"h\":" ws coord "," ws "\"confidence\":" ws conf ws "}}"
+label  ::= "\"" char{{0,{LABEL_MAX_CHARS}}} "\""
+char   ::= [^"\\\x7F\x00-\x1F]
+coord  ::= "0" | [1-9] [0-9]{{0,{COORD_MAX_DIGITS - 1}}}
+conf   ::= ("0" | "1") ("." [0-9]{{1,3}})?
+ws     ::= " "?
+""".strip()
+
+_SKELETON = '{ "label": "", "x": , "y": , "w": , "h": , "confidence":  }'
+
+
+def max_tokens_for_schema(label_max_chars: int = LABEL_MAX_CHARS, slack: int = 8) -> int:
+    """
+    Upper bound on decoded tokens for a grammar-conforming reply, assuming the worst case of one
+    token per character: skeleton + label + four coordinates + confidence ("0.123"), plus EOS slack.
+    """
+    return len(_SKELETON) + label_max_chars + 4 * COORD_MAX_DIGITS + 5 + slack
+
+
+def constrained_fields(mode: str) -> dict:
+    """
+    Extra request fields for a constraint mode:
+      "gbnf"   -> llama.cpp `grammar`
+      "schema" -> llama.cpp `json_schema` and llama-cpp-python `response_format.schema`
+      anything else -> {} (prompt-only JSON, as before)
+    """
+    if mode == "gbnf":
+        return {"grammar": BBOX_GBNF, "max_tokens": max_tokens_for_schema()}
+    if mode == "schema":
+        return {
+            "json_schema": BBOX_JSON_SCHEMA,
+            "response_format": {"type": "json_object", "schema": BBOX_JSON_SCHEMA},
+            "max_tokens": max_tokens_for_schema(),
+        }
+    return {}
@@ -0,0 +1,153 @@
+"""
+Benchmark OCR preprocessing against raw-capture OCR on the regression set.
+
+Per image and variant it reports preprocessing and Tesseract time, the share of task keywords
+found among the OCR words, and whether the best OCR line box hits the labelled box (IoU >= 0.5).
+Variants: raw RGB capture, grayscale + DPR downscale (+ dark inversion), and the same plus
+adaptive binarization, for every --xheight target. The capture DPR comes from each image's "dpr"
+label, else --dpr, else OCR_DPR; without any of them the run stops (there is no screen to ask).
+
+Examples:
+  python bench_ocr_preprocess.py --dataset regression_dataset --dpr 2
+  python bench_ocr_preprocess.py --dpr 2 --xheight 8,11,14,20 --repeat 3
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import pytesseract
+from PIL import Image
+from pytesseract import Output
+
+from coarse_to_fine import scale_ocr_data
+from eval_regression import iou
+from ocr_preprocess import preprocess_for_ocr
+from overlay_mvp import OCR_CONFIG, OCR_INVERT, capture_dpr, is_valid_bbox, set_capture_dpr, rank_ocr_lines, read_prompt, task_keywords, write_log
+
+
+def run_variant(img: Image.Image, task: str, dpr: float, xheight, binarize: bool) -> dict:
+    t0 = time.perf_counter()
+    if xheight is None:
+        ocr_img, scale = img, 1.0
+    else:
+        pre = preprocess_for_ocr(img, dpr=dpr, target_xheight=xheight, invert=OCR_INVERT, binarize=binarize)
+        ocr_img, scale = pre.image, pre.scale
+    t1 = time.perf_counter()
+    data = pytesseract.image_to_data(ocr_img, output_type=Output.DICT, config=OCR_CONFIG)
+    t2 = time.perf_counter()
+    data = scale_ocr_data(data, 1.0 / scale)
+    keywords = task_keywords(task)
+    words = {w.strip().lower() for w in data.get("text") or [] if w.strip()}
+    found = [k for k in keywords if any(k in w for w in words)]
+    bbox = None
+    for _score, _conf, line_bbox, label, _line in rank_ocr_lines(data, keywords):
+        if is_valid_bbox(line_bbox, label, img.size, log=False):
+            bbox = tuple(line_bbox)
+            break
+    return {
+        "prep_ms": (t1 - t0) * 1000,
+        "ocr_ms": (t2 - t1) * 1000,
+        "ocr_pixels": ocr_img.width * ocr_img.height,
+        "keyword_hit": len(found) / len(keywords) if keywords else None,
+        "bbox": bbox,
+    }
+
+
+def _stats(values: list[float]) -> dict:
+    if not values:
+        return {"mean": None, "p50": None, "p95": None}
+    ordered = sorted(values)
+    return {
+        "mean": round(statistics.mean(ordered), 1),
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 1),
+    }
+
+
+def summarize(rows: list[dict], variant: str) -> dict:
+    results = [r["variants"][variant] for r in rows]
+    hits = [v["keyword_hit"] for v in results if v["keyword_hit"] is not None]
+    return {
+        "prep_ms": _stats([v["prep_ms"] for v in results]),
+        "ocr_ms": _stats([v["ocr_ms"] for v in results]),
+        "keyword_hit_rate": round(sum(hits) / len(hits), 3) if hits else None,
+        "bbox_hits@0.5": sum(1 for v in results if v["iou"] >= 0.5),
+        "mean_iou": round(sum(v["iou"] for v in results) / max(1, len(results)), 3),
+    }
+
+
+def recommend_xheight(variants: dict, tolerance: float = 0.01):
+    """Smallest grayscale x-height that keeps the raw capture's keyword hit rate and box hits (None if none does)."""
+    raw = variants["raw"]
+    ok = []
+    for name, res in variants.items():
+        if not name.startswith("gray_x"):
+            continue
+        rate_ok = raw["keyword_hit_rate"] is None or (res["keyword_hit_rate"] or 0) >= raw["keyword_hit_rate"] - tolerance
+        if rate_ok and res["bbox_hits@0.5"] >= raw["bbox_hits@0.5"]:
+            ok.append(float(name[len("gray_x") :]))
+    return min(ok) if ok else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR preprocessing benchmark (time and keyword hit rate)")
+    parser.add_argument("--dataset", default="regression_dataset", help="Folder with images and labels.json")
+    parser.add_argument("--out", default="artifacts/ocr_preprocess_bench.json", help="Where to save results")
+    parser.add_argument("--dpr", type=float, default=None, help='DPR of images without a "dpr" label (default: OCR_DPR)')
+    parser.add_argument("--xheight", default="8,11,14,20", help="Comma-separated target x-heights to try")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per image and variant (times = median)")
+    args = parser.parse_args()
+
+    data_dir = Path(args.dataset)
+    labels_path = data_dir / "labels.json"
+    if not labels_path.exists():
+        raise SystemExit(f"No labels.json in {data_dir}")
+    labels = json.loads(labels_path.read_text())
+    set_capture_dpr(args.dpr)
+    dpr = None
+    if not all(meta.get("dpr") for meta in labels.values()):
+        try:
+            dpr = capture_dpr()
+        except RuntimeError as exc:
+            raise SystemExit(str(exc))
+    variants = {"raw": (None, False)}
+    for xh in (float(v) for v in args.xheight.split(",") if v.strip()):
+        variants[f"gray_x{xh:g}"] = (xh, False)
+        variants[f"binarized_x{xh:g}"] = (xh, True)
+
+    rows = []
+    for fname, meta in labels.items():
+        img_path = data_dir / fname
+        if not img_path.exists():
+            continue
+        img = Image.open(img_path).convert("RGB")
+        task = meta.get("task") or read_prompt().strip() or "Highlight the primary action button."
+        gt = tuple(meta["bbox"])
+        img_dpr = float(meta["dpr"]) if meta.get("dpr") else dpr
+        row = {"file": fname, "task": task, "gt_bbox": gt, "img_size": img.size, "dpr": img_dpr, "variants": {}}
+        for name, (xheight, binarize) in variants.items():
+            runs = [run_variant(img, task, img_dpr, xheight, binarize) for _ in range(max(1, args.repeat))]
+            res = dict(runs[0])
+            for key in ("prep_ms", "ocr_ms"):
+                res[key] = round(statistics.median(r[key] for r in runs), 1)
+            res["iou"] = round(iou(res["bbox"], gt), 3) if res["bbox"] else 0.0
+            row["variants"][name] = res
+        rows.append(row)
+        write_log("H_eval", "bench:ocr_preprocess", "benchmarked image", row)
+
+    summary = {
+        "count": len(rows),
+        "config": {"dpr": dpr, "xheight": args.xheight, "invert": OCR_INVERT, "ocr_config": OCR_CONFIG, "repeat": args.repeat},
+        "variants": {name: summarize(rows, name) for name in variants} if rows else {},
+        "results": rows,
+    }
+    summary["recommended_xheight"] = recommend_xheight(summary["variants"]) if rows else None
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(summary, indent=2))
+    print(json.dumps({k: v for k, v in summary.items() if k != "results"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
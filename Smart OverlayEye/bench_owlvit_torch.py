@@ -0,0 +1,113 @@
+"""
+Benchmark the CPU torch fallback: transformers pipeline vs OwlViTTorchCPU variants.
+
+Runs on the synthetic calibration screenshots from model_select (or --dataset images) and
+reports load time, warmup, median per-image latency and hits@0.5 per variant. Variants: the
+pipeline the fallback used to build, then OwlViTTorchCPU at each --precision x --threads
+(and with torch.compile when --compile is given).
+
+Examples:
+  python bench_owlvit_torch.py
+  python bench_owlvit_torch.py --precision fp32,int8,bf16 --threads 2,4 --compile
+  python bench_owlvit_torch.py --model google/owlvit-base-patch16 --runs 5
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from model_select import calibration_set, measure_variant
+from owlvit_detector import _top_candidates
+from owlvit_torch_cpu import OwlViTTorchCPU, set_torch_threads
+
+
+def _pipeline_factory(model_id: str, threads: int):
+    def factory(variant: dict):
+        from transformers import pipeline
+
+        set_torch_threads(threads)
+        t0 = time.perf_counter()
+        det = pipeline("zero-shot-object-detection", model=model_id, device=-1)
+        variant["load_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        def run(img: Image.Image, task: str):
+            outputs = det(img, candidate_labels=[task], threshold=0.05)
+            if not outputs:
+                return None
+            best = max(outputs, key=lambda r: r["score"])
+            box = best["box"]
+            return (box["xmin"], box["ymin"], box["xmax"] - box["xmin"], box["ymax"] - box["ymin"]), task, best["score"]
+
+        return run
+
+    return factory
+
+
+def _cpu_factory(model_id: str, threads: int, precision: str, compile: bool):
+    def factory(variant: dict):
+        t0 = time.perf_counter()
+        det = OwlViTTorchCPU(model_id, threads=threads, precision=precision, compile=compile)
+        variant["load_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        def run(img: Image.Image, task: str):
+            cands = _top_candidates(det.detect(img, [task], threshold=0.05), 1, 0.05, lambda _label: task)
+            return cands[0] if cands else None
+
+        return run
+
+    return factory
+
+
+def dataset_samples(data_dir: Path) -> list:
+    labels = json.loads((data_dir / "labels.json").read_text())
+    samples = []
+    for fname, meta in labels.items():
+        if (data_dir / fname).exists() and meta.get("task"):
+            with Image.open(data_dir / fname) as im:
+                samples.append((im.convert("RGB"), meta["task"], tuple(meta["bbox"])))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OWL-ViT torch CPU fallback benchmark")
+    parser.add_argument("--model", default="google/owlvit-base-patch32")
+    parser.add_argument("--precision", default="fp32,int8", help="Comma-separated OwlViTTorchCPU precisions (fp32, int8, bf16)")
+    parser.add_argument("--threads", default="0", help="Comma-separated intra-op thread counts (0 = torch default)")
+    parser.add_argument("--compile", action="store_true", help="Also time torch.compile variants")
+    parser.add_argument("--dataset", default=None, help="labels.json folder to use instead of the synthetic set (needs tasks)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--out", default="artifacts/owlvit_torch_bench.json")
+    args = parser.parse_args()
+
+    samples = dataset_samples(Path(args.dataset)) if args.dataset else calibration_set()
+    threads = [int(t) for t in args.threads.split(",") if t.strip()]
+    precisions = [p.strip() for p in args.precision.split(",") if p.strip()]
+    variants = []
+    for n in threads:
+        variants.append(({"name": f"pipeline/t{n}", "accuracy": 0.0}, _pipeline_factory(args.model, n)))
+        for precision in precisions:
+            for compile in (False, True) if args.compile else (False,):
+                name = f"cpu-{precision}{'-compile' if compile else ''}/t{n}"
+                variants.append(({"name": name, "accuracy": 0.0}, _cpu_factory(args.model, n, precision, compile)))
+
+    results = []
+    for variant, factory in variants:
+        res = measure_variant(variant, samples, runs=args.runs, detect_factory=factory)
+        res.pop("accuracy", None)
+        results.append(res)
+        print(json.dumps(res))
+    baseline = {r["name"].split("/")[1]: r["latency_ms"] for r in results if r["name"].startswith("pipeline/") and r.get("ok")}
+    for r in results:
+        base = baseline.get(r["name"].split("/")[1])
+        if r.get("ok") and base:
+            r["speedup_vs_pipeline"] = round(base / r["latency_ms"], 2)
+    report = {"model": args.model, "images": len(samples), "runs": args.runs, "results": results}
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
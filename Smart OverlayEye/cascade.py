@@ -0,0 +1,297 @@
+"""
+Adaptive ordering of the detection backends (OWL-ViT, vision LLM, OCR).
+
+A rolling window of per-stage outcomes (valid box or not, and time spent) is kept per task
+bucket (text-like / icon-like / other). Each request gets a plan that orders the stages to
+minimize expected time-to-valid-box, i.e. by latency / success rate, and skips stages that
+have kept failing in that bucket (re-trying them occasionally). Priors cover stages with no history.
+Every plan and its outcome is appended to a JSONL decision log for offline evaluation.
+
+Examples:
+  python cascade.py                 # summarize the decision log
+  python cascade.py --log path.jsonl
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+CACHE_DIR = Path.home() / ".cache" / "overlayeye"
+HISTORY_PATH = Path(os.environ.get("CASCADE_HISTORY", CACHE_DIR / "cascade_history.json"))
+DECISION_LOG_PATH = Path(os.environ.get("CASCADE_DECISIONS", CACHE_DIR / "cascade_decisions.jsonl"))
+
+DEFAULT_ORDER = ("owlvit", "llava", "ocr")
+# Latency priors (ms) used until a stage has samples in a bucket.
+PRIOR_LATENCY_MS = {"owlvit": 800.0, "llava": 8000.0, "ocr": 30.0}
+# Stages that only answer text targets: first in the "text" bucket, but elsewhere they go last
+# until they have min_samples of history there (OCR cannot find a gear icon, however cheap it is).
+TEXT_STAGES = {"ocr"}
+
+ICON_WORDS = {"icon", "logo", "symbol", "gear", "cog", "arrow", "avatar", "image", "picture", "thumbnail", "checkbox", "toggle", "slider"}
+
+
+def task_bucket(task: str, keywords: Iterable[str], ocr_text: str) -> str:
+    """
+    "text" when a task keyword is visible in the OCR text, "icon" when the task names a glyph-like
+    target, "other" otherwise.
+    """
+    words = set(re.findall(r"[a-z0-9]+", (ocr_text or "").lower()))
+    if any(len(k) >= 2 and k in words for k in keywords):
+        return "text"
+    if ICON_WORDS & set(re.findall(r"[a-z]+", task.lower())):
+        return "icon"
+    return "other"
+
+
+def expected_ms(order: Iterable[str], estimates: dict) -> float:
+    """Expected time until the first stage returns a valid box (or all stages have run)."""
+    total, p_reach = 0.0, 1.0
+    for stage in order:
+        est = estimates[stage]
+        total += p_reach * est["latency_ms"]
+        p_reach *= 1.0 - est["p_success"]
+    return total
+
+
+@dataclass
+class Plan:
+    id: int
+    bucket: str
+    order: list
+    skipped: list
+    policy: str  # "adaptive" | "explore" | "fixed"
+    estimates: dict
+    started: float = field(default_factory=time.perf_counter)
+    outcomes: list = field(default_factory=list)
+    finished: bool = False
+
+    def split_at(self, stage: str) -> tuple[list, list]:
+        """Stages before `stage`, and `stage` onwards (e.g. local stages vs. those needing the LLM)."""
+        if stage not in self.order:
+            return list(self.order), []
+        i = self.order.index(stage)
+        return self.order[:i], self.order[i:]
+
+
+class CascadePlanner:
+    def __init__(
+        self,
+        stages: Iterable[str] = DEFAULT_ORDER,
+        adaptive: bool = True,
+        window: int = 50,
+        min_samples: int = 8,
+        skip_below: float = 0.05,
+        explore: float = 0.1,
+        history_path: Optional[Path] = HISTORY_PATH,
+        log_path: Optional[Path] = DECISION_LOG_PATH,
+    ):
+        self.stages = tuple(stages)
+        self.adaptive = adaptive
+        self.window = window
+        self.min_samples = min_samples
+        self.skip_below = skip_below
+        self.explore = explore
+        self.history_path = history_path
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history: dict[str, dict[str, deque]] = {}
+        self._load_history()
+
+    def _series(self, bucket: str, stage: str) -> deque:
+        return self._history.setdefault(bucket, {}).setdefault(stage, deque(maxlen=self.window))
+
+    def estimates(self, bucket: str) -> dict:
+        out = {}
+        with self._lock:
+            for stage in self.stages:
+                series = list(self._series(bucket, stage))
+                n = len(series)
+                ok = sum(1 for s, _ms in series if s)
+                out[stage] = {
+                    "n": n,
+                    # Laplace-smoothed success rate; 0.5 with no data.
+                    "p_success": (ok + 1) / (n + 2),
+                    "latency_ms": statistics.median(ms for _s, ms in series) if series else PRIOR_LATENCY_MS.get(stage, 1000.0),
+                }
+        return out
+
+    def plan(self, bucket: str, available: Optional[Iterable[str]] = None) -> Plan:
+        stages = [s for s in self.stages if available is None or s in set(available)]
+        est = self.estimates(bucket)
+        order, skipped = list(stages), []
+        if not self.adaptive:
+            policy = "fixed"
+        else:
+            # Optimal order for independent stages: ascending latency / success rate. Stages without
+            # history use the priors, so cheap OCR is tried first on text targets until it proves useless.
+            order = sorted(stages, key=lambda s: est[s]["latency_ms"] / max(1e-3, est[s]["p_success"]))
+            if bucket != "text":
+                unproven = [s for s in order if s in TEXT_STAGES and est[s]["n"] < self.min_samples]
+                order = [s for s in order if s not in unproven] + unproven
+            skipped = [s for s in order if est[s]["n"] >= self.min_samples and est[s]["p_success"] < self.skip_below]
+            kept = [s for s in order if s not in skipped] or order[:1]
+            policy = "adaptive"
+            if skipped and random.random() < self.explore:
+                # Keep sampling skipped stages now and then (last), so they can recover.
+                kept, policy = kept + [s for s in order if s not in kept], "explore"
+            skipped = [s for s in order if s not in kept]
+            order = kept
+        return Plan(
+            id=next(self._ids),
+            bucket=bucket,
+            order=order,
+            skipped=skipped,
+            policy=policy,
+            estimates={s: {k: round(v, 3) if isinstance(v, float) else v for k, v in est[s].items()} for s in stages},
+        )
+
+    def record(self, plan: Plan, stage: str, ok: bool, latency_ms: float):
+        with self._lock:
+            self._series(plan.bucket, stage).append((bool(ok), float(latency_ms)))
+        plan.outcomes.append({"stage": stage, "ok": bool(ok), "ms": round(latency_ms, 1)})
+
+    def finish(self, plan: Plan, winner: Optional[str], task: str = "", aborted: Optional[str] = None):
+        """Close the plan: append the decision and its outcome to the log, persist the history."""
+        if plan.finished:
+            return
+        plan.finished = True
+        entry = {
+            "ts": int(time.time() * 1000),
+            "plan": plan.id,
+            "task": task,
+            "bucket": plan.bucket,
+            "policy": plan.policy,
+            "order": plan.order,
+            "skipped": plan.skipped,
+            "estimates": plan.estimates,
+            "expected_ms": round(expected_ms(plan.order, plan.estimates), 1),
+            "default_expected_ms": round(expected_ms([s for s in self.stages if s in plan.estimates], plan.estimates), 1),
+            "outcomes": plan.outcomes,
+            "winner": winner,
+            "aborted": aborted,
+            "total_ms": round((time.perf_counter() - plan.started) * 1000, 1),
+        }
+        with self._lock:
+            if self.log_path is not None:
+                try:
+                    self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                    with self.log_path.open("a", encoding="utf-8") as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                except Exception:
+                    pass
+            self._save_history()
+        return entry
+
+    def run(
+        self,
+        plan: Plan,
+        stages: dict,
+        order: Optional[Iterable[str]] = None,
+        check: Optional[Callable[[str], None]] = None,
+        task: str = "",
+        finish: bool = True,
+    ):
+        """
+        Run stage callables (returning a result or None) in plan order until one succeeds.
+        Returns (result, stage) or (None, None). `check(stage)` runs before each stage and may raise
+        (e.g. JobCancelled); the plan is then closed as aborted and the exception propagates.
+        With finish=False an unsuccessful run leaves the plan open for a later `run` on the rest.
+        """
+        for stage in plan.order if order is None else order:
+            fn = stages.get(stage)
+            if fn is None:
+                continue
+            try:
+                if check is not None:
+                    check(stage)
+                t0 = time.perf_counter()
+                result = fn()
+            except Exception as exc:
+                self.finish(plan, None, task, aborted=f"{stage}: {type(exc).__name__}")
+                raise
+            self.record(plan, stage, result is not None, (time.perf_counter() - t0) * 1000)
+            if result is not None:
+                self.finish(plan, stage, task)
+                return result, stage
+        if finish:
+            self.finish(plan, None, task)
+        return None, None
+
+    def _load_history(self):
+        if self.history_path is None:
+            return
+        try:
+            raw = json.loads(self.history_path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        for bucket, stages in raw.items():
+            for stage, series in stages.items():
+                self._series(bucket, stage).extend((bool(s), float(ms)) for s, ms in series)
+
+    def _save_history(self):
+        if self.history_path is None:
+            return
+        try:
+            self.history_path.parent.mkdir(parents=True, exist_ok=True)
+            data = {b: {s: list(q) for s, q in st.items()} for b, st in self._history.items()}
+            self.history_path.write_text(json.dumps(data), encoding="utf-8")
+        except Exception:
+            pass
+
+
+def summarize(log_path: Path = DECISION_LOG_PATH) -> dict:
+    """Per bucket and policy: requests, hit rate, mean time-to-box, and per-stage outcomes."""
+    groups: dict = {}
+    with log_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except Exception:
+                continue
+            if e.get("aborted"):
+                continue
+            g = groups.setdefault(e["bucket"], {}).setdefault(e["policy"], {"n": 0, "hits": 0, "ms": [], "expected": [], "stages": {}})
+            g["n"] += 1
+            g["hits"] += 1 if e.get("winner") else 0
+            g["ms"].append(e["total_ms"])
+            g["expected"].append(e["expected_ms"])
+            for o in e.get("outcomes", []):
+                st = g["stages"].setdefault(o["stage"], {"runs": 0, "ok": 0, "ms": []})
+                st["runs"] += 1
+                st["ok"] += 1 if o["ok"] else 0
+                st["ms"].append(o["ms"])
+    report = {}
+    for bucket, policies in groups.items():
+        for policy, g in policies.items():
+            report.setdefault(bucket, {})[policy] = {
+                "requests": g["n"],
+                "hit_rate": round(g["hits"] / g["n"], 3),
+                "mean_total_ms": round(statistics.mean(g["ms"]), 1),
+                "mean_expected_ms": round(statistics.mean(g["expected"]), 1),
+                "stages": {
+                    s: {"runs": v["runs"], "success": round(v["ok"] / v["runs"], 3), "median_ms": round(statistics.median(v["ms"]), 1)}
+                    for s, v in g["stages"].items()
+                },
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize cascade planner decisions")
+    parser.add_argument("--log", default=str(DECISION_LOG_PATH))
+    args = parser.parse_args()
+    print(json.dumps(summarize(Path(args.log)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Geometry for coarse-to-fine detection.
+
+A cheap pass on a downscaled capture proposes a few boxes; detectors then run at full
+resolution on padded crops around them, and their boxes are mapped back to capture
+coordinates. The detectors themselves live in overlay_mvp (`coarse_pass`, `refine_coarse`).
+"""
+import math
+from typing import Callable, Iterable, Optional, Sequence
+
+from PIL import Image
+
+Box = tuple[int, int, int, int]
+
+
+def downscale(img: Image.Image, max_side: int) -> tuple[Image.Image, float]:
+    """
+    Shrink by the smallest integer factor that brings the longer side to at most max_side
+    (box-filter `reduce`, several times faster than resize on big captures).
+    Returns (image, scale small/full).
+    """
+    factor = math.ceil(max(img.size) / float(max_side))
+    if factor <= 1:
+        return img, 1.0
+    small = img.reduce(factor)
+    return small, small.width / float(img.width)
+
+
+def scale_box(bbox: Sequence[int], factor: float) -> Box:
+    x, y, w, h = bbox
+    return (int(round(x * factor)), int(round(y * factor)), int(round(w * factor)), int(round(h * factor)))
+
+
+def scale_ocr_data(data: Optional[dict], factor: float) -> Optional[dict]:
+    """Copy of pytesseract image_to_data output with word boxes scaled by factor."""
+    if data is None or factor == 1.0:
+        return data
+    out = dict(data)
+    for key in ("left", "top", "width", "height"):
+        if key in data:
+            out[key] = [int(round(int(v) * factor)) for v in data[key]]
+    return out
+
+
+def region_around(bbox: Sequence[int], img_size: tuple[int, int], pad: float = 1.0, min_side: int = 384) -> Box:
+    """Crop rect around bbox: padded by `pad` x its size on each side, at least min_side, clamped to the image."""
+    img_w, img_h = img_size
+    x, y, w, h = bbox
+    cw = min(img_w, max(min_side, int(w * (1 + 2 * pad))))
+    ch = min(img_h, max(min_side, int(h * (1 + 2 * pad))))
+    cx, cy = x + w / 2.0, y + h / 2.0
+    left = int(min(max(0, cx - cw / 2.0), img_w - cw))
+    top = int(min(max(0, cy - ch / 2.0), img_h - ch))
+    return (left, top, cw, ch)
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _union(a: Box, b: Box) -> Box:
+    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def merge_regions(regions: Iterable[Box], limit: int) -> list[Box]:
+    """Union overlapping crop rects (in proposal order) so no pixel is refined twice; keep at most limit."""
+    merged: list[Box] = []
+    for region in regions:
+        for i, existing in enumerate(merged):
+            if _overlaps(region, existing):
+                merged[i] = _union(region, existing)
+                break
+        else:
+            merged.append(tuple(region))
+    # A union can grow into a later rect; one more pass settles it.
+    settled: list[Box] = []
+    for region in merged:
+        for i, existing in enumerate(settled):
+            if _overlaps(region, existing):
+                settled[i] = _union(region, existing)
+                break
+        else:
+            settled.append(region)
+    return settled[:limit]
+
+
+def map_from_crop(bbox: Sequence[int], region: Box) -> Box:
+    x, y, w, h = bbox
+    return (int(x) + region[0], int(y) + region[1], int(w), int(h))
+
+
+def refine_in_regions(
+    img: Image.Image,
+    regions: Sequence[Box],
+    detect: Callable[[Image.Image], list],
+) -> list:
+    """Run detect(crop) -> [(bbox, label, score), ...] on every region; boxes mapped back, best first."""
+    found = []
+    for region in regions:
+        left, top, w, h = region
+        crop = img.crop((left, top, left + w, top + h))
+        for bbox, label, score in detect(crop):
+            found.append((map_from_crop(bbox, region), label, float(score)))
+    found.sort(key=lambda c: c[2], reverse=True)
+    return found
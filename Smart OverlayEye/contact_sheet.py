@@ -0,0 +1,86 @@
+"""
+Numbered contact sheet of candidate boxes for LLM verification.
+
+Instead of asking the vision LLM for pixel coordinates on the full screenshot, candidates
+from OWL-ViT and OCR are cropped (with some context), outlined, numbered and tiled into one
+small image. The LLM then only has to answer with an index.
+"""
+from typing import Sequence
+
+from PIL import Image, ImageDraw, ImageFont
+
+Candidate = tuple[tuple[int, int, int, int], str, float]
+
+
+def box_iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    if inter == 0:
+        return 0.0
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def dedupe_candidates(candidates: Sequence[Candidate], max_iou: float = 0.7, limit: int = 8) -> list[Candidate]:
+    """Keep candidates in order, dropping any that overlap an earlier one by more than max_iou."""
+    kept: list[Candidate] = []
+    for cand in candidates:
+        if any(box_iou(cand[0], k[0]) > max_iou for k in kept):
+            continue
+        kept.append(cand)
+        if len(kept) >= limit:
+            break
+    return kept
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.truetype("Menlo.ttc", size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def render_contact_sheet(
+    img: Image.Image,
+    candidates: Sequence[Candidate],
+    cell_size: tuple[int, int] = (240, 120),
+    columns: int = 4,
+) -> Image.Image:
+    """
+    Tile one thumbnail per candidate: crop with context, red outline around the candidate,
+    index (1-based) in the top-left corner of the cell.
+    """
+    cell_w, cell_h = cell_size
+    cols = max(1, min(columns, len(candidates)))
+    rows = max(1, (len(candidates) + cols - 1) // cols)
+    gap = 4
+    sheet = Image.new("RGB", (cols * (cell_w + gap) + gap, rows * (cell_h + gap) + gap), (255, 255, 255))
+    draw = ImageDraw.Draw(sheet)
+    font = _load_font(18)
+
+    for i, (bbox, _label, _score) in enumerate(candidates):
+        x, y, w, h = bbox
+        pad_x = max(24, w // 2)
+        pad_y = max(24, h)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(img.width, x + w + pad_x), min(img.height, y + h + pad_y)
+        crop = img.crop((x0, y0, x1, y1)).convert("RGB")
+        scale = min(cell_w / max(1, crop.width), cell_h / max(1, crop.height))
+        thumb = crop.resize((max(1, int(crop.width * scale)), max(1, int(crop.height * scale))), Image.BILINEAR)
+
+        col, row = i % cols, i // cols
+        ox = gap + col * (cell_w + gap) + (cell_w - thumb.width) // 2
+        oy = gap + row * (cell_h + gap) + (cell_h - thumb.height) // 2
+        sheet.paste(thumb, (ox, oy))
+        rx0 = ox + int((x - x0) * scale)
+        ry0 = oy + int((y - y0) * scale)
+        draw.rectangle([rx0, ry0, rx0 + max(1, int(w * scale)), ry0 + max(1, int(h * scale))], outline=(255, 0, 0), width=2)
+
+        tag = str(i + 1)
+        tx, ty = gap + col * (cell_w + gap) + 2, gap + row * (cell_h + gap) + 2
+        tb = draw.textbbox((tx, ty), tag, font=font)
+        draw.rectangle([tb[0] - 2, tb[1] - 2, tb[2] + 2, tb[3] + 2], fill=(0, 0, 0))
+        draw.text((tx, ty), tag, fill=(255, 255, 0), font=font)
+    return sheet
@@ -0,0 +1,475 @@
+"""
+Out-of-process detector worker: OWL-ViT (and optionally Tesseract) in a long-lived server process.
+
+The overlay keeps Qt and the hotkey listener in its own process; detection runs in
+`python detector_worker.py --serve`, which the client starts detached on first use, so a crash in
+a native backend cannot take the UI down and the models stay loaded across overlay restarts (the
+server exits after WORKER_IDLE_EXIT_S with no client connected).
+
+Frames go through `multiprocessing.shared_memory` (raw pixels, never pickled); requests and
+results are small tuples over a `multiprocessing.connection` socket:
+  client -> server: (req_id, op, frame, kwargs), frame = (shm name, mode, width, height) or None
+  server -> client: (req_id, ok, result or error string)
+The client pings the server periodically and restarts it when it dies, stops answering a ping
+(answered outside the op lock, so a long model load does not count), or reports an op running
+for longer than `hung_after_s` while no model is loading (a hung native call). A request that
+merely exceeds its own timeout only fails that request, so a slow first load (e.g. an optimum
+ONNX export) can finish and warm the worker.
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Optional
+
+from PIL import Image
+
+WORKER_IDLE_EXIT_S = float(os.environ.get("WORKER_IDLE_EXIT_S", "1800"))
+# An op still running after this long (with no model load in progress) counts as hung.
+WORKER_HUNG_S = float(os.environ.get("WORKER_HUNG_S", "120"))
+KEY_PATH = Path(os.environ.get("DETECTOR_WORKER_KEY", str(Path.home() / ".cache" / "overlayeye" / "detector_worker.key")))
+# Image features kept in the server for prefetch handles.
+FEATURE_CACHE_SIZE = 2
+_SHM_POOL_SIZE = 3
+_MB = 1 << 20
+_ATTACHED_LIMIT = 4
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+def default_address() -> str:
+    if sys.platform == "win32":
+        return r"\\.\pipe\overlayeye-detector"
+    user = hashlib.sha1(str(Path.home()).encode()).hexdigest()[:8]
+    return os.path.join(tempfile.gettempdir(), f"overlayeye-detector-{user}.sock")
+
+
+def _authkey() -> bytes:
+    """Shared secret for the socket, created on first use (readable by this user only)."""
+    if not KEY_PATH.exists():
+        KEY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as fh:
+            fh.write(secrets.token_hex(32))
+    return KEY_PATH.read_text().strip().encode()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to a client's segment without letting this process's resource tracker unlink it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+        return shm
+
+
+# --- Server -------------------------------------------------------------------
+class _Server:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.served = 0
+        self.attached: dict[str, shared_memory.SharedMemory] = {}
+        self.features: dict[int, dict] = {}
+        self.feature_ids = itertools.count(1)
+        self.last_client = time.monotonic()
+        self.clients = 0
+        # Backends are not thread-safe: requests from all clients run one at a time (except ping).
+        self.op_lock = threading.Lock()
+        self.busy: Optional[tuple[str, float]] = None  # (op, started) while an op runs
+
+    def frame(self, spec) -> Optional[Image.Image]:
+        if spec is None:
+            return None
+        name, mode, width, height = spec
+        shm = self.attached.get(name)
+        if shm is None:
+            while len(self.attached) >= _ATTACHED_LIMIT:
+                old = self.attached.pop(next(iter(self.attached)))
+                try:
+                    old.close()
+                except BufferError:
+                    pass
+            shm = self.attached[name] = _attach(name)
+        size = width * height * len(mode)
+        # Zero-copy view of the client's pixels; copied only if a backend converts it.
+        return Image.frombuffer(mode, (width, height), shm.buf[:size], "raw", mode, 0, 1)
+
+    def handle(self, op: str, img: Optional[Image.Image], kwargs: dict) -> Any:
+        import owlvit_detector
+
+        if op == "ping":
+            busy = self.busy
+            return {
+                "pid": os.getpid(),
+                "uptime_s": round(time.monotonic() - self.started, 1),
+                "served": self.served,
+                "busy": {"op": busy[0], "running_s": round(time.monotonic() - busy[1], 1)} if busy else None,
+                "memory": owlvit_detector.RESIDENCY.memory_report(wait=False),
+            }
+        if op == "touch":
+            owlvit_detector.RESIDENCY.notify_active()
+            return True
+        if op == "warmup":
+            owlvit_detector.warmup_owlvit(**kwargs)
+            return True
+        if op == "owlvit_features":
+            features = owlvit_detector.owlvit_image_features(img, **kwargs)
+            if features is None:
+                return None
+            key = next(self.feature_ids)
+            self.features[key] = features
+            while len(self.features) > FEATURE_CACHE_SIZE:
+                self.features.pop(next(iter(self.features)))
+            return {"backend": "worker", "key": key, "model": features["model"], "size": features["size"]}
+        if op == "owlvit_candidates":
+            handle = kwargs.pop("features", None)
+            features = self.features.get(handle["key"]) if handle else None
+            return owlvit_detector.detect_owlvit_candidates(img, features=features, **kwargs)
+        if op == "ocr_data":
+            import pytesseract
+            from pytesseract import Output
+
+            return pytesseract.image_to_data(img, output_type=Output.DICT, config=kwargs.get("config", ""))
+        raise WorkerError(f"unknown op {op!r}")
+
+    def run_op(self, conn, send_lock, req_id: int, op: str, spec, kwargs: dict):
+        try:
+            with self.op_lock:
+                self.busy = (op, time.monotonic())
+                try:
+                    result = (req_id, True, self.handle(op, self.frame(spec), kwargs))
+                finally:
+                    self.busy = None
+                self.served += 1
+        except Exception as exc:
+            result = (req_id, False, f"{type(exc).__name__}: {exc}")
+        try:
+            with send_lock:
+                conn.send(result)
+        except (EOFError, OSError):
+            pass
+
+    def serve_connection(self, conn):
+        self.clients += 1
+        send_lock = threading.Lock()
+        # Ops run one at a time off the read loop, so a ping is answered during a long model
+        # load or inference instead of queueing behind it (and getting the worker killed).
+        ops = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector-op")
+        try:
+            while True:
+                try:
+                    req_id, op, spec, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op == "shutdown":
+                    with send_lock:
+                        conn.send((req_id, True, True))
+                    os._exit(0)
+                if op == "ping":
+                    try:
+                        result = (req_id, True, self.handle(op, None, {}))
+                    except Exception as exc:
+                        result = (req_id, False, f"{type(exc).__name__}: {exc}")
+                    try:
+                        with send_lock:
+                            conn.send(result)
+                    except (EOFError, OSError):
+                        return
+                    continue
+                ops.submit(self.run_op, conn, send_lock, req_id, op, spec, kwargs or {})
+        finally:
+            ops.shutdown(wait=True, cancel_futures=True)
+            self.clients -= 1
+            self.last_client = time.monotonic()
+            conn.close()
+
+    def idle_watchdog(self, idle_exit_s: float):
+        while True:
+            time.sleep(min(30.0, idle_exit_s / 4))
+            if self.clients <= 0 and time.monotonic() - self.last_client > idle_exit_s:
+                os._exit(0)
+
+
+def serve(address: str, idle_exit_s: float = WORKER_IDLE_EXIT_S):
+    if sys.platform != "win32" and os.path.exists(address):
+        try:
+            Client(address, authkey=_authkey()).close()
+            return  # another server already owns the socket
+        except Exception:
+            os.unlink(address)
+    server = _Server()
+    if idle_exit_s > 0:
+        threading.Thread(target=server.idle_watchdog, args=(idle_exit_s,), daemon=True).start()
+    with Listener(address, authkey=_authkey()) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            threading.Thread(target=server.serve_connection, args=(conn,), daemon=True).start()
+
+
+# --- Client -------------------------------------------------------------------
+class DetectorClient:
+    def __init__(
+        self,
+        address: Optional[str] = None,
+        request_timeout_s: float = 30.0,
+        health_interval_s: float = 5.0,
+        start_timeout_s: float = 20.0,
+        hung_after_s: float = WORKER_HUNG_S,
+        on_event=None,
+    ):
+        self.address = address or default_address()
+        self.request_timeout_s = request_timeout_s
+        self.health_interval_s = health_interval_s
+        self.hung_after_s = hung_after_s
+        self.start_timeout_s = start_timeout_s
+        self.on_event = on_event
+        self.restarts = 0
+        self._conn = None
+        self._pid: Optional[int] = None
+        self._ids = itertools.count(1)
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._free_shm: list[shared_memory.SharedMemory] = []
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    # Connection management
+    def connect(self):
+        """Connect to a running server, starting one (detached) if none answers."""
+        with self._lock:
+            if self._conn is not None:
+                return
+            try:
+                conn = Client(self.address, authkey=_authkey())
+            except (OSError, EOFError):
+                conn = self._spawn_and_connect()
+            self._conn = conn
+            threading.Thread(target=self._reader, args=(conn,), name="detector-client-reader", daemon=True).start()
+        info = self.call("ping", timeout=self.start_timeout_s)
+        self._pid = info.get("pid")
+        self._emit("connected", {"pid": self._pid, "uptime_s": info.get("uptime_s")})
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._health_loop, name="detector-client-health", daemon=True)
+            self._monitor.start()
+
+    def _spawn_and_connect(self):
+        log = open(Path(__file__).resolve().parent / "detector_worker.log", "ab")
+        kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if sys.platform == "win32" else {"start_new_session": True}
+        proc = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--serve", "--address", self.address],
+            cwd=str(Path(__file__).resolve().parent),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            **kwargs,
+        )
+        log.close()
+        self._emit("spawned", {"pid": proc.pid})
+        deadline = time.monotonic() + self.start_timeout_s
+        while True:
+            try:
+                return Client(self.address, authkey=_authkey())
+            except (OSError, EOFError):
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise WorkerError(f"detector worker did not start (exit code {proc.poll()})")
+                time.sleep(0.1)
+
+    def _disconnect(self, reason: str):
+        with self._lock:
+            conn, self._conn = self._conn, None
+            pending, self._pending = self._pending, {}
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(WorkerError(f"detector worker lost: {reason}"))
+
+    def restart(self, reason: str):
+        """Kill the server (it may be hung) and start a fresh one."""
+        self.restarts += 1
+        self._emit("restart", {"reason": reason, "pid": self._pid, "restarts": self.restarts})
+        self._disconnect(reason)
+        if self._pid:
+            try:
+                os.kill(self._pid, 9)
+            except Exception:
+                pass
+        self._pid = None
+        self.connect()
+
+    def close(self, shutdown_server: bool = False):
+        self._stop.set()
+        if shutdown_server and self._conn is not None:
+            try:
+                self.call("shutdown", timeout=2.0)
+            except Exception:
+                pass
+        self._disconnect("closed")
+        for shm in self._free_shm:
+            shm.close()
+            shm.unlink()
+        self._free_shm.clear()
+
+    # Requests
+    def call(self, op: str, img: Optional[Image.Image] = None, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run `op` in the worker and wait for its result; raises WorkerError on failure or timeout."""
+        if self._conn is None:
+            self.connect()
+        shm = self._put_frame(img) if img is not None else None
+        spec = (shm.name, img.mode, img.width, img.height) if shm is not None else None
+        req_id = next(self._ids)
+        fut: Future = Future()
+        try:
+            with self._lock:
+                conn = self._conn
+                if conn is None:
+                    raise WorkerError("detector worker not connected")
+                self._pending[req_id] = fut
+            with self._send_lock:
+                conn.send((req_id, op, spec, kwargs))
+            try:
+                return fut.result(timeout=timeout or self.request_timeout_s)
+            except FutureTimeout:
+                with self._lock:
+                    self._pending.pop(req_id, None)
+                # Only this request fails; the health loop decides whether the worker is hung
+                # (killing it here would also kill a slow first model load, over and over).
+                raise WorkerError(f"{op} timed out")
+        except (OSError, EOFError) as exc:
+            self._disconnect(str(exc))
+            raise WorkerError(str(exc)) from exc
+        finally:
+            if shm is not None:
+                self._release(shm)
+
+    def post(self, op: str, **kwargs):
+        """Send `op` without waiting for (or keeping) its result; best effort."""
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            with self._send_lock:
+                conn.send((next(self._ids), op, None, kwargs))
+        except (OSError, EOFError):
+            pass
+
+    def _put_frame(self, img: Image.Image) -> shared_memory.SharedMemory:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        data = img.tobytes()
+        with self._lock:
+            shm = next((s for s in self._free_shm if s.size >= len(data)), None)
+            if shm is not None:
+                self._free_shm.remove(shm)
+        if shm is None:
+            # Round up to whole MB so small size changes (crops, another display) reuse the segment.
+            shm = shared_memory.SharedMemory(create=True, size=-(-len(data) // _MB) * _MB)
+        shm.buf[: len(data)] = data
+        return shm
+
+    def _release(self, shm: shared_memory.SharedMemory):
+        with self._lock:
+            self._free_shm.append(shm)
+            self._free_shm.sort(key=lambda s: s.size)
+            extra = self._free_shm[:-_SHM_POOL_SIZE] if len(self._free_shm) > _SHM_POOL_SIZE else []
+            self._free_shm = self._free_shm[len(extra) :]
+        for s in extra:
+            s.close()
+            s.unlink()
+
+    def _reader(self, conn):
+        while True:
+            try:
+                req_id, ok, payload = conn.recv()
+            except (EOFError, OSError):
+                if self._conn is conn:
+                    self._disconnect("connection closed")
+                return
+            with self._lock:
+                fut = self._pending.pop(req_id, None)
+            if fut is not None and not fut.done():
+                if ok:
+                    fut.set_result(payload)
+                else:
+                    fut.set_exception(WorkerError(payload))
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval_s):
+            try:
+                if self._conn is None:
+                    self.restart("disconnected")
+                    continue
+                info = self.call("ping", timeout=max(2.0, self.health_interval_s))
+                busy = info.get("busy")
+                loading = (info.get("memory") or {}).get("loading")
+                if busy and busy["running_s"] > self.hung_after_s and not loading:
+                    self.restart(f"{busy['op']} running for {busy['running_s']}s")
+            except Exception as exc:
+                try:
+                    self.restart(f"health check failed: {exc}")
+                except Exception as restart_exc:
+                    self._emit("restart_error", {"error": str(restart_exc)})
+
+    def _emit(self, event: str, data: dict):
+        if self.on_event is not None:
+            try:
+                self.on_event(event, data)
+            except Exception:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-process OWL-ViT/OCR detector worker")
+    parser.add_argument("--serve", action="store_true", help="Run the server (normally started by the overlay)")
+    parser.add_argument("--address", default=None, help="Socket path / pipe name (default: per-user temp socket)")
+    parser.add_argument("--idle-exit-s", type=float, default=WORKER_IDLE_EXIT_S, help="Exit after this long without a client (0 = never)")
+    parser.add_argument("--stop", action="store_true", help="Stop a running server")
+    args = parser.parse_args()
+    address = args.address or default_address()
+    if args.serve:
+        serve(address, args.idle_exit_s)
+        return
+    client = DetectorClient(address)
+    if args.stop:
+        try:
+            client._conn = Client(address, authkey=_authkey())
+        except (OSError, EOFError):
+            print("no detector worker running")
+            return
+        threading.Thread(target=client._reader, args=(client._conn,), daemon=True).start()
+        client.close(shutdown_server=True)
+        print("stopped")
+        return
+    client.connect()
+    print(client.call("ping"))
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
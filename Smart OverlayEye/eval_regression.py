@@ -1,18 +1,23 @@
 import argparse
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from PIL import Image
 
 from overlay_mvp import (
     run_ocr_data,
-    call_vision_llm,
-    find_bbox_via_ocr,
-    is_valid_bbox,
-    try_owlvit_detect,
+    locate_cascade,
     write_log,
     read_prompt,
+    llm_stats,
+    LLAMA_API_URLS,
+    get_llm_pool,
+    require_capture_dpr,
+    use_isolated_cascade_planner,
+    use_llm_slots,
 )
 
 
@@ -33,68 +38,85 @@ def iou(boxA, boxB):
     return interArea / float(boxAArea + boxBArea - interArea + 1e-6)
 
 
-def predict(img: Image.Image, task: str):
-    ocr_text, ocr_data = run_ocr_data(img)
+def predict(img: Image.Image, task: str, dpr=None):
+    ocr_text, ocr_data = run_ocr_data(img, dpr=dpr)
     if ocr_text is None:
         ocr_text = ""
 
-    # OWL-ViT first
-    owl = try_owlvit_detect(img, task)
-    if owl and is_valid_bbox(owl[0], owl[1], img.size):
-        return owl[0], owl[1], "owlvit"
-
-    # LLaVA
-    image_bytes = img.tobytes()  # placeholder; we need PNG bytes
-    # use encode_image_png from overlay_mvp
-    from overlay_mvp import encode_image_png
-
-    image_bytes = encode_image_png(img)
-    result = call_vision_llm(image_bytes, task, ocr_text, img.size)
-    if result and is_valid_bbox(result[0], result[1], img.size):
-        return result[0], result[1], "llava"
-
-    # OCR fallback
-    fallback = find_bbox_via_ocr(img, task, ocr_data)
-    if fallback and is_valid_bbox(fallback[0], fallback[1], img.size):
-        return fallback[0], fallback[1], "ocr"
-
-    return None, None, "none"
+    # Same planned backend order (OWL-ViT / LLaVA / OCR) as the hotkey pipeline.
+    bbox, label, backend, _plan = locate_cascade(img, task, ocr_text, ocr_data)
+    return bbox, label, backend
 
 
 def main():
     parser = argparse.ArgumentParser(description="Regression evaluator")
-    parser.add_argument("--dataset", default="regression_dataset", help="Folder with images and labels.json")
+    parser.add_argument(
+        "--dataset",
+        default="regression_dataset",
+        help="Folder with images and labels.json, or a pack dir from packed_dataset.py (frames are mapped, not decoded)",
+    )
     parser.add_argument("--out", default="artifacts/regression_results.json", help="Where to save results")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Images evaluated concurrently (default: total LLM pool capacity with LLAMA_API_URLS, else 1)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Let the cascade planner reorder backends (in-memory history only; default: fixed order)",
+    )
+    parser.add_argument(
+        "--dpr",
+        type=float,
+        default=None,
+        help='DPR the screenshots were captured at, for images without a "dpr" label (default: OCR_DPR)',
+    )
     args = parser.parse_args()
-
-    data_dir = Path(args.dataset)
-    labels_path = data_dir / "labels.json"
-    if not labels_path.exists():
-        raise SystemExit(f"No labels.json in {data_dir}")
-    labels = json.loads(labels_path.read_text())
-
-    results = []
-    for fname, meta in labels.items():
-        img_path = data_dir / fname
-        if not img_path.exists():
-            continue
-        img = Image.open(img_path).convert("RGB")
-        task = meta.get("task") or read_prompt().strip() or "Highlight the primary action button."
-        gt_bbox = tuple(meta["bbox"])
-        pred_bbox, pred_label, backend = predict(img, task)
+    # Regression numbers must not depend on the live app's history or on random exploration.
+    use_isolated_cascade_planner(adaptive=args.adaptive)
+
+    # numpy-backed; imported here so importing this module stays light.
+    from packed_dataset import is_packed, open_dataset
+
+    try:
+        dataset = open_dataset(args.dataset)
+    except FileNotFoundError as exc:
+        raise SystemExit(str(exc))
+    # No screen here to read the DPR from; guessing 1.0 would skip the Retina OCR downscale.
+    require_capture_dpr(args.dpr, labelled=all(dataset.label(i)["dpr"] for i in range(len(dataset))))
+
+    jobs = args.jobs or (get_llm_pool().capacity if LLAMA_API_URLS else 1)
+    pool = use_llm_slots(jobs)
+
+    def evaluate(i: int):
+        label = dataset.label(i)
+        t0 = time.perf_counter()
+        img: Image.Image = dataset.image(i)
+        load_ms = round((time.perf_counter() - t0) * 1000, 1)
+        task = label["task"] or read_prompt().strip() or "Highlight the primary action button."
+        gt_bbox = label["bbox"]
+        pred_bbox, pred_label, backend = predict(img, task, label["dpr"])
         score = iou(pred_bbox, gt_bbox) if pred_bbox else 0.0
-        results.append(
-            {
-                "file": fname,
-                "task": task,
-                "gt_bbox": gt_bbox,
-                "pred_bbox": pred_bbox,
-                "pred_label": pred_label,
-                "backend": backend,
-                "iou": score,
-            }
-        )
-        write_log("H_eval", "eval:item", "evaluated image", results[-1])
+        result = {
+            "file": label["file"],
+            "task": task,
+            "gt_bbox": gt_bbox,
+            "dpr": label["dpr"],
+            "pred_bbox": pred_bbox,
+            "pred_label": pred_label,
+            "backend": backend,
+            "iou": score,
+            "load_ms": load_ms,
+        }
+        write_log("H_eval", "eval:item", "evaluated image", result)
+        return result
+
+    # With several LLM servers the images overlap (threads share the one frame mapping);
+    # results keep label order either way.
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        results = [r for r in ex.map(evaluate, range(len(dataset))) if r is not None]
 
     mean_iou = sum(r["iou"] for r in results) / max(1, len(results))
     hits = sum(1 for r in results if r["iou"] >= 0.5)
@@ -102,6 +124,9 @@ def main():
         "count": len(results),
         "mean_iou": mean_iou,
         "hits@0.5": hits,
+        "dataset": {"path": args.dataset, "packed": is_packed(args.dataset), "load_ms": round(sum(r["load_ms"] for r in results), 1)},
+        "llm": llm_stats(),
+        "llm_pool": pool.snapshot(),
         "results": results,
     }
     Path(args.out).parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,241 @@
+"""
+Job scheduling for the overlay: a persistent worker pool where the newest request wins.
+
+Each hotkey becomes a Job. Submitting a new job cancels the in-flight one; pipelines call
+`job.check(stage)` between stages and run slow stages through `JobScheduler.run_stage` so
+cancellation and deadlines are honoured even while a model call is blocked.
+
+Each job runs its stages on its own small executor, so a superseded job's stragglers cannot
+starve the next one. A stage that times out or whose job is cancelled has its cancel scope
+fired: blocking calls register an abort with `on_abort` (e.g. shutting down an HTTP socket) and
+are interrupted instead of running to their own timeout.
+"""
+import contextvars
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError as FutureCancelled, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was superseded, cancelled, or ran past its deadline."""
+
+
+class StageTimeout(Exception):
+    """Raised when a single stage exceeds its own deadline (the job itself is still live)."""
+
+
+class CancelScope:
+    """Abort callbacks for in-flight work; `cancel` runs them once, later `add`s run immediately."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+        self.cancelled = False
+
+    def add(self, fn: Callable[[], None]):
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(fn)
+                return
+        _call_quietly(fn)
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            _call_quietly(fn)
+
+
+def _call_quietly(fn: Callable[[], None]):
+    try:
+        fn()
+    except Exception:
+        pass
+
+
+_scope: contextvars.ContextVar[Optional[CancelScope]] = contextvars.ContextVar("cancel_scope", default=None)
+
+
+def on_abort(fn: Callable[[], None]) -> bool:
+    """Register `fn` to abort the current stage's blocking call; False outside a stage."""
+    scope = _scope.get()
+    if scope is None:
+        return False
+    scope.add(fn)
+    return True
+
+
+def _run_in_scope(scope: CancelScope, fn: Callable, *args, **kwargs):
+    _scope.set(scope)
+    return fn(*args, **kwargs)
+
+
+class Job:
+    def __init__(self, job_id: int, fn: Callable[["Job"], None], deadline_s: Optional[float] = None):
+        self.id = job_id
+        self.fn = fn
+        self.created = time.monotonic()
+        self.deadline = self.created + deadline_s if deadline_s else None
+        self.reason: Optional[str] = None
+        self.done = False
+        self.scope = CancelScope()
+        self._cancel = threading.Event()
+        self._stages: Optional[ThreadPoolExecutor] = None
+        self._stages_lock = threading.Lock()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._cancel.is_set():
+            self.reason = reason
+            self._cancel.set()
+            # Drop queued stage work and abort what is running.
+            self.close()
+            self.scope.cancel()
+
+    def executor(self, workers: int) -> ThreadPoolExecutor:
+        with self._stages_lock:
+            if self._stages is None:
+                self._stages = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"overlay-stage-{self.id}")
+            return self._stages
+
+    def close(self):
+        """Release the stage threads once their current calls return."""
+        with self._stages_lock:
+            if self._stages is not None:
+                self._stages.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def remaining(self, cap: Optional[float] = None) -> Optional[float]:
+        """Seconds left before the job deadline, optionally capped; None if unbounded."""
+        left = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+        if cap is None:
+            return left
+        return cap if left is None else min(cap, left)
+
+    def check(self, stage: str = ""):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.cancel("deadline")
+        if self.cancelled:
+            raise JobCancelled(f"job {self.id} {self.reason} before {stage or 'stage'}")
+
+
+class JobScheduler:
+    """
+    Persistent workers pulling from a job queue; each job gets a small stage pool
+    (`stage_workers` threads) for blocking calls (HTTP, detectors) with deadlines and cancellation.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        stage_workers: int = 3,
+        on_error: Optional[Callable[[Job, Exception], None]] = None,
+        on_cancel: Optional[Callable[[Job, JobCancelled], None]] = None,
+    ):
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._latest: Optional[Job] = None
+        self._on_error = on_error
+        self._on_cancel = on_cancel
+        self._stage_workers = stage_workers
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker_loop, name=f"overlay-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @property
+    def latest_id(self) -> int:
+        with self._lock:
+            return self._latest.id if self._latest else 0
+
+    def is_current(self, job: Job) -> bool:
+        with self._lock:
+            return job is self._latest and not job.cancelled
+
+    def is_busy(self) -> bool:
+        with self._lock:
+            return self._latest is not None and not self._latest.cancelled and not self._latest.done
+
+    def submit(self, fn: Callable[[Job], None], deadline_s: Optional[float] = None) -> Job:
+        with self._lock:
+            if self._latest is not None:
+                self._latest.cancel("superseded")
+            job = Job(next(self._ids), fn, deadline_s)
+            self._latest = job
+        self._queue.put(job)
+        return job
+
+    def cancel_all(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._latest is not None:
+                self._latest.cancel(reason)
+
+    def run_stage(self, job: Job, timeout: Optional[float], fn: Callable, *args, **kwargs):
+        """
+        Run `fn` on the job's stage pool and wait for it while polling for cancellation.
+        Raises JobCancelled if the job is cancelled meanwhile, StageTimeout if `timeout` elapses.
+        Either way the stage's cancel scope fires, aborting calls registered with `on_abort`;
+        anything else keeps running in the background and its result is discarded.
+        """
+        name = getattr(fn, "__name__", "stage")
+        job.check(name)
+        scope = CancelScope()
+        job.scope.add(scope.cancel)
+        # The stage sees the job thread's context variables (e.g. the run being recorded).
+        try:
+            fut = job.executor(self._stage_workers).submit(contextvars.copy_context().run, _run_in_scope, scope, fn, *args, **kwargs)
+        except RuntimeError:
+            # The executor was shut down by a concurrent cancel.
+            job.check(name)
+            raise
+        limit = job.remaining(timeout)
+        end = None if limit is None else time.monotonic() + limit
+        while True:
+            wait = 0.05 if end is None else max(0.0, min(0.05, end - time.monotonic()))
+            try:
+                return fut.result(timeout=wait)
+            except FutureTimeout:
+                pass
+            except FutureCancelled:
+                # Dropped from the queue by the job's cancel.
+                job.check(name)
+                raise
+            job.check(name)
+            if end is not None and time.monotonic() >= end:
+                fut.cancel()
+                scope.cancel()
+                raise StageTimeout(f"{name} exceeded {limit:.1f}s")
+
+    def shutdown(self):
+        self.cancel_all("shutdown")
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.cancelled:
+                continue
+            try:
+                job.fn(job)
+            except JobCancelled as exc:
+                if self._on_cancel:
+                    self._on_cancel(job, exc)
+            except Exception as exc:
+                if self._on_error:
+                    self._on_error(job, exc)
+            finally:
+                job.done = True
+                job.close()
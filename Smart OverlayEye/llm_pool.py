@@ -0,0 +1,404 @@
+"""
+Asyncio client for a pool of OpenAI-compatible llama.cpp servers.
+
+- Balancing: each request goes to the healthy endpoint with the fewest outstanding requests
+  (ties: lower recent latency), never above its `limit` concurrent requests. Each in-flight
+  request gets its own server slot id (first_slot + 0..limit-1) so KV caches do not clobber
+  each other.
+- Health: endpoints are probed (GET `health_path`) every `health_interval_s`; failed requests
+  and probes mark an endpoint down until a probe succeeds.
+- Timeouts and hedging: a request still running after `hedge_after_s` (default: the endpoint's
+  recent p90 latency) is duplicated on another idle endpoint; the first answer wins.
+- Backpressure: at most `max_pending` requests wait for a slot; beyond that `chat` raises
+  PoolBusy after `queue_timeout_s` instead of queueing without bound.
+
+- Cancellation: a cancelled or timed-out request shuts its socket down, so the blocking HTTP call
+  returns at once, its slot is freed, and llama.cpp drops the generation instead of finishing it.
+
+Chat requests are blocking `http.client` POSTs on worker threads (one connection each, so they can
+be aborted); health probes use a keep-alive `requests` session. No async HTTP library is needed.
+`LLMPoolSync` runs the pool on a background event loop for blocking callers.
+"""
+import asyncio
+import http.client
+import itertools
+import json
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Optional, Sequence
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+
+class PoolBusy(RuntimeError):
+    pass
+
+
+class PoolError(RuntimeError):
+    pass
+
+
+class AbortableRequest:
+    """One blocking JSON POST that `abort()` can interrupt from another thread."""
+
+    def __init__(self, url: str, body: dict, timeout: float):
+        self.parts = urlsplit(url)
+        self.body = json.dumps(body).encode("utf-8")
+        self.timeout = timeout
+        self.aborted = False
+        self._lock = threading.Lock()
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def send(self) -> dict:
+        cls = http.client.HTTPSConnection if self.parts.scheme == "https" else http.client.HTTPConnection
+        conn = cls(self.parts.hostname, self.parts.port, timeout=self.timeout)
+        path = self.parts.path or "/"
+        if self.parts.query:
+            path += "?" + self.parts.query
+        try:
+            conn.connect()
+            with self._lock:
+                if self.aborted:
+                    raise PoolError("request aborted")
+                self._conn = conn
+            conn.request("POST", path, body=self.body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            text = resp.read().decode("utf-8", "replace")
+        except OSError as exc:
+            if self.aborted:
+                raise PoolError("request aborted") from exc
+            raise
+        finally:
+            conn.close()
+        if resp.status >= 400:
+            raise PoolError(f"HTTP {resp.status}: {text[:200]}")
+        return json.loads(text)
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            conn = self._conn
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class Endpoint:
+    def __init__(self, url: str, limit: int, health_path: str, first_slot: int = 0):
+        self.url = url
+        parts = urlsplit(url)
+        self.health_url = urlunsplit((parts.scheme, parts.netloc, health_path, "", ""))
+        self.limit = max(1, limit)
+        self.free_slots = list(range(first_slot, first_slot + self.limit))
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.served = 0
+        self.latencies: deque = deque(maxlen=64)
+        self.session = requests.Session()
+
+    def latency_estimate(self, q: float = 0.5) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        p50 = self.latency_estimate(0.5)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "limit": self.limit,
+            "served": self.served,
+            "failures": self.failures,
+            "p50_s": round(p50, 3) if p50 is not None else None,
+        }
+
+
+class LLMPool:
+    def __init__(
+        self,
+        urls: Sequence[str],
+        limit: int = 1,
+        first_slot: int = 0,
+        timeout_s: float = 60.0,
+        hedge_after_s: Optional[float] = None,
+        hedge: bool = True,
+        max_pending: int = 32,
+        queue_timeout_s: float = 30.0,
+        health_path: str = "/v1/models",
+        health_interval_s: float = 10.0,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ):
+        if not urls:
+            raise ValueError("LLMPool needs at least one endpoint")
+        self.endpoints = [Endpoint(u, limit, health_path, first_slot) for u in urls]
+        self.timeout_s = timeout_s
+        self.hedge_after_s = hedge_after_s
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.max_pending = max_pending
+        self.queue_timeout_s = queue_timeout_s
+        self.health_interval_s = health_interval_s
+        self.on_event = on_event
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "busy": 0, "errors": 0}
+        self._ids = itertools.count(1)
+        self._pending = 0
+        self._changed: Optional[asyncio.Condition] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._changed = asyncio.Condition()
+        if self.health_interval_s > 0 and self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for ep in self.endpoints:
+            ep.session.close()
+
+    def snapshot(self) -> dict:
+        return {"pending": self._pending, "stats": dict(self.stats), "endpoints": [ep.snapshot() for ep in self.endpoints]}
+
+    # Slot management
+    def _pick(self, exclude: Sequence[Endpoint] = (), prefer: Optional[str] = None) -> Optional[Endpoint]:
+        free = [ep for ep in self.endpoints if ep.outstanding < ep.limit and ep not in exclude]
+        if prefer is not None:
+            for ep in free:
+                if ep.url == prefer and ep.healthy:
+                    return ep
+        healthy = [ep for ep in free if ep.healthy]
+        # With every endpoint down, still try one rather than fail outright (probes may lag).
+        candidates = healthy or ([] if any(ep.healthy for ep in self.endpoints) else free)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda ep: (ep.outstanding / ep.limit, ep.latency_estimate() or 0.0))
+
+    async def _acquire(self, prefer: Optional[str], prefer_slot: Optional[int], deadline: float) -> tuple[Endpoint, int]:
+        async with self._changed:
+            while True:
+                ep = self._pick(prefer=prefer)
+                if ep is not None:
+                    return ep, self._take_slot(ep, prefer_slot if ep.url == prefer else None)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolBusy("no endpoint slot became free in time")
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _take_slot(self, ep: Endpoint, prefer_slot: Optional[int]) -> int:
+        slot = prefer_slot if prefer_slot in ep.free_slots else ep.free_slots[0]
+        ep.free_slots.remove(slot)
+        ep.outstanding += 1
+        return slot
+
+    async def _release(self, ep: Endpoint, slot: int):
+        async with self._changed:
+            ep.outstanding -= 1
+            ep.free_slots.append(slot)
+            self._changed.notify_all()
+
+    # Requests
+    async def chat(
+        self,
+        payload: dict,
+        timeout: Optional[float] = None,
+        prefer: Optional[str] = None,
+        prefer_slot: Optional[int] = None,
+    ) -> tuple[dict, str, int]:
+        """
+        POST `payload` to one endpoint; returns (response json, endpoint url, slot id).
+        `prefer` / `prefer_slot` keep a follow-up on the server (and slot) holding its KV cache.
+        """
+        if self._changed is None:
+            await self.start()
+        timeout = self.timeout_s if timeout is None else timeout
+        if self._pending >= self.max_pending:
+            self.stats["busy"] += 1
+            raise PoolBusy(f"{self._pending} requests already waiting")
+        self._pending += 1
+        try:
+            ep, slot = await self._acquire(prefer, prefer_slot, time.monotonic() + self.queue_timeout_s)
+        finally:
+            self._pending -= 1
+        self.stats["requests"] += 1
+        try:
+            return await self._hedged(ep, slot, payload, timeout, hedge=prefer is None)
+        except PoolError as exc:
+            # The endpoint is marked down now; retry once elsewhere so one dead server is not
+            # visible to callers (timeouts are not retried: that would double the wait).
+            if isinstance(exc.__cause__, asyncio.TimeoutError) or not any(e.healthy for e in self.endpoints if e is not ep):
+                raise
+            self._emit("retry", {"failed": ep.url, "error": str(exc)})
+            ep, slot = await self._acquire(None, None, time.monotonic() + self.queue_timeout_s)
+            return await self._hedged(ep, slot, payload, timeout, hedge=True)
+
+    async def _hedged(self, ep: Endpoint, slot: int, payload: dict, timeout: float, hedge: bool) -> tuple[dict, str, int]:
+        req_id = next(self._ids)
+        primary = asyncio.ensure_future(self._attempt(ep, slot, payload, timeout))
+        hedge_delay = self._hedge_delay(ep, timeout) if self.hedge and hedge else None
+        if hedge_delay is None:
+            return await primary
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+        async with self._changed:
+            other = self._pick(exclude=(ep,))
+            other_slot = self._take_slot(other, None) if other is not None else None
+        if other is None:
+            return await primary
+        self.stats["hedged"] += 1
+        self._emit("hedge", {"req": req_id, "primary": ep.url, "hedge": other.url, "after_s": round(hedge_delay, 2)})
+        backup = asyncio.ensure_future(self._attempt(other, other_slot, payload, timeout))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+        finally:
+            # The loser, or both when the caller cancels (asyncio.wait does not cancel them).
+            for task in pending:
+                task.cancel()
+        raise error or PoolError("hedged request failed")
+
+    def _hedge_delay(self, ep: Endpoint, timeout: float) -> Optional[float]:
+        if self.hedge_after_s is not None:
+            return self.hedge_after_s
+        p90 = ep.latency_estimate(0.9)
+        # Needs some history; until then only the timeout bounds the request.
+        return min(p90 * 1.2, timeout / 2) if p90 is not None and len(ep.latencies) >= 8 else None
+
+    async def _attempt(self, ep: Endpoint, slot: int, payload: dict, timeout: float) -> tuple[dict, str, int]:
+        body = dict(payload)
+        if "id_slot" in body:
+            body["id_slot"] = slot
+        start = time.perf_counter()
+        request = AbortableRequest(ep.url, body, timeout)
+        call = asyncio.ensure_future(asyncio.to_thread(request.send))
+        try:
+            data = await asyncio.wait_for(asyncio.shield(call), timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race or the caller gave up: abort the HTTP call; free the slot once its thread returns.
+            request.abort()
+            self._release_when_done(call, ep, slot)
+            raise
+        except Exception as exc:
+            request.abort()
+            self.stats["errors"] += 1
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            # A single slow generation is not an outage; refused connections and repeated failures are.
+            timed_out = isinstance(exc, asyncio.TimeoutError)
+            if ep.healthy and (not timed_out or ep.consecutive_failures >= 2):
+                ep.healthy = False
+                self._emit("endpoint_down", {"url": ep.url, "error": str(exc) or type(exc).__name__})
+            if call.done():
+                await self._release(ep, slot)
+            else:
+                self._release_when_done(call, ep, slot)
+            raise PoolError(f"{ep.url}: {exc or type(exc).__name__}") from exc
+        ep.latencies.append(time.perf_counter() - start)
+        ep.served += 1
+        ep.consecutive_failures = 0
+        await self._release(ep, slot)
+        return data, ep.url, slot
+
+    def _release_when_done(self, call: asyncio.Future, ep: Endpoint, slot: int):
+        def done(fut: asyncio.Future):
+            if not fut.cancelled():
+                fut.exception()  # an aborted call's error is expected; mark it retrieved
+            asyncio.ensure_future(self._release(ep, slot))
+
+        call.add_done_callback(done)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval_s)
+            await asyncio.gather(*(self._probe(ep) for ep in self.endpoints), return_exceptions=True)
+
+    async def _probe(self, ep: Endpoint):
+        try:
+            ok = await asyncio.to_thread(lambda: ep.session.get(ep.health_url, timeout=5).ok)
+        except Exception:
+            ok = False
+        if ok != ep.healthy:
+            ep.healthy = ok
+            ep.consecutive_failures = 0
+            self._emit("endpoint_up" if ok else "endpoint_down", {"url": ep.url, "probe": True})
+            if ok:
+                async with self._changed:
+                    self._changed.notify_all()
+
+    def _emit(self, event: str, data: dict):
+        if self.on_event is not None:
+            try:
+                self.on_event(event, data)
+            except Exception:
+                pass
+
+
+class LLMPoolSync:
+    """Blocking facade: the pool runs on its own event loop thread; `chat` is safe from any thread."""
+
+    def __init__(self, urls: Sequence[str], **kwargs):
+        self.pool = LLMPool(urls, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-pool", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.pool.start(), self._loop).result()
+
+    def chat(
+        self,
+        payload: dict,
+        timeout: Optional[float] = None,
+        prefer: Optional[str] = None,
+        prefer_slot: Optional[int] = None,
+        cancel_with: Optional[Callable[[Callable[[], None]], object]] = None,
+    ):
+        """
+        Blocking `LLMPool.chat`. `cancel_with` (e.g. jobs.on_abort) receives a callback that cancels
+        the request, aborting its HTTP call and freeing its slot.
+        """
+        fut: Future = asyncio.run_coroutine_threadsafe(self.pool.chat(payload, timeout, prefer, prefer_slot), self._loop)
+        if cancel_with is not None:
+            cancel_with(fut.cancel)
+        # Queue wait + request (+ a hedge) is bounded inside the pool; this is only a backstop.
+        limit = (self.pool.timeout_s if timeout is None else timeout) * 2 + self.pool.queue_timeout_s
+        try:
+            return fut.result(limit)
+        except FutureTimeout:
+            # Nobody waits for it any more: abort the HTTP call so the slot is not held.
+            fut.cancel()
+            raise
+
+    @property
+    def capacity(self) -> int:
+        return sum(ep.limit for ep in self.pool.endpoints)
+
+    def snapshot(self) -> dict:
+        return self.pool.snapshot()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.pool.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,294 @@
+"""
+Streaming analyzer for debug_agent.log (JSON lines from write_log).
+
+Reads the log line by line (plain or .gz), so memory stays flat however large it grows, and
+groups events by runId (one overlay/eval/sim process) or by day. Per group it reports:
+  - stage timings: time from the previous event of the same request to each event
+    (e.g. `call_vision_llm:response` = LLM latency), p50/p95 from a bounded reservoir
+  - LLM prompt tokens and prefill time as reported by llama.cpp (usage / timings)
+  - requests, backend hits (template / owlvit / llava / ocr) and misses
+  - LLM/choice parse failures and is_valid_bbox rejection reasons (`bbox:reject`)
+
+Examples:
+  python log_analyzer.py
+  python log_analyzer.py debug_agent.log.gz --group day --csv artifacts/log_summary.csv
+  python log_analyzer.py --parquet artifacts/log_summary.parquet   # needs pandas + pyarrow
+"""
+import argparse
+import csv
+import gzip
+import json
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+LOG_PATH = Path(__file__).resolve().parent / "debug_agent.log"
+
+REQUEST_START = {"pipeline:start", "sim:start"}
+REQUEST_END = {"pipeline:show", "pipeline:no_result", "pipeline:cancelled", "pipeline:error", "sim:done", "sim:no_result", "eval:item"}
+PARSE_FAILURES = {
+    "parse_bbox_json:missing_keys",
+    "parse_bbox_json:invalid_values",
+    "parse_bbox_json:substring_fail",
+    "parse_choice:none",
+    "parse_choice:out_of_range",
+}
+
+
+def iter_events(path: Path) -> Iterator[Optional[dict]]:
+    """One parsed event per line; None for lines that are not valid JSON objects."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield event if isinstance(event, dict) else None
+
+
+class Reservoir:
+    """Fixed-size uniform sample of a stream, for approximate percentiles in constant memory."""
+
+    __slots__ = ("size", "unit", "count", "total", "values")
+
+    def __init__(self, size: int = 512, unit: str = "ms"):
+        self.size = size
+        self.unit = unit
+        self.count = 0
+        self.total = 0.0
+        self.values: list[float] = []
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            j = random.randrange(self.count)
+            if j < self.size:
+                self.values[j] = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {
+            "n": self.count,
+            f"mean_{self.unit}": round(self.total / self.count, 1) if self.count else None,
+            f"p50_{self.unit}": self.quantile(0.5),
+            f"p95_{self.unit}": self.quantile(0.95),
+        }
+
+
+def _backend_of(location: str, data: dict) -> Optional[str]:
+    """Backend logged with the request's end event; "unknown" for hits from logs that predate it."""
+    if location in ("eval:item", "sim:done", "pipeline:show"):
+        return data.get("backend") or data.get("stage") or "unknown"
+    return None
+
+
+class GroupStats:
+    def __init__(self, key: str, reservoir_size: int = 512):
+        self.key = key
+        self.reservoir_size = reservoir_size
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.events = 0
+        self.requests = 0
+        self.request_ms = Reservoir(reservoir_size)
+        self.stage_ms: dict[str, Reservoir] = {}
+        self.hits: dict[str, int] = {}
+        self.misses = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.parse_failures: dict[str, int] = {}
+        self.rejects: dict[str, int] = {}
+        self.llm_latency = Reservoir(reservoir_size)
+        # llama.cpp usage/timings: prompt size and prefill time, to weigh OCR_CONTEXT settings.
+        self.llm_prompt_tokens = Reservoir(reservoir_size, unit="tokens")
+        self.llm_prefill_ms = Reservoir(reservoir_size)
+        # Open request in this group: (start ts, previous event ts).
+        self._req_start: Optional[int] = None
+        self._prev_ts: Optional[int] = None
+
+    def add(self, event: dict):
+        loc = str(event.get("location") or "")
+        ts = event.get("timestamp")
+        data = event.get("data") if isinstance(event.get("data"), dict) else {}
+        self.events += 1
+        if isinstance(ts, (int, float)):
+            ts = int(ts)
+            self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+            self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        else:
+            ts = None
+
+        if loc in REQUEST_START:
+            self._req_start = self._prev_ts = ts
+        elif self._prev_ts is not None and ts is not None:
+            self._stage(loc).add(max(0, ts - self._prev_ts))
+            self._prev_ts = ts
+
+        if loc == "call_vision_llm:response" and isinstance(data.get("latency_ms"), (int, float)):
+            self.llm_latency.add(float(data["latency_ms"]))
+        if loc == "call_vision_llm:response":
+            usage = data.get("usage") if isinstance(data.get("usage"), dict) else {}
+            timings = data.get("timings") if isinstance(data.get("timings"), dict) else {}
+            if isinstance(usage.get("prompt_tokens"), (int, float)):
+                self.llm_prompt_tokens.add(float(usage["prompt_tokens"]))
+            if isinstance(timings.get("prompt_ms"), (int, float)):
+                self.llm_prefill_ms.add(float(timings["prompt_ms"]))
+        if loc in PARSE_FAILURES:
+            self.parse_failures[loc] = self.parse_failures.get(loc, 0) + 1
+        if loc == "bbox:reject":
+            reason = str(data.get("reason") or "unknown")
+            self.rejects[reason] = self.rejects.get(reason, 0) + 1
+
+        if loc in REQUEST_END:
+            self.requests += 1
+            backend = _backend_of(loc, data)
+            if loc == "pipeline:cancelled":
+                self.cancelled += 1
+            elif loc == "pipeline:error":
+                self.errors += 1
+            elif backend in (None, "none") or loc.endswith("no_result"):
+                self.misses += 1
+            else:
+                self.hits[backend] = self.hits.get(backend, 0) + 1
+            if self._req_start is not None and ts is not None:
+                self.request_ms.add(max(0, ts - self._req_start))
+            self._req_start = self._prev_ts = ts if loc == "eval:item" else None
+
+    def _stage(self, location: str) -> Reservoir:
+        res = self.stage_ms.get(location)
+        if res is None:
+            res = self.stage_ms[location] = Reservoir(self.reservoir_size)
+        return res
+
+    def summary(self) -> dict:
+        answered = sum(self.hits.values())
+        decided = answered + self.misses
+        return {
+            "group": self.key,
+            "first": _iso(self.first_ts),
+            "last": _iso(self.last_ts),
+            "events": self.events,
+            "requests": self.requests,
+            "hit_rate": round(answered / decided, 3) if decided else None,
+            "hits": dict(sorted(self.hits.items())),
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "request": self.request_ms.summary(),
+            "llm_latency": self.llm_latency.summary(),
+            "llm_prompt_tokens": self.llm_prompt_tokens.summary(),
+            "llm_prefill": self.llm_prefill_ms.summary(),
+            "parse_failures": dict(sorted(self.parse_failures.items())),
+            "bbox_rejects": dict(sorted(self.rejects.items())),
+            "stages": {loc: r.summary() for loc, r in sorted(self.stage_ms.items())},
+        }
+
+
+def _iso(ts: Optional[int]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+def _group_key(event: dict, group: str) -> str:
+    if group == "day":
+        ts = event.get("timestamp")
+        return _iso(int(ts))[:10] if isinstance(ts, (int, float)) else "unknown"
+    if group == "all":
+        return "all"
+    return str(event.get("runId") or "unknown")
+
+
+def analyze(path: Path, group: str = "run", reservoir_size: int = 512) -> tuple[list[dict], int]:
+    """Summaries per group (ordered by first event) and the number of malformed lines."""
+    groups: dict[str, GroupStats] = {}
+    malformed = 0
+    for event in iter_events(path):
+        if event is None:
+            malformed += 1
+            continue
+        key = _group_key(event, group)
+        stats = groups.get(key)
+        if stats is None:
+            stats = groups[key] = GroupStats(key, reservoir_size)
+        stats.add(event)
+    ordered = sorted(groups.values(), key=lambda g: g.first_ts or 0)
+    return [g.summary() for g in ordered], malformed
+
+
+def flatten(summary: dict) -> dict:
+    """One flat row per group (nested dicts become dotted columns) for CSV/Parquet."""
+    row = {}
+
+    def walk(prefix: str, value):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                walk(f"{prefix}.{k}" if prefix else k, v)
+        else:
+            row[prefix] = value
+
+    walk("", summary)
+    return row
+
+
+def write_csv(rows: list[dict], path: Path):
+    columns: list[str] = []
+    for row in rows:
+        columns += [c for c in row if c not in columns]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_parquet(rows: list[dict], path: Path):
+    try:
+        import pandas as pd  # type: ignore
+    except Exception as exc:
+        raise SystemExit(f"--parquet needs pandas and pyarrow ({exc})")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_parquet(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize debug_agent.log per run or per day")
+    parser.add_argument("log", nargs="?", default=str(LOG_PATH), help="Log file (.gz ok)")
+    parser.add_argument("--group", choices=("run", "day", "all"), default="run")
+    parser.add_argument("--csv", default=None, help="Write one row per group as CSV")
+    parser.add_argument("--parquet", default=None, help="Write one row per group as Parquet")
+    parser.add_argument("--last", type=int, default=None, help="Only print the last N groups")
+    args = parser.parse_args()
+
+    path = Path(args.log)
+    if not path.exists():
+        raise SystemExit(f"No log at {path}")
+    summaries, malformed = analyze(path, args.group)
+    if args.csv or args.parquet:
+        rows = [flatten(s) for s in summaries]
+        if args.csv:
+            write_csv(rows, Path(args.csv))
+        if args.parquet:
+            write_parquet(rows, Path(args.parquet))
+    shown = summaries[-args.last :] if args.last else summaries
+    json.dump({"groups": len(summaries), "malformed_lines": malformed, "summaries": shown}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
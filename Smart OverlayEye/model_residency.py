@@ -0,0 +1,225 @@
+"""
+Residency manager for loaded models: an RSS budget plus idle-timeout unloading.
+
+Models are loaded through `ResidencyManager.get(key, backend, loader)`. Each load records how
+much process RSS it added; when the process goes over budget the least recently used other
+models are dropped, and models unused for `idle_unload_s` are dropped by a background reaper.
+Models dropped for idleness are reloaded in the background on `notify_active()` (the overlay
+calls it on key presses), so the next hotkey does not pay for the load.
+"""
+import ctypes
+import gc
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+_MB = 1024 * 1024
+
+
+def process_rss_bytes() -> int:
+    """Current resident set size of this process (psutil if installed, else /proc, else peak RSS)."""
+    try:
+        import psutil  # type: ignore
+
+        return int(psutil.Process().memory_info().rss)
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return int(peak if sys.platform == "darwin" else peak * 1024)
+    except Exception:
+        return 0
+
+
+def _release_memory():
+    """Give freed model memory back to the OS where the allocator allows it."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            if hasattr(torch, "mps") and torch.backends.mps.is_available():
+                torch.mps.empty_cache()
+        except Exception:
+            pass
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except Exception:
+            pass
+
+
+class _Resident:
+    __slots__ = ("key", "backend", "value", "loader", "rss_bytes", "loaded_at", "last_used")
+
+    def __init__(self, key, backend, value, loader, rss_bytes):
+        self.key = key
+        self.backend = backend
+        self.value = value
+        self.loader = loader
+        self.rss_bytes = rss_bytes
+        self.loaded_at = self.last_used = time.monotonic()
+
+
+class ResidencyManager:
+    def __init__(
+        self,
+        budget_mb: Optional[float] = None,
+        idle_unload_s: Optional[float] = None,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ):
+        self.budget_bytes = int(budget_mb * _MB) if budget_mb else None
+        self.idle_unload_s = idle_unload_s if idle_unload_s and idle_unload_s > 0 else None
+        self.on_event = on_event
+        self._lock = threading.RLock()
+        self._resident: dict[Hashable, _Resident] = {}
+        # key -> (backend, loader) for models dropped while idle; reloaded on notify_active().
+        self._idle_evicted: dict[Hashable, tuple[str, Callable[[], Any]]] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._reloading = False
+
+    def get(self, key: Hashable, backend: str, loader: Callable[[], Any], touch: bool = True) -> Any:
+        """
+        Return the resident model for `key`, loading it with `loader()` if needed.
+        touch=False (background work) does not count as use, so it cannot keep a model from idling out.
+        """
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None:
+                if touch:
+                    entry.last_used = time.monotonic()
+                return entry.value
+            before = process_rss_bytes()
+            start = time.perf_counter()
+            value = loader()
+            rss = max(0, process_rss_bytes() - before)
+            self._resident[key] = _Resident(key, backend, value, loader, rss)
+            self._idle_evicted.pop(key, None)
+            self._emit(
+                "load",
+                {"key": repr(key), "backend": backend, "rss_mb": round(rss / _MB, 1), "load_ms": round((time.perf_counter() - start) * 1000, 1)},
+            )
+            self._enforce_budget(keep=key)
+            self._ensure_reaper()
+            return value
+
+    def loaded(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._resident
+
+    def unload(self, key: Hashable, reason: str = "manual") -> bool:
+        with self._lock:
+            entry = self._resident.pop(key, None)
+            if entry is None:
+                return False
+            if reason == "idle":
+                self._idle_evicted[key] = (entry.backend, entry.loader)
+            freed = entry.rss_bytes
+            del entry
+        _release_memory()
+        self._emit("unload", {"key": repr(key), "reason": reason, "rss_mb": round(freed / _MB, 1)})
+        return True
+
+    def unload_all(self, reason: str = "manual"):
+        with self._lock:
+            keys = list(self._resident)
+        for key in keys:
+            self.unload(key, reason)
+
+    def unload_idle(self, now: Optional[float] = None) -> list:
+        """Drop every model unused for idle_unload_s; returns the dropped keys."""
+        if self.idle_unload_s is None:
+            return []
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            stale = [k for k, e in self._resident.items() if now - e.last_used >= self.idle_unload_s]
+        return [k for k in stale if self.unload(k, "idle")]
+
+    def notify_active(self):
+        """User activity: reload models that were dropped for idleness, on a background thread."""
+        if not self._idle_evicted or self._reloading:
+            return
+        with self._lock:
+            if self._reloading or not self._idle_evicted:
+                return
+            pending = list(self._idle_evicted.items())
+            self._idle_evicted.clear()
+            self._reloading = True
+
+        def _reload():
+            try:
+                for key, (backend, loader) in pending:
+                    try:
+                        self.get(key, backend, loader)
+                    except Exception as exc:
+                        self._emit("reload_error", {"key": repr(key), "error": str(exc)})
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=_reload, name="model-reload", daemon=True).start()
+
+    def memory_report(self, wait: bool = True) -> dict:
+        """
+        Process RSS, budget, and the RSS each backend added when its models were loaded.
+        wait=False never blocks on a load in progress: per-backend details are then omitted ("loading": True).
+        """
+        now = time.monotonic()
+        report = {
+            "process_rss_mb": round(process_rss_bytes() / _MB, 1),
+            "budget_mb": round(self.budget_bytes / _MB, 1) if self.budget_bytes else None,
+            "idle_unload_s": self.idle_unload_s,
+        }
+        if not self._lock.acquire(blocking=wait):
+            return {**report, "loading": True}
+        try:
+            backends: dict[str, dict] = {}
+            for entry in self._resident.values():
+                b = backends.setdefault(entry.backend, {"rss_mb": 0.0, "models": []})
+                b["rss_mb"] = round(b["rss_mb"] + entry.rss_bytes / _MB, 1)
+                b["models"].append({"key": repr(entry.key), "rss_mb": round(entry.rss_bytes / _MB, 1), "idle_s": round(now - entry.last_used, 1)})
+            idle_evicted = [repr(k) for k in self._idle_evicted]
+        finally:
+            self._lock.release()
+        return {**report, "backends": backends, "idle_evicted": idle_evicted}
+
+    def _enforce_budget(self, keep: Hashable):
+        if self.budget_bytes is None:
+            return
+        while process_rss_bytes() > self.budget_bytes:
+            with self._lock:
+                victims = sorted((e for k, e in self._resident.items() if k != keep), key=lambda e: e.last_used)
+                victim = victims[0].key if victims else None
+            if victim is None:
+                self._emit("over_budget", {"key": repr(keep), "process_rss_mb": round(process_rss_bytes() / _MB, 1)})
+                return
+            self.unload(victim, "budget")
+
+    def _ensure_reaper(self):
+        if self.idle_unload_s is None or (self._reaper is not None and self._reaper.is_alive()):
+            return
+        interval = max(1.0, min(60.0, self.idle_unload_s / 4))
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                self.unload_idle()
+
+        self._reaper = threading.Thread(target=_loop, name="model-idle-reaper", daemon=True)
+        self._reaper.start()
+
+    def _emit(self, event: str, data: dict):
+        if self.on_event is not None:
+            try:
+                self.on_event(event, data)
+            except Exception:
+                pass
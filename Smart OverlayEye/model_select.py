@@ -0,0 +1,262 @@
+"""
+Host-aware OWL-ViT variant selection.
+
+Times every installed variant (HF-cached checkpoints and local ONNX exports, fp32 and int8) on a
+small built-in set of synthetic screenshots, then picks the variant with the most hits whose median
+latency fits the budget (a variant whose ONNX backend does not load, or finds nothing, is never chosen). The choice is cached per machine fingerprint, so it runs once per host.
+`OWLVIT_MODEL` / `OWLVIT_ONNX_PATH` still override the choice.
+
+Examples:
+  python model_select.py --list
+  python model_select.py --calibrate --budget-ms 800
+  python model_select.py --show
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+CACHE_PATH = Path(os.environ.get("OWLVIT_VARIANT_CACHE", Path.home() / ".cache" / "overlayeye" / "owlvit_variant.json"))
+
+# Relative accuracy prior per checkpoint family (higher is better); int8 exports rank just below fp32.
+KNOWN_MODELS = {
+    "google/owlvit-base-patch32": 1.0,
+    "google/owlvit-base-patch16": 2.0,
+    "google/owlvit-large-patch14": 3.0,
+}
+INT8_PENALTY = 0.5
+
+
+def machine_fingerprint() -> str:
+    """Stable id for the host: OS, CPU, core count and RAM (cheap; no backend imports)."""
+    try:
+        ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        ram = 0
+    parts = [
+        platform.system(),
+        platform.machine(),
+        platform.processor(),
+        str(os.cpu_count()),
+        str(ram // (1 << 30)),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def _family_accuracy(name: str) -> float:
+    name = name.lower()
+    for model_id, acc in KNOWN_MODELS.items():
+        if model_id.split("/")[-1] in name:
+            return acc
+    if "large" in name:
+        return KNOWN_MODELS["google/owlvit-large-patch14"]
+    if "patch16" in name:
+        return KNOWN_MODELS["google/owlvit-base-patch16"]
+    return KNOWN_MODELS["google/owlvit-base-patch32"]
+
+
+def _hf_cached(model_id: str) -> bool:
+    try:
+        from huggingface_hub import try_to_load_from_cache  # type: ignore
+    except Exception:
+        return False
+    path = try_to_load_from_cache(model_id, "config.json")
+    return isinstance(path, str)
+
+
+def installed_variants(models_dir: Path = MODELS_DIR) -> list[dict]:
+    """Variants available on this host without downloading anything."""
+    variants = []
+    for model_id, acc in KNOWN_MODELS.items():
+        if _hf_cached(model_id):
+            variants.append({"name": f"{model_id}:onnx-export", "model_id": model_id, "onnx_path": None, "accuracy": acc})
+    if models_dir.exists():
+        for onnx in sorted(models_dir.glob("*/*.onnx")):
+            family = onnx.parent.name
+            try:
+                cfg = json.loads((onnx.parent / "config.json").read_text())
+                family = cfg.get("_name_or_path") or family
+            except Exception:
+                pass
+            int8 = onnx.name.endswith(".quant.onnx") or "int8" in onnx.parent.name
+            acc = _family_accuracy(f"{family} {onnx.parent.name}") - (INT8_PENALTY if int8 else 0.0)
+            variants.append(
+                {
+                    "name": f"{onnx.parent.name}/{onnx.name}",
+                    "model_id": family if family in KNOWN_MODELS else "google/owlvit-base-patch32",
+                    "onnx_path": str(onnx),
+                    "accuracy": acc,
+                }
+            )
+    return variants
+
+
+def calibration_set() -> list[tuple[Image.Image, str, tuple[int, int, int, int]]]:
+    """A few synthetic app-like screenshots with one labelled button each."""
+    try:
+        font = ImageFont.truetype("Menlo.ttc", 18)
+    except Exception:
+        font = ImageFont.load_default()
+    samples = []
+    specs = [
+        ((1280, 800), "Save", (980, 700, 120, 40), (40, 40, 48)),
+        ((1280, 800), "Cancel", (820, 700, 130, 40), (245, 245, 245)),
+        ((1440, 900), "Render", (60, 20, 110, 36), (30, 30, 30)),
+    ]
+    for size, text, (x, y, w, h), bg in specs:
+        img = Image.new("RGB", size, bg)
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([0, 0, size[0], 14], fill=(200, 200, 200))
+        for i, word in enumerate(("File", "Edit", "View", "Window", "Help")):
+            draw.text((10 + i * 60, 0), word, fill=(0, 0, 0), font=font)
+        draw.rounded_rectangle([x, y, x + w, y + h], radius=8, fill=(10, 110, 230))
+        draw.text((x + 16, y + h // 4), text, fill=(255, 255, 255), font=font)
+        samples.append((img, f"{text} button", (x, y, w, h)))
+    return samples
+
+
+def _iou(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    iw = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    ih = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / float(union) if union > 0 else 0.0
+
+
+def _default_detect(variant: dict) -> Callable:
+    """
+    Detection with the variant's own ONNX backend. detect_owlvit falls back to the torch pipeline on
+    any ONNX failure, which would time the wrong model, so a missing or dropped backend raises.
+    """
+    from owlvit_detector import RESIDENCY, detect_owlvit, load_onnx_backend
+
+    key = load_onnx_backend(variant["model_id"], variant["onnx_path"])
+    if key is None:
+        raise RuntimeError(f"ONNX backend for {variant['name']} did not load")
+
+    def run(img: Image.Image, task: str):
+        det = detect_owlvit(
+            img,
+            task,
+            prefer_onnx=True,
+            model_id=variant["model_id"],
+            onnx_path=variant["onnx_path"],
+            min_score=0.05,
+        )
+        if not RESIDENCY.loaded(key):
+            raise RuntimeError(f"ONNX backend for {variant['name']} failed; detection fell back to torch")
+        return det
+
+    return run
+
+
+def measure_variant(variant: dict, samples, runs: int = 3, detect_factory: Callable = _default_detect) -> dict:
+    """Median per-image latency after one warmup pass, plus hits@0.5 on the calibration set."""
+    try:
+        detect = detect_factory(variant)
+        t0 = time.perf_counter()
+        for img, task, _gt in samples:
+            detect(img, task)  # warmup: load + first-run compilation
+        load_ms = (time.perf_counter() - t0) * 1000
+        times, hits = [], 0
+        for r in range(runs):
+            for img, task, gt in samples:
+                t = time.perf_counter()
+                det = detect(img, task)
+                times.append((time.perf_counter() - t) * 1000)
+                if r == 0 and det and _iou(det[0], gt) >= 0.5:
+                    hits += 1
+        return {
+            **variant,
+            "ok": True,
+            "latency_ms": round(statistics.median(times), 1),
+            "warmup_ms": round(load_ms, 1),
+            "hits": hits,
+        }
+    except Exception as exc:
+        return {**variant, "ok": False, "error": str(exc)}
+
+
+def choose(measurements: list[dict], budget_ms: float) -> Optional[dict]:
+    """
+    Variant with the most measured hits within budget (the KNOWN_MODELS prior only breaks ties);
+    fastest one if nothing fits. Variants that found no calibration button are never chosen.
+    """
+    ok = [m for m in measurements if m.get("ok") and m.get("hits", 0) > 0]
+    if not ok:
+        return None
+    within = [m for m in ok if m["latency_ms"] <= budget_ms]
+    if within:
+        return max(within, key=lambda m: (m["hits"], m["accuracy"], -m["latency_ms"]))
+    return min(ok, key=lambda m: m["latency_ms"])
+
+
+def _read_cache(path: Path = CACHE_PATH) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def cached_choice(path: Path = CACHE_PATH) -> Optional[dict]:
+    """Previously calibrated choice for this machine, or None."""
+    entry = _read_cache(path).get(machine_fingerprint())
+    return entry.get("chosen") if entry else None
+
+
+def calibrate(
+    budget_ms: float,
+    runs: int = 3,
+    variants: Optional[list[dict]] = None,
+    cache_path: Path = CACHE_PATH,
+    detect_factory: Callable = _default_detect,
+) -> dict:
+    variants = installed_variants() if variants is None else variants
+    samples = calibration_set()
+    measurements = [measure_variant(v, samples, runs=runs, detect_factory=detect_factory) for v in variants]
+    chosen = choose(measurements, budget_ms)
+    report = {
+        "fingerprint": machine_fingerprint(),
+        "budget_ms": budget_ms,
+        "calibrated_at": int(time.time()),
+        "chosen": {k: chosen[k] for k in ("name", "model_id", "onnx_path", "latency_ms")} if chosen else None,
+        "measurements": measurements,
+    }
+    if chosen:
+        cache = _read_cache(cache_path)
+        cache[report["fingerprint"]] = report
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the OWL-ViT variant for this machine")
+    parser.add_argument("--list", action="store_true", help="List installed variants")
+    parser.add_argument("--calibrate", action="store_true", help="Time installed variants and cache the choice")
+    parser.add_argument("--show", action="store_true", help="Show the cached choice for this machine")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("OWLVIT_LATENCY_BUDGET_MS", "800")))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.list:
+        print(json.dumps(installed_variants(), indent=2))
+    if args.calibrate:
+        report = calibrate(args.budget_ms, runs=args.runs)
+        print(json.dumps(report, indent=2))
+    if args.show or not (args.list or args.calibrate):
+        print(json.dumps({"fingerprint": machine_fingerprint(), "chosen": cached_choice()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
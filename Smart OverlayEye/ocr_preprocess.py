@@ -0,0 +1,104 @@
+"""
+Image preprocessing in front of Tesseract.
+
+Captures come in as RGB at the display's DPR, so Retina text is twice the size Tesseract needs
+and four times the pixels. `preprocess_for_ocr` turns a capture into a smaller single-channel
+image: grayscale, a DPR-aware downscale that brings UI text to a target x-height, inversion when
+the screen is predominantly dark, and optionally adaptive (Bradley) binarization. Word boxes from
+the result are mapped back with `coarse_to_fine.scale_ocr_data(data, 1 / scale)`.
+"""
+import time
+from typing import TYPE_CHECKING, NamedTuple
+
+from PIL import Image
+
+if TYPE_CHECKING:  # imported on first use: overlay_mvp imports this module at startup
+    import numpy as np
+
+# x-height in logical pixels of typical 13-14 px UI text.
+BASE_XHEIGHT = 8.0
+# Sample every Nth pixel per axis when deciding whether the screen is dark.
+_DARK_SAMPLE_STRIDE = 8
+
+
+class Preprocessed(NamedTuple):
+    image: Image.Image  # mode "L"
+    scale: float  # processed / capture
+    inverted: bool
+    binarized: bool
+    ms: float
+
+
+def to_gray(img: Image.Image) -> "np.ndarray":
+    """ITU-R 601 luma as uint8 (Pillow's C conversion; same weights, ~10x faster than NumPy on RGB)."""
+    import numpy as np
+
+    return np.asarray(img if img.mode == "L" else img.convert("L"))
+
+
+def is_dark(gray: "np.ndarray", threshold: int = 110) -> bool:
+    """True when the median of a strided sample is below threshold (dark theme)."""
+    import numpy as np
+
+    sample = gray[::_DARK_SAMPLE_STRIDE, ::_DARK_SAMPLE_STRIDE]
+    return bool(sample.size) and float(np.median(sample)) < threshold
+
+
+def ocr_scale(dpr: float, target_xheight: float, base_xheight: float = BASE_XHEIGHT) -> float:
+    """Downscale factor (<= 1, never upscales) that brings base_xheight * dpr to target_xheight."""
+    if dpr <= 0 or target_xheight <= 0:
+        return 1.0
+    return min(1.0, target_xheight / (base_xheight * dpr))
+
+
+def adaptive_binarize(gray: "np.ndarray", window: int = 31, t: float = 0.15) -> "np.ndarray":
+    """
+    Bradley-Roth local-mean threshold using an integral image: a pixel is ink (0) when it is
+    more than t below the mean of the window x window box around it, paper (255) otherwise.
+    Expects dark text on a light background.
+    """
+    import numpy as np
+
+    r = max(1, window // 2)
+    n = 2 * r + 1
+    # Edge padding keeps every window full-size, so the count is the constant n * n.
+    padded = np.pad(gray, r, mode="edge")
+    acc = np.uint32 if padded.size * 255 < 2**32 else np.uint64
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=acc)
+    np.cumsum(padded, axis=0, dtype=acc, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    # Unsigned wrap-around cancels out: the true window sum always fits.
+    sums = integral[n:, n:] - integral[:-n, n:] - integral[n:, :-n] + integral[:-n, :-n]
+    sums = sums.astype(np.uint32, copy=False)
+    ink = gray.astype(np.uint32) * np.uint32(n * n * 100) < sums * np.uint32(round((1.0 - t) * 100))
+    return np.where(ink, 0, 255).astype(np.uint8)
+
+
+def preprocess_for_ocr(
+    img: Image.Image,
+    dpr: float = 1.0,
+    target_xheight: float = 16.0,
+    invert: str = "auto",
+    binarize: bool = False,
+) -> Preprocessed:
+    """
+    Grayscale -> downscale to target x-height -> invert ("auto" | "1" | "0") -> optional binarize.
+    Boxes Tesseract finds on the result are in capture pixels * scale.
+    """
+    import numpy as np
+
+    start = time.perf_counter()
+    gray = to_gray(img)
+    scale = ocr_scale(dpr, target_xheight)
+    h, w = gray.shape
+    if scale < 1.0:
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        # Box filter on the single channel; the actual factor is what the boxes must be divided by.
+        gray = np.asarray(Image.fromarray(gray).resize(size, Image.BOX))
+        scale = size[0] / float(w)
+    inverted = invert == "1" or (invert == "auto" and is_dark(gray))
+    if inverted:
+        gray = 255 - gray
+    if binarize:
+        gray = adaptive_binarize(gray, window=max(15, int(target_xheight * 4) | 1))
+    return Preprocessed(Image.fromarray(gray), scale, inverted, binarize, round((time.perf_counter() - start) * 1000, 1))
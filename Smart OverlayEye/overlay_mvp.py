@@ -4,20 +4,38 @@ import json
 import os
 import re
 import signal
+import subprocess
+import sys
 import threading
 import time
 from pathlib import Path
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, NamedTuple, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+# Process start reference for the startup report (time until the hotkey listener is live).
+_PROCESS_T0 = time.perf_counter()
 
 from PySide6 import QtCore, QtGui, QtWidgets
 import mss
 from PIL import Image
-import pytesseract
-from pytesseract import Output
 import requests
 from pynput import keyboard
 
-from owlvit_detector import detect_owlvit
+from owlvit_detector import RESIDENCY, detect_owlvit, detect_owlvit_candidates, owlvit_image_features, warmup_owlvit
+from bbox_schema import constrained_fields
+from cascade import DEFAULT_ORDER, CascadePlanner, Plan, task_bucket
+from coarse_to_fine import downscale, merge_regions, refine_in_regions, region_around, scale_box, scale_ocr_data
+from contact_sheet import dedupe_candidates, render_contact_sheet
+from detector_worker import DetectorClient, WorkerError
+from jobs import Job, JobCancelled, JobScheduler, StageTimeout, on_abort
+from llm_pool import LLMPoolSync
+from ocr_preprocess import preprocess_for_ocr
+from prefetch import IdlePrefetcher
+from run_store import RunRecorder, RunStore, current_run, note_step, recording
+
+if TYPE_CHECKING:  # numpy-backed; imported on first use
+    from template_store import TemplateStore
 
 
 # --- Config -----------------------------------------------------------------
@@ -25,15 +43,71 @@ from owlvit_detector import detect_owlvit
 LLAMA_API_URL = os.environ.get("LLAMA_API_URL", "http://127.0.0.1:8080/v1/chat/completions")
 # Match the loaded GGUF filename or set via env/alias (the server accepts this as the model key).
 LLAMA_MODEL = os.environ.get("LLAMA_MODEL", "llava-v1.6-mistral-7b.Q4_K_M.gguf")
+# First server slot; each in-flight request takes its own slot (LLAMA_SLOT_ID + 0..LLAMA_SLOTS-1) and
+# a strict retry goes back to the slot that holds its cached prefix.
+LLAMA_SLOT_ID = int(os.environ.get("LLAMA_SLOT_ID", "0"))
+# Slots used on LLAMA_API_URL (start llama-server with --parallel >= this; capped at the server's
+# total_slots when /props reports it). Two let a new hotkey start while a superseded call unwinds.
+LLAMA_SLOTS = int(os.environ.get("LLAMA_SLOTS", "2"))
+# Several llama.cpp servers (comma-separated chat URLs): requests are balanced across them by
+# llm_pool (least outstanding, LLM_POOL_LIMIT concurrent per server, health checks, hedging after
+# LLM_HEDGE_S or the server's recent p90). Unset: a one-server pool over LLAMA_API_URL.
+LLAMA_API_URLS = [u.strip() for u in os.environ.get("LLAMA_API_URLS", "").split(",") if u.strip()]
+LLM_POOL_LIMIT = int(os.environ.get("LLM_POOL_LIMIT", "1"))
+LLM_POOL_MAX_PENDING = int(os.environ.get("LLM_POOL_MAX_PENDING", "32"))
+LLM_HEDGE_S = float(os.environ["LLM_HEDGE_S"]) if os.environ.get("LLM_HEDGE_S") else None
+# Strict retry strategy when the first bbox is rejected: cache | crop | full.
+LLM_RETRY_MODE = os.environ.get("LLM_RETRY_MODE", "cache").lower()
+RETRY_CROP_MIN = int(os.environ.get("RETRY_CROP_MIN", "512"))
+# Constrained decoding of the bbox reply: off | gbnf (llama.cpp grammar) | schema (JSON schema).
+LLM_GRAMMAR = os.environ.get("LLM_GRAMMAR", "off").lower()
 # Optional: enable OWL-ViT detector (free, local) to propose boxes before LLM.
 USE_OWLVIT = os.environ.get("USE_OWLVIT", "1") != "0"
 USE_OWLVIT_ONNX = os.environ.get("USE_OWLVIT_ONNX", "1") != "0"
+# OWLVIT_MODEL / OWLVIT_ONNX_PATH are overrides; otherwise the per-machine calibrated variant is used
+# (model_select.py), falling back to base-patch32.
 OWLVIT_MODEL = os.environ.get("OWLVIT_MODEL", "google/owlvit-base-patch32")
 OWLVIT_ONNX_PATH = os.environ.get("OWLVIT_ONNX_PATH")
+OWLVIT_VARIANT_OVERRIDDEN = "OWLVIT_MODEL" in os.environ or "OWLVIT_ONNX_PATH" in os.environ
+OWLVIT_AUTO_SELECT = os.environ.get("OWLVIT_AUTO_SELECT", "1") != "0"
+OWLVIT_LATENCY_BUDGET_MS = float(os.environ.get("OWLVIT_LATENCY_BUDGET_MS", "800"))
 OWLVIT_MIN_SCORE = float(os.environ.get("OWLVIT_MIN_SCORE", "0.2"))
+# Candidate verification: LLM picks an index from a contact sheet of OWL-ViT/OCR candidates.
+LLM_VERIFY = os.environ.get("LLM_VERIFY", "0") == "1"
+VERIFY_MAX_CANDIDATES = int(os.environ.get("VERIFY_MAX_CANDIDATES", "8"))
+OWLVIT_CANDIDATE_MIN_SCORE = float(os.environ.get("OWLVIT_CANDIDATE_MIN_SCORE", "0.05"))
 HF_TOKEN = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_TOKEN")
+# Load OWL-ViT in the background right after startup instead of on the first hotkey.
+OWLVIT_WARMUP = os.environ.get("OWLVIT_WARMUP", "1") != "0"
+# Idle prefetch: OCR + OWL-ViT image features for the current screen once it has been stable.
+PREFETCH = os.environ.get("PREFETCH", "1") != "0"
+PREFETCH_INTERVAL_S = float(os.environ.get("PREFETCH_INTERVAL_S", "1.0"))
+PREFETCH_STABLE_S = float(os.environ.get("PREFETCH_STABLE_S", "1.5"))
+PREFETCH_CPU_BUDGET = float(os.environ.get("PREFETCH_CPU_BUDGET", "0.25"))
+# Out-of-process detection (detector_worker.py): OWL-ViT runs in a long-lived worker process that
+# keeps models warm across overlay restarts; DETECTOR_WORKER_OCR=1 sends Tesseract calls there too.
+DETECTOR_WORKER = os.environ.get("DETECTOR_WORKER", "1") != "0"
+DETECTOR_WORKER_OCR = os.environ.get("DETECTOR_WORKER_OCR", "0") == "1"
+WORKER_RETRY_S = float(os.environ.get("WORKER_RETRY_S", "60"))
+# Template fast path: reuse crops of previously located elements (normalized cross-correlation).
+USE_TEMPLATES = os.environ.get("USE_TEMPLATES", "1") != "0"
+TEMPLATE_DIR = Path(os.environ.get("TEMPLATE_DIR", Path(__file__).resolve().parent / "templates"))
+TEMPLATE_MIN_SCORE = float(os.environ.get("TEMPLATE_MIN_SCORE", "0.92"))
+TEMPLATE_DOWNSCALE = int(os.environ.get("TEMPLATE_DOWNSCALE", "4"))
+# A template expires this long after a detector last confirmed it, or after this many misses in a row.
+TEMPLATE_MAX_AGE_S = float(os.environ.get("TEMPLATE_MAX_AGE_S", str(7 * 86400)))
+TEMPLATE_MAX_MISSES = int(os.environ.get("TEMPLATE_MAX_MISSES", "5"))
+# Backend order: adaptive per task bucket from recent success/latency (cascade.py), or fixed.
+CASCADE_ADAPTIVE = os.environ.get("CASCADE_ADAPTIVE", "1") != "0"
+# Record/replay: store each single-capture run's inputs and raw backend outputs for replay_runs.py.
+RECORD_RUNS = os.environ.get("RECORD_RUNS", "0") == "1"
+RUN_STORE_DIR = Path(os.environ.get("RUN_STORE_DIR", Path(__file__).resolve().parent / "run_store"))
+# While recording, OWL-ViT runs with a low floor so replay can evaluate lower thresholds.
+RECORD_OWL_FLOOR = float(os.environ.get("RECORD_OWL_FLOOR", "0.01"))
+RECORD_OWL_TOP_K = int(os.environ.get("RECORD_OWL_TOP_K", "20"))
 # Debug log config (write to project root to avoid protected file issues)
 LOG_PATH = Path(__file__).resolve().parent / "debug_agent.log"
+LOG_ENABLED = os.environ.get("DEBUG_LOG", "1") != "0"
 LOG_SESSION_ID = "debug-session"
 LOG_RUN_ID = os.environ.get("LOG_RUN_ID", str(int(time.time() * 1000)))
 ARTIFACTS_DIR = Path(__file__).resolve().parent / "artifacts"
@@ -46,10 +120,40 @@ ELLIPSE_COLOR = QtGui.QColor(255, 0, 0, 200)
 ELLIPSE_WIDTH = 4
 LABEL_FONT = QtGui.QFont("Menlo", 14)
 OVERLAY_TIMEOUT_MS = 8000  # auto-hide after 8s
+# Multi-monitor mode: capture/detect each display separately and in parallel.
+MULTI_MONITOR = os.environ.get("MULTI_MONITOR", "0") == "1"
+MONITOR_WORKERS = int(os.environ.get("MONITOR_WORKERS", "3"))
+# Coarse-to-fine: OCR (+ OWL-ViT proposals) on a downscaled capture, then full-res detectors on crops.
+COARSE_TO_FINE = os.environ.get("COARSE_TO_FINE", "0") == "1"
+COARSE_MAX_SIDE = int(os.environ.get("COARSE_MAX_SIDE", "1280"))
+COARSE_REGIONS = int(os.environ.get("COARSE_REGIONS", "3"))
+COARSE_REFINE = tuple(b.strip() for b in os.environ.get("COARSE_REFINE", "ocr,owlvit").split(",") if b.strip())
+# Ranked candidates drawn at once (the answer plus runner-ups).
+OVERLAY_MAX_BOXES = int(os.environ.get("OVERLAY_MAX_BOXES", "3"))
+ALT_ELLIPSE_COLOR = QtGui.QColor(255, 140, 0, 180)
+ALT_ELLIPSE_WIDTH = 2
+
+# Job deadlines (seconds): whole hotkey request, per LLM HTTP call, per detector run.
+PIPELINE_DEADLINE_S = float(os.environ.get("PIPELINE_DEADLINE_S", "90"))
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "60"))
+DETECTOR_TIMEOUT_S = float(os.environ.get("DETECTOR_TIMEOUT_S", "20"))
 
 MAX_BOX_FRAC = 0.33  # reject boxes wider/taller than this fraction of screen
 MAX_BOX_AREA_FRAC = 0.35  # reject boxes that cover too much area
 OCR_CONFIG = "--psm 6 --oem 1"
+# OCR text in the LLM prompt: "ranked" = task-relevant lines with their boxes, within about
+# OCR_CONTEXT_TOKENS prompt tokens; "raw" = the first 600 characters in reading order.
+OCR_CONTEXT = os.environ.get("OCR_CONTEXT", "ranked").lower()
+OCR_CONTEXT_TOKENS = int(os.environ.get("OCR_CONTEXT_TOKENS", "120"))
+# OCR preprocessing: grayscale, downscale so text has ~OCR_TARGET_XHEIGHT px x-height at the capture DPR
+# (OCR_DPR, default: primary screen's devicePixelRatio), invert dark themes (auto|1|0), optional binarization.
+# 16 px: Tesseract's accuracy drops quickly below 8 pt at 300 dpi (~16 px x-height), so 2x captures keep full
+# resolution and 3x ones shrink 1.5x. Go lower only where bench_ocr_preprocess.py's recommended_xheight says so.
+OCR_PREPROCESS = os.environ.get("OCR_PREPROCESS", "1") != "0"
+OCR_DPR = os.environ.get("OCR_DPR", "auto")
+OCR_TARGET_XHEIGHT = float(os.environ.get("OCR_TARGET_XHEIGHT", "16"))
+OCR_INVERT = os.environ.get("OCR_INVERT", "auto")
+OCR_BINARIZE = os.environ.get("OCR_BINARIZE", "0") == "1"
 
 TASK_STOP_WORDS = {
     "the",
@@ -73,8 +177,15 @@ TASK_STOP_WORDS = {
 HOTKEY_SPACE = keyboard.Key.space
 HOTKEY_ALT_KEYS = {keyboard.Key.alt_l, keyboard.Key.alt_r, keyboard.Key.alt_gr}
 
-# Ensure pytesseract finds Homebrew tesseract by default on macOS.
-pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"
+
+
+def tesseract():
+    """pytesseract, imported on first OCR (it pulls in numpy, which startup avoids)."""
+    import pytesseract
+
+    # Ensure pytesseract finds Homebrew tesseract by default on macOS.
+    pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"
+    return pytesseract
 
 
 # --- Overlay widget ---------------------------------------------------------
@@ -124,8 +235,38 @@ def scale_bbox_to_screen(bbox, img_size, screen: QtGui.QScreen):
     return (sx, sy, sw, sh), factor, reason
 
 
-class Overlay(QtWidgets.QWidget):
-    def __init__(self):
+# Pens per rank: the chosen box is solid red, runner-up candidates are thinner and dashed.
+def _make_pen(rank: int) -> QtGui.QPen:
+    if rank == 0:
+        return QtGui.QPen(ELLIPSE_COLOR, ELLIPSE_WIDTH)
+    color = QtGui.QColor(ALT_ELLIPSE_COLOR)
+    color.setAlpha(max(60, ALT_ELLIPSE_COLOR.alpha() - 40 * (rank - 1)))
+    pen = QtGui.QPen(color, ALT_ELLIPSE_WIDTH)
+    pen.setStyle(QtCore.Qt.DashLine)
+    return pen
+
+
+class _PaintedBox:
+    __slots__ = ("rect", "text", "text_pos", "pen", "extent")
+
+    def __init__(self, rect: QtCore.QRect, text: str, pen: QtGui.QPen, metrics: QtGui.QFontMetrics):
+        self.rect = rect
+        self.text = text
+        self.pen = pen
+        self.text_pos = QtCore.QPoint(rect.x(), max(0, rect.y() - 10))
+        text_rect = metrics.boundingRect(text).translated(self.text_pos)
+        margin = int(pen.widthF()) + 2
+        # Damage rectangle: ellipse plus stroke plus label.
+        self.extent = rect.adjusted(-margin, -margin, margin, margin).united(text_rect.adjusted(-2, -2, 2, 2))
+
+
+class ScreenOverlay(QtWidgets.QWidget):
+    """
+    Transparent, click-through window covering one QScreen. Repaints only the rectangles of
+    boxes that changed (`update(QRect)`), with pens and font metrics reused between frames.
+    """
+
+    def __init__(self, screen: QtGui.QScreen):
         flags = (
             QtCore.Qt.FramelessWindowHint
             | QtCore.Qt.WindowStaysOnTopHint
@@ -142,53 +283,162 @@ class Overlay(QtWidgets.QWidget):
         pal = self.palette()
         pal.setColor(self.backgroundRole(), QtCore.Qt.transparent)
         self.setPalette(pal)
-        screen = QtWidgets.QApplication.primaryScreen()
-        geo = screen.geometry()
-        self.setGeometry(geo)
-        self.bbox = None
-        self.label = ""
+        self.screen_ref = screen
+        self.setScreen(screen)
+        self.setGeometry(screen.geometry())
+        self._metrics = QtGui.QFontMetrics(LABEL_FONT)
+        self._boxes: list[_PaintedBox] = []
+
+    def set_boxes(self, boxes: list[tuple[QtCore.QRect, str, QtGui.QPen]]):
+        """Replace the boxes (window-local logical rects) and invalidate only old + new extents."""
+        old = self._boxes
+        self._boxes = [_PaintedBox(rect, text, pen, self._metrics) for rect, text, pen in boxes]
+        if not self._boxes:
+            self.hide()
+            return
+        if not self.isVisible():
+            self.show()
+            return  # first show paints everything once
+        for box in old + self._boxes:
+            self.update(box.extent)
+
+    def paintEvent(self, event):
+        dirty = event.rect()
+        painter = QtGui.QPainter(self)
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+        painter.fillRect(dirty, QtCore.Qt.transparent)
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_SourceOver)
+        if not self._boxes:
+            return
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
+        painter.setFont(LABEL_FONT)
+        for box in self._boxes:
+            if not box.extent.intersects(dirty):
+                continue
+            painter.setPen(box.pen)
+            painter.drawEllipse(QtCore.QRectF(box.rect))
+            painter.drawText(box.text_pos, box.text)
+
+
+class Overlay(QtCore.QObject):
+    """
+    Manages one ScreenOverlay per QScreen and routes ranked boxes (capture coordinates)
+    to the screen that contains each box.
+    """
+
+    def __init__(self):
+        super().__init__()
+        app = QtWidgets.QApplication.instance()
+        self._pens = [_make_pen(rank) for rank in range(max(1, OVERLAY_MAX_BOXES))]
+        self._windows: dict[str, ScreenOverlay] = {}
+        for screen in QtGui.QGuiApplication.screens():
+            self._add_screen(screen)
+        app.screenAdded.connect(self._add_screen)
+        app.screenRemoved.connect(self._remove_screen)
         self._timer = QtCore.QTimer(self)
         self._timer.setSingleShot(True)
         self._timer.timeout.connect(self.clear_box)
+        primary = QtWidgets.QApplication.primaryScreen()
+        geo = primary.geometry()
         write_log(
             "H4",
             "overlay:init",
             "overlay init",
-            {"screen": (geo.width(), geo.height()), "dpr": screen.devicePixelRatio()},
+            {
+                "screen": (geo.width(), geo.height()),
+                "dpr": primary.devicePixelRatio(),
+                "screens": [
+                    {"name": s.name(), "geometry": s.geometry().getRect(), "dpr": s.devicePixelRatio()}
+                    for s in QtGui.QGuiApplication.screens()
+                ],
+            },
         )
 
-    def paintEvent(self, _event):
-        if not self.bbox:
-            return
-        x, y, w, h = self.bbox
-        painter = QtGui.QPainter(self)
-        painter.fillRect(self.rect(), QtCore.Qt.transparent)
-        pen = QtGui.QPen(ELLIPSE_COLOR, ELLIPSE_WIDTH)
-        painter.setPen(pen)
-        painter.drawEllipse(QtCore.QRectF(x, y, w, h))
-        painter.setFont(LABEL_FONT)
-        painter.drawText(x, max(0, y - 10), self.label)
+    @QtCore.Slot(QtGui.QScreen)
+    def _add_screen(self, screen: QtGui.QScreen):
+        if screen.name() not in self._windows:
+            self._windows[screen.name()] = ScreenOverlay(screen)
+
+    @QtCore.Slot(QtGui.QScreen)
+    def _remove_screen(self, screen: QtGui.QScreen):
+        win = self._windows.pop(screen.name(), None)
+        if win is not None:
+            win.hide()
+            win.deleteLater()
+
+    def isVisible(self) -> bool:
+        return any(w.isVisible() for w in self._windows.values())
+
+    def _route(self, global_rect: QtCore.QRect) -> Optional[ScreenOverlay]:
+        center = global_rect.center()
+        for win in self._windows.values():
+            if win.screen_ref.geometry().contains(center):
+                return win
+        return self._windows.get(QtWidgets.QApplication.primaryScreen().name())
 
     @QtCore.Slot(tuple, str, tuple)
     def show_box(self, bbox, label, img_size):
-        screen = QtWidgets.QApplication.primaryScreen()
-        scaled_bbox, factor, reason = scale_bbox_to_screen(bbox, img_size, screen)
-        self.bbox = scaled_bbox
-        self.label = label or "target"
+        self.show_boxes([(bbox, label)], img_size)
+
+    def screen_for_monitor(self, rect: tuple[int, int, int, int]) -> Optional[QtGui.QScreen]:
+        """
+        QScreen for an mss monitor rect. mss reports logical points on macOS and physical
+        pixels elsewhere, so try both against each screen's geometry.
+        """
+        left, top, width, height = rect
+        for win in self._windows.values():
+            scr = win.screen_ref
+            geo = scr.geometry()
+            if (geo.x(), geo.y(), geo.width(), geo.height()) == (left, top, width, height):
+                return scr
+            dpr = scr.devicePixelRatio()
+            if (round(geo.x() * dpr), round(geo.y() * dpr), round(geo.width() * dpr), round(geo.height() * dpr)) == (left, top, width, height):
+                return scr
+        return None
+
+    @QtCore.Slot(list, tuple)
+    def show_boxes(self, boxes, img_size):
+        """
+        Show ranked boxes [(bbox, label), ...] in capture coordinates; the first one is the answer.
+        A box may carry a third element, a monitor source (left, top, width, height, img_w, img_h)
+        from capture_monitors, in which case it is scaled with that display's DPR and origin.
+        """
+        primary = QtWidgets.QApplication.primaryScreen()
+        origin = primary.virtualGeometry().topLeft()
+        per_window: dict[str, list] = {name: [] for name in self._windows}
+        shown = []
+        for rank, box in enumerate(boxes[: len(self._pens)]):
+            bbox, label = box[0], box[1]
+            source = box[2] if len(box) > 2 else None
+            screen, size, box_origin = primary, img_size, origin
+            if source:
+                matched = self.screen_for_monitor(tuple(source[:4]))
+                if matched is not None:
+                    screen, size, box_origin = matched, tuple(source[4:6]), matched.geometry().topLeft()
+            scaled_bbox, factor, reason = scale_bbox_to_screen(bbox, size, screen)
+            sx, sy, sw, sh = scaled_bbox
+            global_rect = QtCore.QRect(sx + box_origin.x(), sy + box_origin.y(), sw, sh)
+            win = self._route(global_rect)
+            if win is None:
+                continue
+            local = global_rect.translated(-win.screen_ref.geometry().topLeft())
+            text = (label or "target") if rank == 0 else f"#{rank + 1} {label or ''}".rstrip()
+            per_window[win.screen_ref.name()].append((local, text, self._pens[rank]))
+            shown.append({"raw_bbox": bbox, "scaled_bbox": scaled_bbox, "screen": win.screen_ref.name(), "reason": reason, "factor": factor})
         write_log(
             "H4",
             "overlay:show_box",
             "show_box with scaling",
-            {"raw_bbox": bbox, "scaled_bbox": scaled_bbox, "img_size": img_size, "reason": reason, "factor": factor},
+            {"img_size": img_size, "boxes": shown},
         )
-        self.show()
-        self.repaint()
+        for name, items in per_window.items():
+            self._windows[name].set_boxes(items)
         self._timer.start(OVERLAY_TIMEOUT_MS)
         # Optional capture of live overlay for debugging
         if os.environ.get("DEBUG_CAPTURE") == "1":
             try:
                 ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
-                grab = screen.grabWindow(0)
+                grab = primary.grabWindow(0)
                 out_path = ARTIFACTS_DIR / "overlay_live.png"
                 ok = grab.save(str(out_path), "png")
                 write_log(
@@ -204,10 +454,9 @@ class Overlay(QtWidgets.QWidget):
 
     @QtCore.Slot()
     def clear_box(self):
-        self.bbox = None
-        self.label = ""
-        self.hide()
-        self.repaint()
+        self._timer.stop()
+        for win in self._windows.values():
+            win.set_boxes([])
 
 
 # --- Capture and OCR --------------------------------------------------------
@@ -217,26 +466,140 @@ def capture_screen():
         return Image.frombytes("RGB", shot.size, shot.rgb)
 
 
-def run_ocr(img: Image.Image, max_chars: int = 600):
+class MonitorCapture(NamedTuple):
+    index: int  # mss monitor index (1-based)
+    rect: tuple[int, int, int, int]  # left, top, width, height in mss coordinates
+    image: Image.Image
+
+    @property
+    def dpr(self) -> float:
+        """Pixels per mss unit for this display (2.0 on Retina, 1.0 where mss reports physical pixels)."""
+        return self.image.width / float(self.rect[2] or 1)
+
+    @property
+    def source(self) -> tuple[int, int, int, int, int, int]:
+        """Tag attached to boxes so the overlay can map them onto the right QScreen."""
+        return (*self.rect, self.image.width, self.image.height)
+
+
+def capture_monitors() -> list[MonitorCapture]:
+    """Capture each display separately at its own resolution (instead of one stitched image)."""
+    with mss.mss() as sct:
+        captures = []
+        for i, mon in enumerate(sct.monitors[1:], start=1):
+            shot = sct.grab(mon)
+            captures.append(
+                MonitorCapture(
+                    i,
+                    (mon["left"], mon["top"], mon["width"], mon["height"]),
+                    Image.frombytes("RGB", shot.size, shot.rgb),
+                )
+            )
+        return captures
+
+
+_screen_dpr: Optional[float] = None
+_dpr_override: Optional[float] = None
+
+
+def capture_dpr() -> float:
+    """
+    Pixels per logical pixel of screen captures: set_capture_dpr(), else OCR_DPR, else the primary
+    screen's DPR. Raises without a screen rather than guessing 1.0 (that would skip the Retina downscale).
+    """
+    global _screen_dpr
+    if _dpr_override is not None:
+        return _dpr_override
+    if OCR_DPR != "auto":
+        return float(OCR_DPR)
+    if _screen_dpr is None:
+        # Read once (main() primes it on the GUI thread); OCR runs on worker threads.
+        app = QtGui.QGuiApplication.instance()
+        screen = app.primaryScreen() if app is not None else None
+        if screen is None:
+            raise RuntimeError('capture DPR unknown without a screen: pass --dpr, set OCR_DPR, or label images with "dpr"')
+        _screen_dpr = float(screen.devicePixelRatio())
+    return _screen_dpr
+
+
+def set_capture_dpr(dpr: Optional[float]) -> None:
+    """DPR saved screenshots were captured at, for tools without a screen (--dpr); None clears it."""
+    global _dpr_override
+    _dpr_override = float(dpr) if dpr else None
+
+
+def require_capture_dpr(dpr: Optional[float] = None, labelled: bool = False) -> None:
+    """
+    Headless tools: apply --dpr, then exit unless OCR preprocessing can learn the capture DPR
+    (--dpr, OCR_DPR, or a "dpr" label on every image when `labelled`).
+    """
+    set_capture_dpr(dpr)
+    if not OCR_PREPROCESS or labelled:
+        return
+    try:
+        capture_dpr()
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+
+
+def ocr_dpr(dpr: Optional[float] = None) -> float:
+    """`dpr` if given, else capture_dpr(); 1.0 when preprocessing is off and the DPR does not matter."""
+    if dpr:
+        return float(dpr)
+    return capture_dpr() if OCR_PREPROCESS else 1.0
+
+
+def ocr_input(img: Image.Image, dpr: Optional[float] = None):
+    """(image for Tesseract, scale processed/capture) after OCR preprocessing (unchanged when disabled)."""
+    if not OCR_PREPROCESS:
+        return img, 1.0
+    pre = preprocess_for_ocr(
+        img,
+        dpr=ocr_dpr(dpr),
+        target_xheight=OCR_TARGET_XHEIGHT,
+        invert=OCR_INVERT,
+        binarize=OCR_BINARIZE,
+    )
+    write_log(
+        "H2",
+        "ocr:preprocess",
+        "ocr input prepared",
+        {"size": img.size, "ocr_size": pre.image.size, "scale": round(pre.scale, 3), "inverted": pre.inverted, "binarized": pre.binarized, "ms": pre.ms},
+    )
+    return pre.image, pre.scale
+
+
+def run_ocr(img: Image.Image, max_chars: int = 600, dpr: Optional[float] = None):
+    dpr = ocr_dpr(dpr)  # outside the try: an unknown DPR is a setup error, not an OCR failure
     try:
-        text = pytesseract.image_to_string(img, config=OCR_CONFIG)
+        text = tesseract().image_to_string(ocr_input(img, dpr)[0], config=OCR_CONFIG)
         return text[:max_chars]
     except Exception as exc:
         print(f"OCR failed: {exc}")
         return ""
 
 
-def run_ocr_data(img: Image.Image, max_chars: int = 600):
+def run_ocr_data(img: Image.Image, max_chars: int = 600, dpr: Optional[float] = None):
     """
     Combined OCR that returns both text and word-level data to avoid doing two passes.
+    Word boxes are in `img` coordinates whatever scale the OCR input was prepared at;
+    `dpr` is the pixels-per-logical-pixel of `img` (default: capture_dpr()).
     """
+    dpr = ocr_dpr(dpr)
     try:
-        data = pytesseract.image_to_data(img, output_type=Output.DICT, config=OCR_CONFIG)
+        ocr_img, scale = ocr_input(img, dpr)
+        client = get_detector_client() if DETECTOR_WORKER_OCR else None
+        if client is not None:
+            data = client.call("ocr_data", ocr_img, config=OCR_CONFIG)
+        else:
+            pytesseract = tesseract()
+            data = pytesseract.image_to_data(ocr_img, output_type=pytesseract.Output.DICT, config=OCR_CONFIG)
+        data = scale_ocr_data(data, 1.0 / scale)
         text = " ".join(data.get("text") or [])
         return text[:max_chars], data
     except Exception as exc:
         print(f"OCR data failed: {exc}")
-        return run_ocr(img, max_chars), None
+        return run_ocr(img, max_chars, dpr), None
 
 
 def task_keywords(task: str):
@@ -244,56 +607,410 @@ def task_keywords(task: str):
     return [t for t in tokens if t and t not in TASK_STOP_WORDS]
 
 
-def is_valid_bbox(bbox: tuple[int, int, int, int] | None, label: str | None, img_size: tuple[int, int] | None = None):
+def bbox_reject_reason(bbox: tuple[int, int, int, int] | None, label: str | None, img_size: tuple[int, int] | None = None):
+    """Why a bbox is not usable ("empty", "too_small", "not_found", "too_wide", "too_tall", "too_large_area"), or None."""
     if not bbox:
-        return False
+        return "empty"
     x, y, w, h = bbox
     if w < 4 or h < 4:
-        return False
+        return "too_small"
     if label and str(label).lower() == "not_found":
-        return False
+        return "not_found"
     if img_size:
         img_w, img_h = img_size
         if img_w <= 0 or img_h <= 0:
-            return True
-        if w / img_w > MAX_BOX_FRAC or h / img_h > MAX_BOX_FRAC:
-            return False
+            return None
+        if w / img_w > MAX_BOX_FRAC:
+            return "too_wide"
+        if h / img_h > MAX_BOX_FRAC:
+            return "too_tall"
         if (w * h) / float(img_w * img_h) > MAX_BOX_AREA_FRAC:
-            return False
-    return True
+            return "too_large_area"
+    return None
+
+
+def is_valid_bbox(
+    bbox: tuple[int, int, int, int] | None,
+    label: str | None,
+    img_size: tuple[int, int] | None = None,
+    log: bool = True,
+):
+    reason = bbox_reject_reason(bbox, label, img_size)
+    if reason is not None and log:
+        write_log("H3", "bbox:reject", "bbox rejected", {"reason": reason, "bbox": bbox, "label": label, "img_size": img_size})
+    return reason is None
+
+
+_owlvit_variant: Optional[tuple[str, Optional[str]]] = None
 
 
-def try_owlvit_detect(img: Image.Image, user_task: str) -> Optional[tuple[tuple[int, int, int, int], str, float]]:
+def owlvit_variant() -> tuple[str, Optional[str]]:
+    """(model_id, onnx_path) to run: env override, else this machine's calibrated choice, else the defaults."""
+    global _owlvit_variant
+    if _owlvit_variant is None:
+        variant = (OWLVIT_MODEL, OWLVIT_ONNX_PATH)
+        if OWLVIT_AUTO_SELECT and not OWLVIT_VARIANT_OVERRIDDEN:
+            from model_select import cached_choice
+
+            chosen = cached_choice()
+            if chosen:
+                variant = (chosen["model_id"], chosen.get("onnx_path"))
+        _owlvit_variant = variant
+    return _owlvit_variant
+
+
+def calibrate_owlvit_variant_if_needed():
+    """
+    First run on a machine: time the installed variants and cache the pick (background warmup only).
+    Runs `model_select.py --calibrate` in a subprocess, so the measured models are never resident
+    in the overlay process (where RESIDENCY would reload them on every key press).
+    """
+    global _owlvit_variant
+    from model_select import cached_choice
+
+    if cached_choice():
+        return
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve().parent / "model_select.py"), "--calibrate", "--budget-ms", str(OWLVIT_LATENCY_BUDGET_MS)],
+        capture_output=True,
+        text=True,
+    )
+    try:
+        variants = len(json.loads(proc.stdout)["measurements"])
+    except (ValueError, KeyError, TypeError):
+        variants = None
+    write_log(
+        "H5",
+        "startup:owlvit_calibrated",
+        "owlvit variant calibrated",
+        {
+            "chosen": cached_choice(),
+            "budget_ms": OWLVIT_LATENCY_BUDGET_MS,
+            "variants": variants,
+            "returncode": proc.returncode,
+            "stderr_tail": proc.stderr[-300:] if proc.returncode else None,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        },
+    )
+    _owlvit_variant = None  # re-resolve from the fresh cache entry
+
+
+def try_owlvit_detect(
+    img: Image.Image, user_task: str, features: Optional[dict] = None
+) -> Optional[tuple[tuple[int, int, int, int], str, float]]:
     """
     Best-effort OWL-ViT detection (prefers ONNX if available, then torch pipeline).
     Returns bbox (x,y,w,h), label, score or None on failure.
+    `features` are prefetched OWL-ViT image features for this exact image.
     """
     if not USE_OWLVIT:
         return None
-    det = detect_owlvit(
-        img,
-        user_task,
-        prefer_onnx=USE_OWLVIT_ONNX,
-        model_id=OWLVIT_MODEL,
-        hf_token=HF_TOKEN,
-        onnx_path=OWLVIT_ONNX_PATH,
-        min_score=OWLVIT_MIN_SCORE,
-    )
+    cands = worker_owlvit_candidates(img, user_task, OWLVIT_MIN_SCORE, 1, features)
+    if cands is not None:
+        det = cands[0] if cands else None
+    else:
+        det = detect_owlvit(
+            img,
+            user_task,
+            prefer_onnx=USE_OWLVIT_ONNX,
+            model_id=owlvit_variant()[0],
+            hf_token=HF_TOKEN,
+            onnx_path=owlvit_variant()[1],
+            min_score=OWLVIT_MIN_SCORE,
+            features=_local_features(features),
+        )
     if det is None:
         write_log("H2", "owlvit:miss", "owlvit returned None", {})
     return det
 
 
-def find_bbox_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None = None):
-    keywords = task_keywords(user_task)
-    data = ocr_data
-    if data is None:
-        try:
-            data = pytesseract.image_to_data(img, output_type=Output.DICT)
-        except Exception as exc:
-            write_log("H2", "ocr_fallback:error", "ocr data failed", {"error": str(exc)})
-            return None
+_detector_client: Optional[DetectorClient] = None
+_detector_client_lock = threading.Lock()
+_detector_client_failed_at = 0.0
+
+
+def get_detector_client() -> Optional[DetectorClient]:
+    """
+    Connected detector worker client (started on first use), or None when DETECTOR_WORKER=0 or
+    the worker cannot start; callers then run detectors in-process. A failed start is retried
+    after WORKER_RETRY_S.
+    """
+    global _detector_client, _detector_client_failed_at
+    if not DETECTOR_WORKER:
+        return None
+    if _detector_client is not None:
+        return _detector_client
+    with _detector_client_lock:
+        if _detector_client is None and time.monotonic() - _detector_client_failed_at >= WORKER_RETRY_S:
+            client = DetectorClient(
+                request_timeout_s=DETECTOR_TIMEOUT_S * 3,
+                on_event=lambda event, data: write_log("H5", f"worker:{event}", "detector worker", data),
+            )
+            try:
+                client.connect()
+                _detector_client = client
+            except Exception as exc:
+                _detector_client_failed_at = time.monotonic()
+                write_log("H5", "worker:unavailable", "detector worker failed to start; running in-process", {"error": str(exc)})
+        return _detector_client
+
+
+def _owlvit_kwargs() -> dict:
+    model_id, onnx_path = owlvit_variant()
+    return {"prefer_onnx": USE_OWLVIT_ONNX, "model_id": model_id, "hf_token": HF_TOKEN, "onnx_path": onnx_path}
+
+
+def _local_features(features: Optional[dict]) -> Optional[dict]:
+    """Prefetched features usable in-process (not a handle to features held by the worker)."""
+    return features if features and features.get("backend") != "worker" else None
+
+
+def worker_owlvit_candidates(img: Image.Image, user_task: str, min_score: float, top_k: int, features: Optional[dict] = None):
+    """OWL-ViT candidates from the detector worker; None when the worker is off or failed (run in-process)."""
+    client = get_detector_client()
+    if client is None:
+        return None
+    handle = features if features and features.get("backend") == "worker" else None
+    try:
+        return client.call(
+            "owlvit_candidates", img, user_task=user_task, min_score=min_score, top_k=top_k, features=handle, **_owlvit_kwargs()
+        )
+    except WorkerError as exc:
+        write_log("H2", "owlvit:worker_error", "worker call failed; running in-process", {"error": str(exc)})
+        return None
+
+
+def prefetch_compute(img: Image.Image) -> dict:
+    """
+    Task-independent work for a hotkey on this screen: OCR word data and, if the model is already
+    resident, OWL-ViT image features (prefetch never loads a model or keeps one from idling out).
+    """
+    ocr_text, ocr_data = run_ocr_data(img)
+    features = None
+    if USE_OWLVIT:
+        client = get_detector_client()
+        if client is not None:
+            # The features stay in the worker; this is a handle to them.
+            features = client.call("owlvit_features", img, load=False, **_owlvit_kwargs())
+        else:
+            features = owlvit_image_features(img, load=False, **_owlvit_kwargs())
+    return {"ocr_text": ocr_text or "", "ocr_data": ocr_data, "owl_features": features}
+
+
+_template_store: Optional["TemplateStore"] = None
+
+
+def get_template_store() -> "TemplateStore":
+    global _template_store
+    if _template_store is None:
+        from template_store import TemplateStore
+
+        _template_store = TemplateStore(TEMPLATE_DIR, max_age_s=TEMPLATE_MAX_AGE_S or None, max_misses=TEMPLATE_MAX_MISSES)
+    return _template_store
+
+
+def template_key(user_task: str) -> str:
+    keywords = sorted(set(task_keywords(user_task)))
+    return " ".join(keywords) or user_task.strip().lower()
 
+
+def try_template_match(img: Image.Image, user_task: str) -> Optional[tuple[tuple[int, int, int, int], str, float]]:
+    """
+    Fast path: look for a stored crop of a previously located target for this task.
+    Returns bbox (x,y,w,h), label, score or None.
+    """
+    if not USE_TEMPLATES:
+        return None
+    start = time.perf_counter()
+    try:
+        hit = get_template_store().match(
+            template_key(user_task),
+            img,
+            min_score=TEMPLATE_MIN_SCORE,
+            downscale=TEMPLATE_DOWNSCALE,
+        )
+    except Exception as exc:
+        write_log("H2", "template:error", "template match failed", {"error": str(exc)})
+        return None
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    if hit is None:
+        write_log("H2", "template:miss", "no template match", {"key": template_key(user_task), "latency_ms": latency_ms})
+        return None
+    bbox, label, score = hit
+    write_log(
+        "H2",
+        "template:hit",
+        "template matched",
+        {"bbox": bbox, "label": label, "score": score, "latency_ms": latency_ms},
+    )
+    return hit
+
+
+def template_worthy(stage: Optional[str], label: str) -> bool:
+    """
+    Only confident answers become templates (they are served instantly and before every backend):
+    OWL-ViT above OWLVIT_MIN_SCORE or an LLM-verified candidate, not OCR fallbacks or raw LLM boxes.
+    """
+    return stage == "owlvit" or label.startswith("verify:")
+
+
+def remember_template(img: Image.Image, bbox: tuple[int, int, int, int], label: str, user_task: str, stage: Optional[str]):
+    """Store the crop of a confident detection so the next identical query can skip the models."""
+    if not USE_TEMPLATES or label.startswith("tpl:") or not template_worthy(stage, label):
+        return
+    try:
+        entry = get_template_store().add(template_key(user_task), img, bbox, label)
+        if entry:
+            write_log("H2", "template:store", "stored template", {"key": template_key(user_task), "file": entry["file"]})
+    except Exception as exc:
+        write_log("H2", "template:store_error", "failed to store template", {"error": str(exc)})
+
+
+_run_store: Optional[RunStore] = None
+
+
+def get_run_store() -> RunStore:
+    global _run_store
+    if _run_store is None:
+        _run_store = RunStore(RUN_STORE_DIR)
+    return _run_store
+
+
+def selection_config() -> dict:
+    """Thresholds the selection logic ran with, stored with each recorded run."""
+    return {
+        "owlvit_min_score": OWLVIT_MIN_SCORE,
+        "owlvit_candidate_min_score": OWLVIT_CANDIDATE_MIN_SCORE,
+        "max_box_frac": MAX_BOX_FRAC,
+        "max_box_area_frac": MAX_BOX_AREA_FRAC,
+        "llm_verify": LLM_VERIFY,
+        "llm_retry_mode": LLM_RETRY_MODE,
+        "coarse_to_fine": COARSE_TO_FINE,
+    }
+
+
+def start_run_recording(source: str, force: bool = False) -> Optional[RunRecorder]:
+    """A recorder for one run when RECORD_RUNS=1 (or force), else None; use with `recording(...)`."""
+    if not (RECORD_RUNS or force):
+        return None
+    return RunRecorder(get_run_store(), source, selection_config())
+
+
+def record_run_inputs(img: Image.Image, user_task: str, ocr_text: str, ocr_data: dict | None, plan: Optional[Plan] = None):
+    rec = current_run()
+    if rec is not None:
+        rec.begin(user_task, img)
+        rec.ocr(ocr_text, ocr_data)
+        if plan is not None:
+            rec.set(order=list(plan.order), plan=plan.id)
+
+
+def keyword_score(word: str, keywords: list[str]) -> int:
+    """
+    3 per keyword equal to the word, 2 per keyword contained in (or containing) it. Substring
+    matches need 3+ characters on both sides, so OCR fragments like "a" or "I" match nothing.
+    """
+    word_lower = re.sub(r"[^a-z0-9]", "", word.lower())
+    score = 0
+    for kw in keywords:
+        if word_lower == kw and len(kw) >= 2:
+            score += 3
+        elif min(len(word_lower), len(kw)) >= 3 and (kw in word_lower or word_lower in kw):
+            score += 2
+    return score
+
+
+def keyword_hit(text: str, keywords: list[str]) -> bool:
+    """
+    Whether OCR text really names a task keyword: a whole word equal to one (2+ characters), or a
+    substring match where both sides have 3+ characters ("Settings" for "setting", not "a" for "save").
+    """
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        for kw in keywords:
+            if word == kw and len(kw) >= 2:
+                return True
+            if min(len(word), len(kw)) >= 3 and (kw in word or word in kw):
+                return True
+    return False
+
+
+def approx_tokens(text: str) -> int:
+    """Rough LLaMA-family token count: digits are one token each, other text ~4 characters per token."""
+    digits = sum(c.isdigit() for c in text)
+    return digits + -(-(len(text) - digits) // 4)
+
+
+def ocr_lines(data: dict) -> list[dict]:
+    """Words grouped into Tesseract lines (block, paragraph, line) in reading order, with line boxes."""
+    lines: dict[tuple, dict] = {}
+    for i, raw in enumerate(data.get("text") or []):
+        word = (raw or "").strip()
+        if not word:
+            continue
+        try:
+            conf = float(data.get("conf", ["0"])[i])
+        except Exception:
+            conf = -1.0
+        if conf < 0:
+            continue
+        key = tuple(int((data.get(k) or [0] * (i + 1))[i]) for k in ("block_num", "par_num", "line_num"))
+        x, y, w, h = (int(data[k][i]) for k in ("left", "top", "width", "height"))
+        line = lines.setdefault(key, {"words": [], "box": [x, y, x + w, y + h], "conf": []})
+        line["words"].append(word)
+        line["conf"].append(conf)
+        box = line["box"]
+        box[0], box[1], box[2], box[3] = min(box[0], x), min(box[1], y), max(box[2], x + w), max(box[3], y + h)
+    out = []
+    for line in lines.values():
+        x0, y0, x1, y1 = line["box"]
+        out.append({"text": " ".join(line["words"]), "bbox": (x0, y0, x1 - x0, y1 - y0), "conf": sum(line["conf"]) / len(line["conf"])})
+    return out
+
+
+def ocr_context(data: Optional[dict], user_task: str, img_size: tuple[int, int], budget_tokens: int = OCR_CONTEXT_TOKENS) -> tuple[str, dict]:
+    """
+    Prompt-ready OCR context: lines matching the task keywords first (best first), then the
+    lines nearest the best match, each as `text [x y w h]`, cut at ~budget_tokens.
+    Returns (context, stats for the log).
+    """
+    lines = ocr_lines(data or {})
+    keywords = task_keywords(user_task)
+    img_w, img_h = img_size
+    scored = []
+    for idx, line in enumerate(lines):
+        # Best word, not the sum: long lines of weak matches must not outrank the button label.
+        score = max((keyword_score(w, keywords) for w in line["text"].split()), default=0)
+        scored.append((score, line["conf"], -idx, line))
+    matched = sorted((c for c in scored if c[0] > 0), key=lambda c: c[:3], reverse=True)
+    rest = [c for c in scored if c[0] <= 0]
+    if matched:
+        ax, ay, aw, ah = matched[0][3]["bbox"]
+        cx, cy = ax + aw / 2, ay + ah / 2
+        rest.sort(key=lambda c: abs(c[3]["bbox"][0] + c[3]["bbox"][2] / 2 - cx) + abs(c[3]["bbox"][1] + c[3]["bbox"][3] / 2 - cy))
+    else:
+        # Nothing matches: reading order, minus the menu-bar strip at the very top.
+        rest = [c for c in rest if c[3]["bbox"][1] > img_h * 0.03]
+    parts: list[str] = []
+    used = 0
+    for _score, _conf, _idx, line in matched + rest:
+        x, y, w, h = line["bbox"]
+        # Keep the coordinate brackets intact; cap overly long lines instead.
+        part = f"{line['text'][:60]} [{x} {y} {w} {h}]"
+        cost = approx_tokens(part) + 1
+        if used + cost > budget_tokens:
+            break
+        parts.append(part)
+        used += cost
+    stats = {"lines": len(lines), "used": len(parts), "matched": len(matched), "tokens_est": used, "budget": budget_tokens}
+    return "; ".join(parts), stats
+
+
+def rank_ocr_lines(data: dict, keywords: list[str]):
+    """
+    Score OCR words against task keywords and merge matches per line (a line scores as its best word).
+    Returns [(score, avg_conf, line_bbox, label, line), ...] best first.
+    """
     matches_by_line: dict[int, list[tuple[float, float, tuple[int, int, int, int], str]]] = {}
     n = len(data.get("text", []))
     for i in range(n):
@@ -306,13 +1023,7 @@ def find_bbox_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None =
             conf = -1.0
         if conf < 0:
             continue
-        word_lower = word.lower()
-        score = 0
-        for kw in keywords:
-            if kw in word_lower or word_lower in kw:
-                score += 2
-            elif word_lower.startswith(kw) or kw.startswith(word_lower):
-                score += 1
+        score = keyword_score(word, keywords)
         if not keywords:
             score = conf / 50.0  # weak heuristic when no keywords
         if score <= 0:
@@ -326,13 +1037,9 @@ def find_bbox_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None =
         line = int(data.get("line_num", [0])[i])
         matches_by_line.setdefault(line, []).append((score, conf, bbox, word))
 
-    if not matches_by_line:
-        write_log("H2", "ocr_fallback:miss", "no ocr match", {"keywords": keywords})
-        return None
-
-    best = None
+    ranked = []
     for line, items in matches_by_line.items():
-        total_score = sum(s for s, _, _, _ in items)
+        line_score = max(s for s, _, _, _ in items)
         avg_conf = sum(c for _, c, _, _ in items) / max(1, len(items))
         xs = [b[0] for _, _, b, _ in items]
         ys = [b[1] for _, _, b, _ in items]
@@ -344,14 +1051,33 @@ def find_bbox_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None =
         y1 = max([y + h for y, h in zip(ys, hs)])
         line_bbox = (x0, y0, x1 - x0, y1 - y0)
         label = " ".join([w for _, _, _, w in items])
-        candidate = (total_score, avg_conf, line_bbox, label, line)
-        if best is None or total_score > best[0] or (
-            total_score == best[0] and avg_conf > best[1]
-        ):
-            best = candidate
-
-    if best:
-        score, conf, bbox, label, line = best
+        ranked.append((line_score, avg_conf, line_bbox, label, line))
+    # Stable sort keeps first-seen line on full ties, matching the original single-best scan.
+    ranked.sort(key=lambda c: (c[0], c[1]), reverse=True)
+    return ranked
+
+
+def _ocr_data_or_none(img: Image.Image, ocr_data: dict | None):
+    if ocr_data is not None:
+        return ocr_data
+    try:
+        pytesseract = tesseract()
+        return pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    except Exception as exc:
+        write_log("H2", "ocr_fallback:error", "ocr data failed", {"error": str(exc)})
+        return None
+
+
+def find_bbox_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None = None):
+    keywords = task_keywords(user_task)
+    data = _ocr_data_or_none(img, ocr_data)
+    if data is None:
+        return None
+
+    # Only a line that really names a keyword counts; a stray "a" inside "save" is not a hit.
+    ranked = [r for r in rank_ocr_lines(data, keywords) if keyword_hit(r[3], keywords)]
+    if ranked:
+        score, conf, bbox, label, line = ranked[0]
         write_log(
             "H2",
             "ocr_fallback:hit",
@@ -371,6 +1097,198 @@ def find_bbox_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None =
     return None
 
 
+def find_bbox_candidates_via_ocr(img: Image.Image, user_task: str, ocr_data: dict | None = None, top_k: int = 5):
+    """Top OCR line matches as (bbox, label, score) candidates."""
+    data = _ocr_data_or_none(img, ocr_data)
+    if data is None:
+        return []
+    ranked = rank_ocr_lines(data, task_keywords(user_task))
+    return [(bbox, f"ocr:{label}", float(score)) for score, _conf, bbox, label, _line in ranked[:top_k]]
+
+
+def try_owlvit_candidates(
+    img: Image.Image, user_task: str, top_k: int = 5, features: Optional[dict] = None, min_score: Optional[float] = None
+):
+    """OWL-ViT candidates above min_score (default OWLVIT_CANDIDATE_MIN_SCORE), best first (empty list when disabled/failed)."""
+    if not USE_OWLVIT:
+        return []
+    if min_score is None:
+        min_score = OWLVIT_CANDIDATE_MIN_SCORE
+    cands = worker_owlvit_candidates(img, user_task, min_score, top_k, features)
+    if cands is None:
+        cands = detect_owlvit_candidates(
+            img,
+            user_task,
+            prefer_onnx=USE_OWLVIT_ONNX,
+            model_id=owlvit_variant()[0],
+            hf_token=HF_TOKEN,
+            onnx_path=owlvit_variant()[1],
+            min_score=min_score,
+            top_k=top_k,
+            features=_local_features(features),
+        )
+    if not cands:
+        write_log("H2", "owlvit:miss", "owlvit returned no candidates", {})
+    return cands
+
+
+def recorded_owlvit_candidates(img: Image.Image, user_task: str, top_k: int, features: Optional[dict] = None):
+    """
+    Raw OWL-ViT candidates down to RECORD_OWL_FLOOR (at least RECORD_OWL_TOP_K of them) while a run
+    is being recorded, else None. Callers take their live result from this list instead of
+    detecting twice.
+    """
+    if current_run() is None or not USE_OWLVIT:
+        return None
+    return try_owlvit_candidates(img, user_task, max(top_k, RECORD_OWL_TOP_K), features, min_score=RECORD_OWL_FLOOR)
+
+
+def above(cands: list, min_score: float, top_k: int) -> list:
+    """The first top_k candidates scoring at least min_score (cands are sorted best first)."""
+    return [c for c in cands if c[2] >= min_score][:top_k]
+
+
+def gather_candidates(img: Image.Image, user_task: str, owl_candidates: list, ocr_data: dict | None):
+    """Valid, de-duplicated candidates from OWL-ViT and OCR, interleaved so both sources are represented."""
+    ocr_cands = find_bbox_candidates_via_ocr(img, user_task, ocr_data, top_k=VERIFY_MAX_CANDIDATES)
+    owl_cands = [(b, f"owl:{l}", s) for b, l, s in owl_candidates]
+    merged = []
+    for i in range(max(len(owl_cands), len(ocr_cands))):
+        for source in (owl_cands, ocr_cands):
+            if i < len(source) and is_valid_bbox(source[i][0], source[i][1], img.size, log=False):
+                merged.append(source[i])
+    return dedupe_candidates(merged, limit=VERIFY_MAX_CANDIDATES)
+
+
+class CoarsePass(NamedTuple):
+    scale: float  # downscaled / full
+    ocr_text: str
+    ocr_data: dict | None  # word boxes already mapped back to full-resolution coordinates
+    regions: list  # crop rects (l, t, w, h) in full-resolution coordinates
+    ms: float
+
+
+def coarse_pass(img: Image.Image, user_task: str, refine: tuple = COARSE_REFINE) -> CoarsePass:
+    """
+    OCR on a downscaled capture; its keyword matches (and, if OWL-ViT refines, OWL-ViT
+    proposals on the same small image when OCR has too few) become padded crop regions.
+    """
+    start = time.perf_counter()
+    small, scale = downscale(img, COARSE_MAX_SIDE)
+    ocr_text, small_data = run_ocr_data(small, dpr=ocr_dpr() * scale)
+    data = scale_ocr_data(small_data, 1.0 / scale)
+    proposals = []
+    if data is not None:
+        proposals = [bbox for _s, _c, bbox, _l, _line in rank_ocr_lines(data, task_keywords(user_task))[:COARSE_REGIONS]]
+    if "owlvit" in refine and len(proposals) < COARSE_REGIONS:
+        owl = try_owlvit_candidates(small, user_task, COARSE_REGIONS)
+        proposals += [scale_box(b, 1.0 / scale) for b, _l, _s in owl]
+    regions = merge_regions((region_around(b, img.size) for b in proposals), COARSE_REGIONS)
+    coarse = CoarsePass(scale, ocr_text or "", data, regions, round((time.perf_counter() - start) * 1000, 1))
+    write_log(
+        "H2",
+        "coarse:pass",
+        "coarse proposals",
+        {"scale": round(scale, 3), "proposals": len(proposals), "regions": regions, "ms": coarse.ms},
+    )
+    return coarse
+
+
+def _ocr_candidates_in_crop(crop: Image.Image, user_task: str) -> list:
+    _text, data = run_ocr_data(crop)
+    if data is None:
+        return []
+    return [(bbox, f"ocr:{label}", float(score)) for score, _conf, bbox, label, _line in rank_ocr_lines(data, task_keywords(user_task))[:3]]
+
+
+def refine_coarse(img: Image.Image, coarse: CoarsePass, user_task: str, backend: str) -> list:
+    """
+    Full-resolution candidates from one backend ("ocr" | "owlvit") inside the coarse regions, best first.
+    Labels match the single-pass helpers: "ocr:..." for OCR, raw OWL-ViT labels.
+    """
+
+    def detect(crop: Image.Image) -> list:
+        if backend == "ocr":
+            return _ocr_candidates_in_crop(crop, user_task)
+        return try_owlvit_candidates(crop, user_task, 3)
+
+    start = time.perf_counter()
+    found = refine_in_regions(img, coarse.regions, detect)
+    write_log(
+        "H2",
+        "coarse:refine",
+        "refined in crops",
+        {"backend": backend, "regions": len(coarse.regions), "found": len(found), "ms": round((time.perf_counter() - start) * 1000, 1)},
+    )
+    return found
+
+
+_monitor_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_monitor_pool() -> ThreadPoolExecutor:
+    global _monitor_pool
+    if _monitor_pool is None:
+        _monitor_pool = ThreadPoolExecutor(max_workers=MONITOR_WORKERS, thread_name_prefix="overlay-monitor")
+    return _monitor_pool
+
+
+def ocr_on_monitor(cap: MonitorCapture, _user_task: str = "") -> dict:
+    """Task-independent OCR for one display."""
+    t0 = time.perf_counter()
+    ocr_text, ocr_data = run_ocr_data(cap.image, dpr=cap.dpr)
+    return {"ocr_text": ocr_text or "", "ocr_data": ocr_data, "ocr_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def owlvit_on_monitor(cap: MonitorCapture, user_task: str) -> dict:
+    """OWL-ViT candidates for one display."""
+    t0 = time.perf_counter()
+    owl = try_owlvit_candidates(cap.image, user_task, VERIFY_MAX_CANDIDATES)
+    return {"owl": owl, "owl_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+MONITOR_STEPS = {"ocr": ocr_on_monitor, "owlvit": owlvit_on_monitor}
+
+
+def detect_monitors_parallel(captures: list[MonitorCapture], user_task: str, step: str) -> list[dict]:
+    """Run one per-display step ("ocr" | "owlvit") for every display concurrently; results keep capture order."""
+    start = time.perf_counter()
+    futures = [_get_monitor_pool().submit(MONITOR_STEPS[step], cap, user_task) for cap in captures]
+    results = [f.result() for f in futures]
+    write_log(
+        "H3",
+        "pipeline:monitors_detected",
+        "per-monitor detection finished",
+        {
+            "step": step,
+            "monitors": [{"index": c.index, "size": c.image.size, "dpr": c.dpr, **{k: v for k, v in r.items() if k.endswith("_ms")}} for c, r in zip(captures, results)],
+            "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+        },
+    )
+    return results
+
+
+def rank_monitor_candidates(captures: list[MonitorCapture], results: list[dict], user_task: str):
+    """
+    Merge per-monitor candidates into global rankings.
+    Returns (owl, ocr): owl = [(score, capture, bbox, label)] above OWLVIT_MIN_SCORE,
+    ocr = [(score, conf, capture, bbox, label)]; both best first and already is_valid_bbox-filtered.
+    """
+    keywords = task_keywords(user_task)
+    owl, ocr = [], []
+    for cap, res in zip(captures, results):
+        for bbox, label, score in res.get("owl") or []:
+            if score >= OWLVIT_MIN_SCORE and is_valid_bbox(bbox, label, cap.image.size, log=False):
+                owl.append((score, cap, bbox, f"owl:{label}"))
+        if res["ocr_data"] is not None:
+            for score, conf, bbox, label, _line in rank_ocr_lines(res["ocr_data"], keywords):
+                if is_valid_bbox(bbox, label, cap.image.size, log=False):
+                    ocr.append((score, conf, cap, bbox, f"ocr:{label}"))
+    owl.sort(key=lambda c: c[0], reverse=True)
+    ocr.sort(key=lambda c: (c[0], c[1]), reverse=True)
+    return owl, ocr
+
+
 # --- Model call -------------------------------------------------------------
 def encode_image_png(img: Image.Image):
     buf = io.BytesIO()
@@ -379,6 +1297,8 @@ def encode_image_png(img: Image.Image):
 
 
 def write_log(hypothesis_id: str, location: str, message: str, data: dict):
+    if not LOG_ENABLED:
+        return
     payload = {
         "sessionId": LOG_SESSION_ID,
         "runId": LOG_RUN_ID,
@@ -411,12 +1331,194 @@ def make_prompt(user_task: str, ocr_text: str):
         "Box constraints: width < 33% of screenshot, height < 33%, area < 35%, unless the task explicitly asks for full screen. "
         "If unsure, return "
         '{"label": "not_found", "x": 0, "y": 0, "w": 0, "h": 0, "confidence": 0}. '
-        f"Task: {user_task}. OCR snippets: {ocr_text}."
+        f"Task: {user_task}. {ocr_text_label()}: {ocr_text}."
     )
 
 
-def call_vision_llm(image_bytes: bytes, user_task: str, ocr_text: str, img_size: tuple[int, int]):
+def ocr_text_label() -> str:
+    if OCR_CONTEXT == "ranked":
+        return "OCR lines (text [x y w h] in screenshot pixels, most relevant first)"
+    return "OCR snippets"
+
+
+def prompt_ocr_text(user_task: str, ocr_text: str, ocr_data: Optional[dict], img_size: tuple[int, int]) -> str:
+    """OCR text for make_prompt: the ranked, budgeted context when word data is available, else ocr_text."""
+    if OCR_CONTEXT != "ranked" or ocr_data is None:
+        return ocr_text
+    context, stats = ocr_context(ocr_data, user_task, img_size)
+    write_log(
+        "H1",
+        "llm_prompt:ocr_context",
+        "ranked ocr context",
+        {**stats, "raw_tokens_est": approx_tokens(ocr_text or ""), "chars": len(context)},
+    )
+    return context
+
+
+SYSTEM_PROMPT = "You are a strict JSON generator. Output only one JSON object with keys label,x,y,w,h,confidence. No explanations, no markdown, no code fences, no extra fields."
+STRICT_RETRY_SUFFIX = " (Return a tight box under one-third width/height/area; avoid full-screen; if unsure return not_found.)"
+STRICT_RETRY_FOLLOWUP = (
+    "That box was rejected: it is too large, empty, or not_found. Look again at the same screenshot and return a corrected JSON object "
+    "with a tight box under one-third width/height/area; avoid full-screen; if unsure return not_found."
+)
+
+
+def _chat_payload(messages: list[dict], image_b64: str, max_tokens: int = 300, json_mode: bool = True) -> dict:
+    payload = {
+        "model": LLAMA_MODEL,
+        "messages": messages,
+        "images": [f"data:image/png;base64,{image_b64}"],
+        "max_tokens": max_tokens,
+        "temperature": 0,
+        # Keep the prefix (image embedding + prompt) in the slot's KV cache so a follow-up only prefills new text.
+        "cache_prompt": True,
+        "id_slot": LLAMA_SLOT_ID,
+    }
+    if json_mode:
+        # llama.cpp may ignore response_format; we keep it plus a strict prompt above.
+        payload["response_format"] = {"type": "json_object"}
+        constraint = constrained_fields(LLM_GRAMMAR)
+        if "grammar" in constraint:
+            # A grammar already pins the exact object; generic JSON mode would compete with it.
+            payload.pop("response_format")
+        payload.update(constraint)
+    return payload
+
+
+_llm_stats_lock = threading.Lock()
+LLM_STATS = {"calls": 0, "retries": 0, "parse_failures": 0, "completion_tokens": 0}
+
+
+def _bump_llm_stat(key: str, n: int = 1):
+    with _llm_stats_lock:
+        LLM_STATS[key] += n
+
+
+def llm_stats() -> dict:
+    """Counters since process start, for comparing LLM_GRAMMAR modes (retries, parse failures, tokens per call)."""
+    with _llm_stats_lock:
+        stats = dict(LLM_STATS)
+    stats["grammar"] = LLM_GRAMMAR
+    stats["tokens_per_call"] = round(stats["completion_tokens"] / stats["calls"], 1) if stats["calls"] else 0.0
+    return stats
+
+
+_llm_pool: Optional[LLMPoolSync] = None
+_llm_pool_lock = threading.Lock()
+
+
+def _new_llm_pool(urls: list[str], limit: int) -> LLMPoolSync:
+    return LLMPoolSync(
+        urls,
+        limit=limit,
+        first_slot=LLAMA_SLOT_ID,
+        timeout_s=LLM_TIMEOUT_S,
+        hedge_after_s=LLM_HEDGE_S,
+        max_pending=LLM_POOL_MAX_PENDING,
+        on_event=lambda event, data: write_log("H1", f"llm_pool:{event}", "llm pool", data),
+    )
+
+
+def _server_slots(url: str) -> Optional[int]:
+    """llama-server's total_slots from GET /props, or None when it does not say."""
+    parts = urlsplit(url)
+    try:
+        resp = requests.get(urlunsplit((parts.scheme, parts.netloc, "/props", "", "")), timeout=2)
+        slots = resp.json().get("total_slots") if resp.ok else None
+    except Exception:
+        return None
+    return slots if isinstance(slots, int) and slots > 0 else None
+
+
+def _single_server_pool(slots: int) -> LLMPoolSync:
+    available = _server_slots(LLAMA_API_URL)
+    limit = max(1, min(slots, available) if available else slots)
+    if limit < slots:
+        write_log("H1", "llm_pool:slots_capped", "server has fewer slots", {"wanted": slots, "total_slots": available})
+    return _new_llm_pool([LLAMA_API_URL], limit)
+
+
+def get_llm_pool() -> LLMPoolSync:
+    """Shared pool (created on first use) over LLAMA_API_URLS, else over LLAMA_API_URL with LLAMA_SLOTS slots."""
+    global _llm_pool
+    with _llm_pool_lock:
+        if _llm_pool is None:
+            _llm_pool = _new_llm_pool(LLAMA_API_URLS, LLM_POOL_LIMIT) if LLAMA_API_URLS else _single_server_pool(LLAMA_SLOTS)
+        return _llm_pool
+
+
+def use_llm_slots(concurrency: int) -> LLMPoolSync:
+    """
+    For `concurrency` parallel LLM requests against the single LLAMA_API_URL (batch sim, eval --jobs):
+    size the one-server pool to that many slots, so each in-flight request gets its own llama.cpp
+    slot (LLAMA_SLOT_ID + 0..concurrency-1) instead of queueing behind LLAMA_SLOTS and evicting
+    each other's cached prefix. The server needs `--parallel` >= concurrency.
+    No-op with LLAMA_API_URLS (the pool already has per-request slots) or concurrency <= LLAMA_SLOTS.
+    """
+    global _llm_pool
+    if LLAMA_API_URLS or concurrency <= LLAMA_SLOTS:
+        return get_llm_pool()
+    with _llm_pool_lock:
+        if _llm_pool is None or _llm_pool.capacity < concurrency:
+            old, _llm_pool = _llm_pool, _single_server_pool(concurrency)
+            if old is not None:
+                old.close()
+        return _llm_pool
+
+
+def _post_chat(payload: dict, timeout: float, affinity: Optional[dict] = None) -> str:
+    """
+    POST a chat request through the LLM pool and return the reply text. `affinity` (the call
+    context) records the server and slot used, and a follow-up with the same dict goes back to
+    them so the cached prefix is reused. Inside a scheduler stage, cancelling the stage aborts
+    the request.
+    """
+    start = time.perf_counter()
+    affinity = affinity if affinity is not None else {}
+    data, endpoint, slot = get_llm_pool().chat(
+        payload, timeout, prefer=affinity.get("endpoint"), prefer_slot=affinity.get("slot"), cancel_with=on_abort
+    )
+    affinity.update({"endpoint": endpoint, "slot": slot})
+    status, text_head = 200, json.dumps(data)[:300]
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    # region agent log
+    # llama.cpp reports how many prompt tokens were actually processed (cached prefix is skipped).
+    write_log(
+        "H1",
+        "call_vision_llm:response",
+        "response meta",
+        {
+            "status": status,
+            "endpoint": endpoint,
+            "text_head": text_head,
+            "latency_ms": latency_ms,
+            "usage": data.get("usage") if isinstance(data, dict) else None,
+            "timings": data.get("timings") if isinstance(data, dict) else None,
+        },
+    )
+    # endregion
+    _bump_llm_stat("calls")
+    usage = data.get("usage") or {}
+    _bump_llm_stat("completion_tokens", int(usage.get("completion_tokens") or 0))
+    return data["choices"][0]["message"]["content"]
+
+
+def call_vision_llm(
+    image_bytes: bytes,
+    user_task: str,
+    ocr_text: str,
+    img_size: tuple[int, int],
+    timeout: float = LLM_TIMEOUT_S,
+    context: Optional[dict] = None,
+    ocr_data: Optional[dict] = None,
+):
+    """
+    Ask the vision LLM for a bbox. If `context` is given it is filled with the request messages,
+    image and raw reply so `strict_retry_llm` can extend the same conversation.
+    With `ocr_data` the prompt carries task-ranked OCR lines instead of raw `ocr_text` (OCR_CONTEXT).
+    """
     b64 = base64.b64encode(image_bytes).decode("utf-8")
+    ocr_text = prompt_ocr_text(user_task, ocr_text, ocr_data, img_size)
     prompt = make_prompt(user_task, ocr_text)
     # region agent log
     write_log(
@@ -426,39 +1528,22 @@ def call_vision_llm(image_bytes: bytes, user_task: str, ocr_text: str, img_size:
         {"model": LLAMA_MODEL, "user_task": user_task, "ocr_len": len(ocr_text)},
     )
     # endregion
-    payload = {
-        "model": LLAMA_MODEL,
-        "messages": [
-            {
-                "role": "system",
-                "content": "You are a strict JSON generator. Output only one JSON object with keys label,x,y,w,h,confidence. No explanations, no markdown, no code fences, no extra fields.",
-            },
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-        # llama.cpp may ignore response_format; we keep it plus a strict prompt above.
-        "response_format": {"type": "json_object"},
-        "images": [f"data:image/png;base64,{b64}"],
-        "max_tokens": 300,
-        "temperature": 0,
-    }
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+    if context is not None:
+        context.update({"messages": messages, "image_b64": b64, "content": None})
+    content = None
     try:
-        resp = requests.post(LLAMA_API_URL, json=payload, timeout=60)
-        # region agent log
-        write_log(
-            "H1",
-            "call_vision_llm:response",
-            "response meta",
-            {"status": resp.status_code, "text_head": resp.text[:300]},
-        )
-        # endregion
-        resp.raise_for_status()
-        data = resp.json()
-        content = data["choices"][0]["message"]["content"]
+        content = _post_chat(_chat_payload(messages, b64), timeout, context)
+        note_step("llm", blobs={"content": content}, img_size=list(img_size))
+        if context is not None:
+            context["content"] = content
         return parse_bbox_json(content, img_size)
     except Exception as exc:
+        if content is None:
+            note_step("llm", error=str(exc), img_size=list(img_size))
         print(f"Vision LLM call failed: {exc}")
         # region agent log
         write_log(
@@ -471,6 +1556,171 @@ def call_vision_llm(image_bytes: bytes, user_task: str, ocr_text: str, img_size:
         return None
 
 
+def retry_crop_region(bbox, img_size: tuple[int, int]) -> Optional[tuple[int, int, int, int]]:
+    """
+    Region (x0, y0, x1, y1) around a rejected box for a cropped retry, or None when the box
+    carries no location signal (empty, not_found, or already covering most of the screen).
+    """
+    if not bbox:
+        return None
+    x, y, w, h = bbox
+    img_w, img_h = img_size
+    if w <= 0 or h <= 0 or w > img_w / 2 or h > img_h / 2:
+        return None
+    side_w = min(img_w, max(RETRY_CROP_MIN, 2 * w))
+    side_h = min(img_h, max(RETRY_CROP_MIN, 2 * h))
+    cx, cy = x + w // 2, y + h // 2
+    x0 = max(0, min(img_w - side_w, cx - side_w // 2))
+    y0 = max(0, min(img_h - side_h, cy - side_h // 2))
+    return x0, y0, x0 + side_w, y0 + side_h
+
+
+def _retry_with_cache(context: dict, img_size: tuple[int, int], timeout: float):
+    # Same messages + same image, then the rejected answer and a short follow-up:
+    # the server reuses the cached prefix and only prefills the appended turn.
+    messages = list(context["messages"]) + [
+        {"role": "assistant", "content": context["content"]},
+        {"role": "user", "content": STRICT_RETRY_FOLLOWUP},
+    ]
+    content = None
+    try:
+        content = _post_chat(_chat_payload(messages, context["image_b64"]), timeout, context)
+        note_step("llm", blobs={"content": content}, img_size=list(img_size), retry="cache")
+        return parse_bbox_json(content, img_size)
+    except Exception as exc:
+        if content is None:
+            note_step("llm", error=str(exc), img_size=list(img_size), retry="cache")
+        print(f"Vision LLM retry failed: {exc}")
+        write_log("H1", "llm_retry:error", "cached retry exception", {"error": str(exc)})
+        return None
+
+
+def _retry_with_crop(img: Image.Image, region: tuple[int, int, int, int], user_task: str, timeout: float):
+    x0, y0, x1, y1 = region
+    crop = img.crop(region)
+    result = call_vision_llm(encode_image_png(crop), user_task + STRICT_RETRY_SUFFIX, "", crop.size, timeout=timeout)
+    rec = current_run()
+    if rec is not None:
+        rec.update_last("llm", retry="crop", offset=[x0, y0])
+    if not result:
+        return None
+    (cx, cy, cw, ch), label = result
+    return (cx + x0, cy + y0, cw, ch), label
+
+
+def strict_retry_llm(
+    img: Image.Image,
+    image_bytes: bytes,
+    user_task: str,
+    ocr_text: str,
+    rejected_bbox=None,
+    context: Optional[dict] = None,
+    timeout: float = LLM_TIMEOUT_S,
+    mode: str = LLM_RETRY_MODE,
+    ocr_data: Optional[dict] = None,
+):
+    """
+    Second LLM attempt after the first answer failed is_valid_bbox.
+    Modes: "cache" (extend the cached conversation), "crop" (re-ask on a crop around the rejected box),
+    "full" (resend the full screenshot with a stricter prompt). Falls back to "full" when a cheaper
+    mode has nothing to work with. Returns the parse result (or None); latency is logged per mode.
+    """
+    start = time.perf_counter()
+    _bump_llm_stat("retries")
+    used = mode
+    result = None
+    if used == "crop":
+        region = retry_crop_region(rejected_bbox, img.size)
+        if region:
+            result = _retry_with_crop(img, region, user_task, timeout)
+        else:
+            used = "cache"
+    if used == "cache":
+        if context and context.get("content"):
+            result = _retry_with_cache(context, img.size, timeout)
+        else:
+            used = "full"
+    if used not in ("cache", "crop"):
+        used = "full"
+        result = call_vision_llm(image_bytes, user_task + STRICT_RETRY_SUFFIX, ocr_text, img.size, timeout=timeout, ocr_data=ocr_data)
+    write_log(
+        "H1",
+        "llm_retry:done",
+        "strict retry finished",
+        {
+            "mode": used,
+            "requested_mode": mode,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "ok": result is not None,
+        },
+    )
+    return result
+
+
+def make_choice_prompt(user_task: str, count: int):
+    return (
+        f"The image shows {count} numbered crops from a screenshot. In each crop a red box outlines one candidate UI element. "
+        "Pick the candidate that best satisfies the task. "
+        f"Answer with only the number (1-{count}), or 0 if none of them match. "
+        f"Task: {user_task}."
+    )
+
+
+def parse_choice_index(content: str, count: int) -> Optional[int]:
+    """1-based index from the model reply, or None for 0 / out of range / no number."""
+    match = re.search(r"\d+", content or "")
+    if not match:
+        write_log("H2", "parse_choice:none", "no index in reply", {"content_head": (content or "")[:80]})
+        return None
+    idx = int(match.group(0))
+    if 1 <= idx <= count:
+        return idx
+    write_log("H2", "parse_choice:out_of_range", "index rejected", {"index": idx, "count": count})
+    return None
+
+
+def verify_candidates_llm(
+    img: Image.Image,
+    user_task: str,
+    candidates: list,
+    timeout: float = LLM_TIMEOUT_S,
+):
+    """
+    Ask the LLM to pick one candidate from a numbered contact sheet.
+    Returns (bbox, label) of the chosen candidate or None.
+    """
+    if not candidates:
+        return None
+    sheet = render_contact_sheet(img, candidates)
+    sheet_bytes = encode_image_png(sheet)
+    write_log(
+        "H1",
+        "verify_llm:pre_request",
+        "pre request",
+        {"count": len(candidates), "sheet_size": sheet.size, "sheet_bytes": len(sheet_bytes), "img_size": img.size},
+    )
+    messages = [
+        {"role": "system", "content": "You answer with a single integer and nothing else."},
+        {"role": "user", "content": make_choice_prompt(user_task, len(candidates))},
+    ]
+    try:
+        content = _post_chat(
+            _chat_payload(messages, base64.b64encode(sheet_bytes).decode("utf-8"), max_tokens=4, json_mode=False),
+            timeout,
+        )
+    except Exception as exc:
+        print(f"Vision LLM verify failed: {exc}")
+        write_log("H1", "verify_llm:error", "exception", {"error": str(exc)})
+        return None
+    note_step("verify", blobs={"content": content, "candidates": candidates})
+    idx = parse_choice_index(content, len(candidates))
+    if idx is None:
+        return None
+    bbox, label, score = candidates[idx - 1]
+    write_log("H1", "verify_llm:choice", "llm picked candidate", {"index": idx, "bbox": bbox, "label": label, "score": score})
+    return bbox, f"verify:{label}"
+
+
 def parse_bbox_json(content: str, img_size: tuple[int, int]):
     # Try direct JSON first.
     # region agent log
@@ -490,6 +1740,7 @@ def parse_bbox_json(content: str, img_size: tuple[int, int]):
         end = content.rfind("}")
         if start == -1 or end == -1 or end <= start:
             print("No JSON found in response.")
+            _bump_llm_stat("parse_failures")
             return None
         try:
             obj = json.loads(content[start : end + 1])
@@ -503,6 +1754,7 @@ def parse_bbox_json(content: str, img_size: tuple[int, int]):
                 {"error": str(exc)},
             )
             # endregion
+            _bump_llm_stat("parse_failures")
             return None
 
     for key in ("x", "y", "w", "h"):
@@ -516,6 +1768,7 @@ def parse_bbox_json(content: str, img_size: tuple[int, int]):
                 {"obj": obj},
             )
             # endregion
+            _bump_llm_stat("parse_failures")
             return None
     try:
         x_raw, y_raw, w_raw, h_raw = obj["x"], obj["y"], obj["w"], obj["h"]
@@ -559,23 +1812,149 @@ def parse_bbox_json(content: str, img_size: tuple[int, int]):
             {"obj": obj, "error": str(exc)},
         )
         # endregion
+        _bump_llm_stat("parse_failures")
         return None
 
 
+# --- Cascade ----------------------------------------------------------------
+_cascade_planner: Optional[CascadePlanner] = None
+_cascade_lock = threading.Lock()
+
+
+def get_cascade_planner() -> CascadePlanner:
+    global _cascade_planner
+    with _cascade_lock:
+        if _cascade_planner is None:
+            _cascade_planner = CascadePlanner(adaptive=CASCADE_ADAPTIVE)
+        return _cascade_planner
+
+
+def use_isolated_cascade_planner(adaptive: bool = False) -> CascadePlanner:
+    """
+    Replace the shared planner with one that neither reads nor writes the on-disk history and never
+    explores (eval / sim runs): fixed DEFAULT_ORDER by default, so results are reproducible.
+    """
+    global _cascade_planner
+    with _cascade_lock:
+        _cascade_planner = CascadePlanner(adaptive=adaptive, explore=0.0, history_path=None, log_path=None)
+        return _cascade_planner
+
+
+def plan_cascade(user_task: str, ocr_text: str) -> Plan:
+    available = [s for s in DEFAULT_ORDER if s != "owlvit" or USE_OWLVIT]
+    plan = get_cascade_planner().plan(task_bucket(user_task, task_keywords(user_task), ocr_text), available)
+    write_log(
+        "H3",
+        "cascade:plan",
+        "backend order planned",
+        {"plan": plan.id, "bucket": plan.bucket, "policy": plan.policy, "order": plan.order, "skipped": plan.skipped},
+    )
+    return plan
+
+
+def cascade_stages(img: Image.Image, user_task: str, ocr_text: str, ocr_data: dict | None) -> dict:
+    """
+    Stage callables for CascadePlanner.run outside the hotkey job (eval, headless sim).
+    Each returns (bbox, label, backend) for a valid box, else None.
+    """
+
+    def owlvit():
+        raw = recorded_owlvit_candidates(img, user_task, 1)
+        if raw is None:
+            owl = try_owlvit_detect(img, user_task)
+            note_step("owlvit", blobs={"candidates": [owl] if owl else []}, min_score=OWLVIT_MIN_SCORE)
+        else:
+            owl = next(iter(above(raw, OWLVIT_MIN_SCORE, 1)), None)
+            note_step("owlvit", blobs={"candidates": raw}, min_score=RECORD_OWL_FLOOR)
+        if owl and is_valid_bbox(owl[0], owl[1], img.size):
+            return owl[0], f"owl:{owl[1]}", "owlvit"
+        return None
+
+    def llava():
+        image_bytes = encode_image_png(img)
+        llm_context: dict = {}
+        result = call_vision_llm(image_bytes, user_task, ocr_text, img.size, context=llm_context, ocr_data=ocr_data)
+        if result and is_valid_bbox(result[0], result[1], img.size):
+            return result[0], result[1], "llava"
+        retry = strict_retry_llm(
+            img, image_bytes, user_task, ocr_text, rejected_bbox=result[0] if result else None, context=llm_context, ocr_data=ocr_data
+        )
+        if retry and is_valid_bbox(retry[0], retry[1], img.size):
+            return retry[0], retry[1], "llava_retry"
+        return None
+
+    def ocr():
+        note_step("ocr")
+        fallback = find_bbox_via_ocr(img, user_task, ocr_data)
+        if fallback and is_valid_bbox(fallback[0], fallback[1], img.size):
+            return fallback[0], fallback[1], "ocr"
+        return None
+
+    return {"owlvit": owlvit, "llava": llava, "ocr": ocr}
+
+
+def locate_cascade(img: Image.Image, user_task: str, ocr_text: str, ocr_data: dict | None):
+    """
+    Run the planned backend order. Returns (bbox, label, backend, plan); backend "none" on a miss.
+    Inside `recording(...)` the run is recorded for replay_runs.py.
+    """
+    plan = plan_cascade(user_task, ocr_text)
+    record_run_inputs(img, user_task, ocr_text, ocr_data, plan)
+    result, _stage = get_cascade_planner().run(plan, cascade_stages(img, user_task, ocr_text, ocr_data), task=user_task)
+    rec = current_run()
+    if result is None:
+        if rec is not None:
+            rec.finish()
+        return None, None, "none", plan
+    if rec is not None:
+        rec.finish(result[0], result[1], result[2])
+    return result[0], result[1], result[2], plan
+
+
 # --- Controller -------------------------------------------------------------
 class Controller(QtCore.QObject):
-    show_box_signal = QtCore.Signal(tuple, str, tuple)
     clear_signal = QtCore.Signal()
+    # Results from workers carry their job id so stale jobs can never paint over a newer request.
+    result_signal = QtCore.Signal(int, list, tuple)
+    no_result_signal = QtCore.Signal(int)
 
     def __init__(self, overlay: Overlay):
         super().__init__()
         self.overlay = overlay
-        self._worker = None
+        self._scheduler = JobScheduler(
+            workers=1,
+            stage_workers=3,
+            on_error=self._on_job_error,
+            on_cancel=self._on_job_cancel,
+        )
         self._last_hotkey_ts = 0
+        self._last_worker_touch = 0.0
         self.alt_down = False
         self.user_task = ""
-        self.show_box_signal.connect(self.overlay.show_box)
         self.clear_signal.connect(self.overlay.clear_box)
+        self.result_signal.connect(self._on_result)
+        self.no_result_signal.connect(self._on_no_result)
+        self._prefetcher = (
+            IdlePrefetcher(
+                capture_screen,
+                prefetch_compute,
+                interval_s=PREFETCH_INTERVAL_S,
+                stable_s=PREFETCH_STABLE_S,
+                cpu_budget=PREFETCH_CPU_BUDGET,
+                is_busy=self._scheduler.is_busy,
+                on_event=lambda event, data: write_log("H5", f"prefetch:{event}", "idle prefetch", data),
+            )
+            if PREFETCH
+            else None
+        )
+
+    def shutdown(self):
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+        self._scheduler.shutdown()
+        # Leave the worker running so the next overlay start finds its models loaded.
+        if _detector_client is not None:
+            _detector_client.close()
 
     def start_hotkey_listener(self):
         listener = keyboard.Listener(
@@ -587,6 +1966,11 @@ class Controller(QtCore.QObject):
         listener.start()
 
     def _on_press(self, key):
+        # Any key counts as activity: bring back models that were unloaded while idle.
+        RESIDENCY.notify_active()
+        if _detector_client is not None and time.monotonic() - self._last_worker_touch > 5.0:
+            self._last_worker_touch = time.monotonic()
+            _detector_client.post("touch")
         if key in HOTKEY_ALT_KEYS:
             self.alt_down = True
         if key == HOTKEY_SPACE and self.alt_down:
@@ -605,20 +1989,23 @@ class Controller(QtCore.QObject):
         if self.overlay.isVisible():
             self.clear_signal.emit()
             return
-        if self._worker and self._worker.is_alive():
-            print("Analysis already running; skipping.")
-            return
         task = self.prompt_for_task()
         if not task:
             return
+        if self._scheduler.is_busy():
+            write_log("H3", "scheduler:supersede", "new request supersedes in-flight job", {"job": self._scheduler.latest_id})
         self.user_task = task
-        self._worker = threading.Thread(target=self._run_pipeline, daemon=True)
-        self._worker.start()
+        run = self._run_pipeline_multi if MULTI_MONITOR else self._run_pipeline_recorded
+        job = self._scheduler.submit(
+            lambda j, t=task: run(j, t),
+            deadline_s=PIPELINE_DEADLINE_S,
+        )
+        write_log("H3", "scheduler:submit", "job submitted", {"job": job.id, "user_task": task})
 
     def prompt_for_task(self):
         default_task = self.user_task or read_prompt().strip() or "Highlight the primary action button."
         task, ok = QtWidgets.QInputDialog.getText(
-            self.overlay,
+            None,
             "Overlay Task",
             "What do you want to do? (e.g., 'Highlight the Render button in Blender')",
             text=default_task,
@@ -627,96 +2014,382 @@ class Controller(QtCore.QObject):
             return task.strip()
         return None
 
-    def _run_pipeline(self):
-        try:
+    @QtCore.Slot(int, list, tuple)
+    def _on_result(self, job_id, boxes, img_size):
+        # Runs on the Qt thread, so this check cannot race with handle_hotkey submitting a newer job.
+        if job_id != self._scheduler.latest_id:
+            write_log("H3", "scheduler:stale", "dropping stale result", {"job": job_id, "latest": self._scheduler.latest_id})
+            return
+        self.overlay.show_boxes(boxes, img_size)
+
+    @QtCore.Slot(int)
+    def _on_no_result(self, job_id):
+        if job_id == self._scheduler.latest_id:
+            self.overlay.clear_box()
+
+    def _emit_result(self, job: Job, bbox, label, img_size, alternates=()):
+        """Send the answer plus ranked runner-up candidates [(bbox, label, score), ...] to the overlay."""
+        boxes = [(tuple(bbox), label)]
+        boxes += [(tuple(b), l) for b, l, _s in alternates if tuple(b) != tuple(bbox)]
+        self._emit_boxes(job, boxes, img_size)
+
+    def _emit_boxes(self, job: Job, boxes: list, img_size):
+        job.check("show")
+        self.result_signal.emit(job.id, boxes[:OVERLAY_MAX_BOXES], tuple(img_size))
+
+    def _on_job_cancel(self, job: Job, exc: JobCancelled):
+        write_log("H3", "pipeline:cancelled", "job cancelled", {"job": job.id, "reason": job.reason, "detail": str(exc)})
+
+    def _on_job_error(self, job: Job, exc: Exception):
+        print(f"Pipeline error: {exc}")
+        write_log("H3", "pipeline:error", "pipeline exception", {"job": job.id, "error": str(exc)})
+        self.no_result_signal.emit(job.id)
+
+    def _run_pipeline_recorded(self, job: Job, user_task: str):
+        # Single-capture runs are recorded for replay_runs.py when RECORD_RUNS=1.
+        with recording(start_run_recording("overlay")):
+            self._run_pipeline(job, user_task)
+
+    def _run_pipeline(self, job: Job, user_task: str):
+        write_log(
+            "H3",
+            "pipeline:start",
+            "pipeline start",
+            {"job": job.id, "user_task": user_task},
+        )
+        img = capture_screen()
+        user_task = user_task or read_prompt().strip() or "Highlight the primary action button."
+        # Idle prefetch: if the fresh capture is pixel-identical to the prefetched screen, reuse its
+        # OCR and OWL-ViT image features (the fresh capture is what every backend sees).
+        pre = self._prefetcher.lookup(img) if self._prefetcher is not None else None
+        owl_features = None
+        if pre is not None:
+            owl_features = pre.result.get("owl_features")
             write_log(
                 "H3",
-                "pipeline:start",
-                "pipeline start",
-                {"user_task": self.user_task},
+                "pipeline:prefetch_hit",
+                "using prefetched OCR/features",
+                {"job": job.id, "age_s": round(time.monotonic() - pre.computed_at, 1), "saved_ms": pre.compute_ms, "owl_features": owl_features is not None},
             )
-            img = capture_screen()
-            ocr_text, ocr_data = run_ocr_data(img)
-            if ocr_text is None:
-                ocr_text = ""
-            user_task = self.user_task or read_prompt().strip() or "Highlight the primary action button."
 
-            # First try OWL-ViT detector (free/local). If a reasonable box is found, use it.
-            owl = try_owlvit_detect(img, user_task)
-            if owl:
-                obox, olabel, oscore = owl
-                if is_valid_bbox(obox, olabel, img.size):
-                    write_log(
-                        "H3",
-                        "pipeline:owlvit",
-                        "owlvit bbox accepted",
-                        {"bbox": obox, "label": olabel, "score": oscore, "img_size": img.size},
+        rec = current_run()
+        if rec is not None:
+            rec.begin(user_task, img)
+
+        # Fast path: same target seen before with identical pixels.
+        job.check("template")
+        tpl = try_template_match(img, user_task)
+        if tpl:
+            tbox, tlabel, _tscore = tpl
+            if rec is not None:
+                rec.finish(tbox, f"tpl:{tlabel}", "template")
+            write_log("H3", "pipeline:show", "showing bbox", {"job": job.id, "bbox": tbox, "label": f"tpl:{tlabel}", "backend": "template", "img_size": img.size})
+            self._emit_result(job, tbox, f"tpl:{tlabel}", img.size)
+            return
+
+        job.check("ocr")
+        # Coarse-to-fine: the prompt/bucket OCR runs on the downscaled capture; detectors refine on crops.
+        coarse = coarse_pass(img, user_task) if COARSE_TO_FINE and pre is None else None
+        if pre is not None:
+            ocr_text, ocr_data = pre.result["ocr_text"], pre.result["ocr_data"]
+        elif coarse is not None:
+            ocr_text, ocr_data = coarse.ocr_text, coarse.ocr_data
+        else:
+            ocr_text, ocr_data = run_ocr_data(img)
+        if ocr_text is None:
+            ocr_text = ""
+
+        # Backend order comes from the cascade planner (fastest expected route to a valid box
+        # for this kind of task); each stage returns (bbox, label) or None.
+        plan = plan_cascade(user_task, ocr_text)
+        record_run_inputs(img, user_task, ocr_text, ocr_data, plan)
+        owl_candidates: list = []
+        owl_ran = False
+        alternates: list = []
+
+        def owlvit():
+            # Verification mode keeps the runner-up boxes too, for the contact sheet.
+            nonlocal owl_candidates, owl_ran
+            owl_ran = True
+            refine = coarse is not None and "owlvit" in COARSE_REFINE
+            raw = None
+            try:
+                if refine:
+                    owl_candidates = self._scheduler.run_stage(
+                        job, DETECTOR_TIMEOUT_S, refine_coarse, img, coarse, user_task, "owlvit"
+                    )
+                    top = owl_candidates[0] if owl_candidates else None
+                    owl = top if top and top[2] >= OWLVIT_MIN_SCORE else None
+                elif current_run() is not None:
+                    # Recording: one low-floor detection serves both the live result and replay.
+                    top_k = VERIFY_MAX_CANDIDATES if LLM_VERIFY else 1
+                    raw = self._scheduler.run_stage(
+                        job, DETECTOR_TIMEOUT_S, recorded_owlvit_candidates, img, user_task, top_k, owl_features
+                    )
+                    if LLM_VERIFY:
+                        owl_candidates = above(raw, OWLVIT_CANDIDATE_MIN_SCORE, top_k)
+                    owl = next(iter(above(raw, OWLVIT_MIN_SCORE, 1)), None)
+                elif LLM_VERIFY:
+                    owl_candidates = self._scheduler.run_stage(
+                        job, DETECTOR_TIMEOUT_S, try_owlvit_candidates, img, user_task, VERIFY_MAX_CANDIDATES, owl_features
                     )
-                    bbox, label = obox, f"owl:{olabel}"
-                    self.show_box_signal.emit(bbox, label, img.size)
-                    return
+                    top = owl_candidates[0] if owl_candidates else None
+                    owl = top if top and top[2] >= OWLVIT_MIN_SCORE else None
                 else:
+                    owl = self._scheduler.run_stage(job, DETECTOR_TIMEOUT_S, try_owlvit_detect, img, user_task, owl_features)
+            except StageTimeout as exc:
+                write_log("H3", "pipeline:owlvit_timeout", "owlvit deadline exceeded", {"job": job.id, "error": str(exc)})
+                note_step("owlvit", error="timeout")
+                return None
+            if raw is not None:
+                recorded, floor = raw, RECORD_OWL_FLOOR
+            elif owl_candidates:
+                recorded, floor = owl_candidates, OWLVIT_CANDIDATE_MIN_SCORE
+            else:
+                recorded, floor = [owl] if owl else [], OWLVIT_MIN_SCORE
+            note_step("owlvit", blobs={"candidates": recorded}, min_score=floor, coarse=refine)
+            if not owl:
+                return None
+            obox, olabel, oscore = owl
+            if not is_valid_bbox(obox, olabel, img.size):
+                write_log(
+                    "H3",
+                    "pipeline:owlvit_reject",
+                    "owlvit bbox rejected",
+                    {"bbox": obox, "label": olabel, "score": oscore, "img_size": img.size},
+                )
+                return None
+            write_log(
+                "H3",
+                "pipeline:owlvit",
+                "owlvit bbox accepted",
+                {"bbox": obox, "label": olabel, "score": oscore, "img_size": img.size},
+            )
+            alternates[:] = [(b, f"owl:{l}", sc) for b, l, sc in owl_candidates[1:] if is_valid_bbox(b, l, img.size, log=False)]
+            return obox, f"owl:{olabel}"
+
+        def llava():
+            nonlocal owl_candidates
+            if LLM_VERIFY:
+                if USE_OWLVIT and not owl_ran:
+                    # The planner put llava first (or skipped owlvit): the sheet still needs OWL-ViT boxes.
+                    try:
+                        owl_candidates = self._scheduler.run_stage(
+                            job, DETECTOR_TIMEOUT_S, try_owlvit_candidates, img, user_task, VERIFY_MAX_CANDIDATES, owl_features
+                        )
+                    except StageTimeout as exc:
+                        write_log("H3", "pipeline:owlvit_timeout", "owlvit deadline exceeded", {"job": job.id, "error": str(exc), "for": "verify"})
+                candidates = gather_candidates(img, user_task, owl_candidates, ocr_data)
+                picked = self._call_llm(job, verify_candidates_llm, img, user_task, candidates) if candidates else None
+                if picked:
                     write_log(
                         "H3",
-                        "pipeline:owlvit_reject",
-                        "owlvit bbox rejected",
-                        {"bbox": obox, "label": olabel, "score": oscore, "img_size": img.size},
+                        "pipeline:verify",
+                        "llm verified candidate",
+                        {"job": job.id, "bbox": picked[0], "label": picked[1], "candidates": len(candidates), "img_size": img.size},
                     )
+                    alternates[:] = candidates
+                    return picked
+                write_log("H3", "pipeline:verify_miss", "no candidate verified; grounding on full screenshot", {"candidates": len(candidates)})
 
             image_bytes = encode_image_png(img)
-            result = call_vision_llm(image_bytes, user_task, ocr_text, img.size)
-            if result:
-                bbox, label = result
-            else:
-                bbox, label = (0, 0, 0, 0), "not_found"
-
+            llm_context: dict = {}
+            result = self._call_llm(job, call_vision_llm, image_bytes, user_task, ocr_text, img.size, context=llm_context, ocr_data=ocr_data)
+            bbox, label = result if result else ((0, 0, 0, 0), "not_found")
             if not is_valid_bbox(bbox, label, img.size):
-                strict_task = user_task + " (Return a tight box under one-third width/height/area; avoid full-screen; if unsure return not_found.)"
-                retry = call_vision_llm(image_bytes, strict_task, ocr_text, img.size)
+                retry = self._call_llm(
+                    job,
+                    strict_retry_llm,
+                    img,
+                    image_bytes,
+                    user_task,
+                    ocr_text,
+                    rejected_bbox=bbox,
+                    context=llm_context,
+                    ocr_data=ocr_data,
+                )
                 if retry:
                     bbox, label = retry
                 write_log(
                     "H3",
                     "pipeline:retry_strict",
                     "retry with stricter constraints",
-                    {"bbox": bbox, "label": label, "img_size": img.size},
+                    {"bbox": bbox, "label": label, "img_size": img.size, "mode": LLM_RETRY_MODE},
                 )
-
-            if not is_valid_bbox(bbox, label, img.size):
+            return (bbox, label) if is_valid_bbox(bbox, label, img.size) else None
+
+        def ocr():
+            fallback = None
+            if coarse is not None and "ocr" in COARSE_REFINE:
+                refined = [c for c in refine_coarse(img, coarse, user_task, "ocr") if is_valid_bbox(c[0], c[1], img.size, log=False)]
+                fallback = (refined[0][0], refined[0][1]) if refined else None
+                note_step("ocr", blobs={"refined": refined})
+            else:
+                note_step("ocr")
+            if not fallback:
                 fallback = find_bbox_via_ocr(img, user_task, ocr_data)
-                if fallback:
-                    bbox, label = fallback
-                    write_log(
-                        "H3",
-                        "pipeline:fallback_ocr",
-                        "using ocr fallback",
-                        {"bbox": bbox, "label": label, "img_size": img.size},
-                    )
-                else:
-                    write_log(
-                        "H3",
-                        "pipeline:no_result",
-                        "no bbox result",
-                        {},
-                    )
-                    self.clear_signal.emit()
-                    return
+            if fallback:
+                write_log(
+                    "H3",
+                    "pipeline:fallback_ocr",
+                    "using ocr fallback",
+                    {"bbox": fallback[0], "label": fallback[1], "img_size": img.size},
+                )
+            return fallback
+
+        result, stage = get_cascade_planner().run(
+            plan,
+            {"owlvit": owlvit, "llava": llava, "ocr": ocr},
+            check=job.check,
+            task=user_task,
+        )
+        if result is None:
             write_log(
                 "H3",
-                "pipeline:show",
-                "showing bbox",
-                {"bbox": bbox, "label": label, "img_size": img.size},
+                "pipeline:no_result",
+                "no bbox result",
+                {"job": job.id, "plan": plan.id},
             )
-            self.show_box_signal.emit(bbox, label, img.size)
-        except Exception as exc:
-            print(f"Pipeline error: {exc}")
-            write_log(
-                "H3",
-                "pipeline:error",
-                "pipeline exception",
-                {"error": str(exc)},
+            if rec is not None:
+                rec.finish()
+            self.no_result_signal.emit(job.id)
+            return
+        bbox, label = result
+        if rec is not None:
+            rec.finish(bbox, label, stage)
+        job.check("show")
+        write_log(
+            "H3",
+            "pipeline:show",
+            "showing bbox",
+            {"job": job.id, "bbox": bbox, "label": label, "stage": stage, "backend": stage, "img_size": img.size},
+        )
+        remember_template(img, bbox, label, user_task, stage)
+        self._emit_result(job, bbox, label, img.size, alternates)
+
+    def _run_pipeline_multi(self, job: Job, user_task: str):
+        """
+        Multi-monitor variant: capture each display at its own DPR, OCR every display in parallel,
+        then run the planned cascade where OWL-ViT also runs per display in parallel; rankings are
+        merged globally and each box is tagged with the display it came from.
+        """
+        write_log("H3", "pipeline:start", "pipeline start (multi-monitor)", {"job": job.id, "user_task": user_task})
+        captures = capture_monitors()
+        user_task = user_task or read_prompt().strip() or "Highlight the primary action button."
+
+        job.check("template")
+        for cap in captures:
+            tpl = try_template_match(cap.image, user_task)
+            if tpl:
+                tbox, tlabel, _tscore = tpl
+                write_log(
+                    "H3",
+                    "pipeline:show",
+                    "showing bbox",
+                    {"job": job.id, "bbox": tbox, "label": f"tpl:{tlabel}", "backend": "template", "monitor": cap.index},
+                )
+                self._emit_boxes(job, [(tbox, f"tpl:{tlabel}", cap.source)], cap.image.size)
+                return
+
+        try:
+            results = self._scheduler.run_stage(job, DETECTOR_TIMEOUT_S, detect_monitors_parallel, captures, user_task, "ocr")
+        except StageTimeout as exc:
+            write_log("H3", "pipeline:monitors_timeout", "per-monitor detection deadline exceeded", {"job": job.id, "error": str(exc)})
+            write_log("H3", "pipeline:no_result", "no bbox result", {"job": job.id, "reason": "timeout"})
+            self.no_result_signal.emit(job.id)
+            return
+        # Same planner (order, skips, history, decision log) as the single-capture path; the stages
+        # work on all displays and return (capture, bbox, label).
+        plan = plan_cascade(user_task, "\n".join(r["ocr_text"] for r in results))
+        backend = None
+
+        def owlvit():
+            try:
+                owl_results = self._scheduler.run_stage(job, DETECTOR_TIMEOUT_S, detect_monitors_parallel, captures, user_task, "owlvit")
+            except StageTimeout as exc:
+                write_log("H3", "pipeline:owlvit_timeout", "owlvit deadline exceeded", {"job": job.id, "error": str(exc)})
+                return None
+            for res, owl_res in zip(results, owl_results):
+                res.update(owl_res)
+            owl, _ocr = rank_monitor_candidates(captures, results, user_task)
+            if not owl:
+                return None
+            _score, cap, bbox, label = owl[0]
+            write_log("H3", "pipeline:owlvit", "owlvit bbox accepted", {"bbox": bbox, "label": label, "monitor": cap.index})
+            return cap, bbox, label
+
+        def llava():
+            nonlocal backend
+            # LLM grounding on a single display: the one with the strongest OCR evidence, else the primary.
+            _owl, ocr_ranked = rank_monitor_candidates(captures, results, user_task)
+            cap = ocr_ranked[0][2] if ocr_ranked else captures[0]
+            res = results[captures.index(cap)]
+            image_bytes = encode_image_png(cap.image)
+            llm_context: dict = {}
+            result = self._call_llm(
+                job, call_vision_llm, image_bytes, user_task, res["ocr_text"], cap.image.size, context=llm_context, ocr_data=res["ocr_data"]
             )
-            self.clear_signal.emit()
+            backend = "llava"
+            if not (result and is_valid_bbox(result[0], result[1], cap.image.size)):
+                backend = "llava_retry"
+                result = self._call_llm(
+                    job,
+                    strict_retry_llm,
+                    cap.image,
+                    image_bytes,
+                    user_task,
+                    res["ocr_text"],
+                    rejected_bbox=result[0] if result else None,
+                    context=llm_context,
+                    ocr_data=res["ocr_data"],
+                )
+            if result and is_valid_bbox(result[0], result[1], cap.image.size):
+                return cap, result[0], result[1]
+            return None
+
+        def ocr():
+            _owl, ocr_ranked = rank_monitor_candidates(captures, results, user_task)
+            if not ocr_ranked:
+                return None
+            _s, _c, cap, bbox, label = ocr_ranked[0]
+            write_log("H3", "pipeline:fallback_ocr", "using ocr fallback", {"bbox": bbox, "label": label, "monitor": cap.index})
+            return cap, bbox, label
+
+        result, stage = get_cascade_planner().run(plan, {"owlvit": owlvit, "llava": llava, "ocr": ocr}, check=job.check, task=user_task)
+        if result is None:
+            write_log("H3", "pipeline:no_result", "no bbox result", {"job": job.id, "plan": plan.id})
+            self.no_result_signal.emit(job.id)
+            return
+        cap, bbox, label = result
+        job.check("show")
+        write_log(
+            "H3",
+            "pipeline:show",
+            "showing bbox",
+            {"job": job.id, "bbox": bbox, "label": label, "stage": stage, "backend": backend if stage == "llava" else stage, "monitor": cap.index},
+        )
+        remember_template(cap.image, bbox, label, user_task, stage)
+        owl_ranked, ocr_ranked = rank_monitor_candidates(captures, results, user_task)
+        runners_up = [(c, b, l) for _s, c, b, l in owl_ranked] + [(c, b, l) for _s, _conf, c, b, l in ocr_ranked]
+        self._emit_ranked(job, [(cap, bbox, label)] + runners_up)
+
+    def _emit_ranked(self, job: Job, ranked: list):
+        boxes, seen = [], set()
+        for cap, bbox, label in ranked:
+            key = (cap.index, tuple(bbox))
+            if key not in seen:
+                seen.add(key)
+                boxes.append((tuple(bbox), label, cap.source))
+        self._emit_boxes(job, boxes, ranked[0][0].image.size)
+
+    def _call_llm(self, job: Job, fn, *args, **kwargs):
+        # HTTP timeout follows the job deadline; the stage wait adds a little slack for connect/parse.
+        http_timeout = job.remaining(LLM_TIMEOUT_S) or LLM_TIMEOUT_S
+        try:
+            return self._scheduler.run_stage(job, http_timeout + 1.0, fn, *args, timeout=max(1.0, http_timeout), **kwargs)
+        except StageTimeout as exc:
+            write_log("H1", "call_vision_llm:deadline", "llm deadline exceeded", {"job": job.id, "error": str(exc)})
+            return None
 
 
 # --- Prompt helper ----------------------------------------------------------
@@ -731,6 +2404,43 @@ def read_prompt():
 
 
 # --- Entry ------------------------------------------------------------------
+def start_background_warmup():
+    """Import/load heavy backends on a daemon thread once the hotkey listener is already live."""
+
+    def _warm():
+        start = time.perf_counter()
+        try:
+            if USE_TEMPLATES:
+                get_template_store()
+            if USE_OWLVIT and OWLVIT_AUTO_SELECT and not OWLVIT_VARIANT_OVERRIDDEN:
+                calibrate_owlvit_variant_if_needed()
+            client = get_detector_client() if USE_OWLVIT else None
+            if USE_OWLVIT and OWLVIT_WARMUP:
+                if client is not None:
+                    client.call("warmup", timeout=PIPELINE_DEADLINE_S, **_owlvit_kwargs())
+                else:
+                    warmup_owlvit(**_owlvit_kwargs())
+            write_log(
+                "H5",
+                "startup:warmup_done",
+                "background warmup finished",
+                {
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "memory": RESIDENCY.memory_report(),
+                    "worker_memory": client.call("ping")["memory"] if client is not None else None,
+                },
+            )
+        except Exception as exc:
+            write_log("H5", "startup:warmup_error", "background warmup failed", {"error": str(exc)})
+
+    threading.Thread(target=_warm, name="overlay-warmup", daemon=True).start()
+
+
+def log_residency_event(event: str, data: dict):
+    """Model load/unload events from the residency manager, with the per-backend memory after it."""
+    write_log("H5", f"memory:{event}", f"model {event}", {**data, "memory": RESIDENCY.memory_report()})
+
+
 def main():
     if os.environ.get("SKIP_RESET_LOG") != "1":
         reset_log()
@@ -742,10 +2452,21 @@ def main():
     signal.signal(signal.SIGINT, signal.SIG_DFL)
     app = QtWidgets.QApplication([])
     overlay = Overlay()
+    capture_dpr()
     controller = Controller(overlay)
+    app.aboutToQuit.connect(controller.shutdown)
     app.aboutToQuit.connect(reset_log)
+    RESIDENCY.on_event = log_residency_event
     controller.start_hotkey_listener()
-    overlay.hide()
+    if controller._prefetcher is not None:
+        controller._prefetcher.start()
+    write_log(
+        "H5",
+        "startup:listener_live",
+        "hotkey listener started",
+        {"since_process_start_ms": round((time.perf_counter() - _PROCESS_T0) * 1000, 1)},
+    )
+    start_background_warmup()
     app.exec()
 
 
@@ -1,15 +1,40 @@
+"""
+OWL-ViT zero-shot detection (ONNX, torch fallback).
+
+Local ONNX exports run torch-free through owlvit_onnx (numpy + onnxruntime + tokenizers);
+other ONNX models go through optimum, which needs torch for its tensors and post-processing.
+Without ONNX, torch on CPU runs through owlvit_torch_cpu (direct calls, optional int8 / bf16,
+torch.compile); GPUs and OWLVIT_TORCH_FAST=0 use a transformers pipeline.
+Heavy backends (numpy, onnxruntime, torch, transformers) are imported on first use so that
+importing this module is cheap; `warmup_owlvit` loads them ahead of the first hotkey.
+Loaded models live in `RESIDENCY`, which unloads them when idle or over the RSS budget.
+"""
 import os
-from functools import lru_cache
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
-import numpy as np
-import onnxruntime as ort
-import torch
 from PIL import Image
-from transformers import OwlViTProcessor, pipeline
+
+from model_residency import ResidencyManager
+
+# Process RSS budget and idle timeout for resident models (0 disables either).
+OWLVIT_RSS_BUDGET_MB = float(os.environ.get("OWLVIT_RSS_BUDGET_MB", "3072"))
+MODEL_IDLE_UNLOAD_S = float(os.environ.get("MODEL_IDLE_UNLOAD_S", "600"))
+
+# Also serializes loads, so background warmup and the first hotkey load a model once.
+RESIDENCY = ResidencyManager(budget_mb=OWLVIT_RSS_BUDGET_MB, idle_unload_s=MODEL_IDLE_UNLOAD_S)
+# Run local ONNX exports without torch (0 forces the optimum path).
+OWLVIT_ONNX_NUMPY = os.environ.get("OWLVIT_ONNX_NUMPY", "1") != "0"
+# Torch on CPU: direct model calls with tuned threads / precision instead of a pipeline (0 = pipeline).
+OWLVIT_TORCH_FAST = os.environ.get("OWLVIT_TORCH_FAST", "1") != "0"
+OWLVIT_TORCH_THREADS = int(os.environ.get("OWLVIT_TORCH_THREADS", "0"))
+# fp32 by default: dynamic int8 shifts scores, so OWLVIT_MIN_SCORE would need re-tuning (opt in with int8).
+OWLVIT_TORCH_PRECISION = os.environ.get("OWLVIT_TORCH_PRECISION", "fp32").lower()
+OWLVIT_TORCH_COMPILE = os.environ.get("OWLVIT_TORCH_COMPILE", "0") == "1"
 
 
 def _provider_order():
+    import onnxruntime as ort
+
     available = set(ort.get_available_providers())
     order = []
     for p in ("MPSExecutionProvider", "CoreMLExecutionProvider", "CUDAExecutionProvider"):
@@ -19,14 +44,66 @@ def _provider_order():
     return order
 
 
-@lru_cache(maxsize=1)
-def _load_onnx(model_id: str, hf_token: Optional[str]):
+def _load_onnx(model_id: str, hf_token: Optional[str], touch: bool = True):
+    return RESIDENCY.get(("onnx", model_id), "onnx", lambda: _build_onnx(model_id, hf_token), touch=touch)
+
+
+def _load_onnx_numpy(onnx_path: str, touch: bool = True):
+    """Torch-free OwlViTOnnx for a local export, or None (not a complete local export, or disabled)."""
+    if not OWLVIT_ONNX_NUMPY:
+        return None
+    from owlvit_onnx import model_files
+
+    files = model_files(onnx_path)
+    if files is None:
+        return None
+    return RESIDENCY.get(("onnx-np", onnx_path), "onnx", lambda: _build_onnx_numpy(*files), touch=touch)
+
+
+def _build_onnx_numpy(onnx_file: str, model_dir: str):
+    try:
+        from owlvit_onnx import OwlViTOnnx
+
+        return OwlViTOnnx(onnx_file, model_dir, providers=_provider_order())
+    except Exception:
+        return None
+
+
+def load_onnx_backend(model_id: str, onnx_path: Optional[str] = None, hf_token: Optional[str] = None):
+    """
+    Load the ONNX backend detect_owlvit_candidates(prefer_onnx=True) would use for this variant.
+    Returns its residency key (check RESIDENCY.loaded(key) after a detection to be sure it did not
+    fall back to torch), or None when neither the NumPy nor the optimum backend loads.
+    """
+    model_to_load = onnx_path if onnx_path else model_id
+    if _load_onnx_numpy(model_to_load) is not None:
+        return ("onnx-np", model_to_load)
+    model, processor = _load_onnx(model_to_load, hf_token)
+    if model is None or processor is None:
+        RESIDENCY.unload(("onnx", model_to_load), "onnx_failed")
+        return None
+    return ("onnx", model_to_load)
+
+
+def _build_onnx(model_id: str, hf_token: Optional[str]):
     try:
         from optimum.onnxruntime.modeling_ort import ORTModelForObjectDetection  # type: ignore
+        from transformers import OwlViTProcessor
     except Exception:
         return None, None
     providers = _provider_order()
     try:
+        if model_id.endswith(".onnx") and os.path.isfile(model_id):
+            # A specific exported file, e.g. models/owlvit-base-onnx-int8/model.quant.onnx.
+            model_dir, file_name = os.path.split(model_id)
+            model = ORTModelForObjectDetection.from_pretrained(
+                model_dir,
+                file_name=file_name,
+                export=False,
+                provider=providers[0],
+            )
+            processor = OwlViTProcessor.from_pretrained(model_dir)
+            return model, processor
         model = ORTModelForObjectDetection.from_pretrained(
             model_id,
             export=True,
@@ -39,8 +116,44 @@ def _load_onnx(model_id: str, hf_token: Optional[str]):
         return None, None
 
 
-@lru_cache(maxsize=1)
-def _load_torch_pipeline(model_id: str, device: int, hf_token: Optional[str]):
+def _load_torch_pipeline(model_id: str, device, hf_token: Optional[str], touch: bool = True):
+    return RESIDENCY.get(
+        ("torch", model_id, str(device)),
+        "torch",
+        lambda: _build_torch_pipeline(model_id, device, hf_token),
+        touch=touch,
+    )
+
+
+def _torch_device():
+    import torch
+
+    device_pref = os.environ.get("OWLVIT_DEVICE", "auto").lower()
+    if device_pref == "cpu":
+        return -1
+    if device_pref == "mps":
+        return torch.device("mps") if torch.backends.mps.is_available() else -1
+    if device_pref == "cuda":
+        return 0 if torch.cuda.is_available() else -1
+    return 0 if torch.cuda.is_available() else (torch.device("mps") if torch.backends.mps.is_available() else -1)
+
+
+def _build_torch_pipeline(model_id: str, device, hf_token: Optional[str]):
+    if device == -1 and OWLVIT_TORCH_FAST:
+        try:
+            from owlvit_torch_cpu import OwlViTTorchCPU
+
+            return OwlViTTorchCPU(
+                model_id,
+                hf_token,
+                threads=OWLVIT_TORCH_THREADS,
+                precision=OWLVIT_TORCH_PRECISION,
+                compile=OWLVIT_TORCH_COMPILE,
+            )
+        except Exception:
+            pass  # e.g. no quantized engine or compiler on this host: plain pipeline below
+    from transformers import pipeline
+
     det = pipeline(
         "zero-shot-object-detection",
         model=model_id,
@@ -50,69 +163,211 @@ def _load_torch_pipeline(model_id: str, device: int, hf_token: Optional[str]):
     return det
 
 
-def detect_owlvit(
+def owlvit_image_features(
+    img: Image.Image,
+    prefer_onnx: bool = True,
+    model_id: str = "google/owlvit-base-patch32",
+    hf_token: Optional[str] = None,
+    onnx_path: Optional[str] = None,
+    load: bool = True,
+) -> Optional[dict]:
+    """
+    Task-independent part of detection for `img`, reusable by detect_owlvit_candidates(features=...).
+    Torch: vision-tower embeddings and predicted boxes, so a query only runs the text tower and class
+    head. ONNX (one fused graph): the preprocessed pixel_values only.
+    With load=False nothing is loaded and the model is not marked as used (for background prefetch);
+    returns None if the backend is not resident, or on failure.
+    """
+    try:
+        if prefer_onnx:
+            onnx_model = onnx_path if onnx_path else model_id
+            if load or RESIDENCY.loaded(("onnx-np", onnx_model)):
+                np_model = _load_onnx_numpy(onnx_model, touch=load)
+                if np_model is not None:
+                    return {"backend": "onnx", "model": onnx_model, "size": img.size, "pixel_values": np_model.preprocess_image(img)}
+            if load or RESIDENCY.loaded(("onnx", onnx_model)):
+                model, processor = _load_onnx(onnx_model, hf_token, touch=load)
+                if model is not None and processor is not None:
+                    pixel_values = processor(images=img, return_tensors="pt")["pixel_values"].cpu().numpy()
+                    return {"backend": "onnx", "model": onnx_model, "size": img.size, "pixel_values": pixel_values}
+            elif not load:
+                return None
+
+        import torch
+
+        device = _torch_device()
+        if not load and not RESIDENCY.loaded(("torch", model_id, str(device))):
+            return None
+        det = _load_torch_pipeline(model_id, device, hf_token, touch=load)
+        with torch.inference_mode():
+            pixel_values = det.image_processor(images=img, return_tensors="pt")["pixel_values"].to(det.model.device)
+            feature_map, _ = det.model.image_embedder(pixel_values=pixel_values)
+            b, h, w, d = feature_map.shape
+            image_feats = feature_map.reshape(b, h * w, d)
+            pred_boxes = det.model.box_predictor(image_feats, feature_map)
+        return {"backend": "torch", "model": model_id, "size": img.size, "image_feats": image_feats, "pred_boxes": pred_boxes}
+    except Exception:
+        return None
+
+
+def _torch_from_features(det, features: dict, user_task: str, threshold: float) -> dict:
+    """Text tower + class head against cached image features; same output as the full forward pass."""
+    import torch
+    from transformers.models.owlvit.modeling_owlvit import OwlViTObjectDetectionOutput
+
+    with torch.inference_mode():
+        text = det.tokenizer([user_task], return_tensors="pt").to(det.model.device)
+        query_embeds = det.model.owlvit.get_text_features(**text)[:, None, :]
+        query_mask = text["input_ids"][None, :, 0] > 0
+        pred_logits, _ = det.model.class_predictor(features["image_feats"], query_embeds, query_mask)
+        outputs = OwlViTObjectDetectionOutput(logits=pred_logits, pred_boxes=features["pred_boxes"])
+        w, h = features["size"]
+        return det.image_processor.post_process_object_detection(
+            outputs, threshold=threshold, target_sizes=torch.tensor([[h, w]])
+        )[0]
+
+
+def _top_candidates(results: dict, top_k: int, min_score: float, label_fn) -> list:
+    scores = results["scores"].tolist()
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    candidates = []
+    for idx in order[:top_k]:
+        score = scores[idx]
+        if score < min_score:
+            break
+        x0, y0, x1, y1 = results["boxes"][idx].tolist()
+        bbox = (int(x0), int(y0), max(0, int(x1 - x0)), max(0, int(y1 - y0)))
+        candidates.append((bbox, label_fn(results["labels"][idx].item()), float(score)))
+    return candidates
+
+
+def detect_owlvit_candidates(
     img: Image.Image,
     user_task: str,
     prefer_onnx: bool = True,
     model_id: str = "google/owlvit-base-patch32",
     hf_token: Optional[str] = None,
     onnx_path: Optional[str] = None,
-    min_score: float = 0.2,
-) -> Optional[Tuple[tuple[int, int, int, int], str, float]]:
+    min_score: float = 0.05,
+    top_k: int = 5,
+    features: Optional[dict] = None,
+) -> List[Tuple[tuple[int, int, int, int], str, float]]:
     """
-    Returns (bbox, label, score) where bbox = (x,y,w,h), or None on failure.
+    Returns up to top_k (bbox, label, score) candidates sorted by score, bbox = (x,y,w,h).
+    Empty list on failure or when nothing scores above min_score.
+    `features` from owlvit_image_features(img, ...) skips the task-independent work when it matches
+    the backend and model in use.
     """
-    # ONNX path
+    # ONNX path: torch-free for local exports, optimum otherwise.
     if prefer_onnx:
+        model_to_load = onnx_path if onnx_path else model_id
+        onnx_features = features if features and features["backend"] == "onnx" and features["model"] == model_to_load else None
+        np_model = _load_onnx_numpy(model_to_load)
+        if np_model is not None:
+            try:
+                pixel_values = onnx_features["pixel_values"] if onnx_features else None
+                results = np_model.detect(img, [user_task], threshold=min(min_score, 0.05), pixel_values=pixel_values)
+                return _top_candidates(results, top_k, min_score, lambda _label: user_task)
+            except Exception:
+                RESIDENCY.unload(("onnx-np", model_to_load), "onnx_failed")
         try:
-            model_to_load = onnx_path if onnx_path else model_id
+            import torch
+
             model, processor = _load_onnx(model_to_load, hf_token)
             if model is not None and processor is not None:
-                inputs = processor(text=[user_task], images=img, return_tensors="pt")
-                # ORT expects numpy
-                onnx_inputs = {k: v.cpu().numpy() for k, v in inputs.items()}
+                if onnx_features:
+                    inputs = processor(text=[user_task], return_tensors="pt")
+                    onnx_inputs = {k: v.cpu().numpy() for k, v in inputs.items()}
+                    onnx_inputs["pixel_values"] = onnx_features["pixel_values"]
+                else:
+                    inputs = processor(text=[user_task], images=img, return_tensors="pt")
+                    # ORT expects numpy
+                    onnx_inputs = {k: v.cpu().numpy() for k, v in inputs.items()}
                 outputs = model(**onnx_inputs)
                 target_sizes = torch.tensor([[img.height, img.width]])
-                results = processor.post_process_object_detection(outputs, threshold=0.05, target_sizes=target_sizes)[0]
-                scores = results["scores"].tolist()
-                if not scores:
-                    return None
-                idx = int(np.argmax(scores))
-                score = scores[idx]
-                if score < min_score:
-                    return None
-                boxes = results["boxes"][idx].tolist()
-                labels = results["labels"][idx].item()
-                label_name = processor.tokenizer.decode([labels]) if hasattr(processor, "tokenizer") else "owlvit"
-                x0, y0, x1, y1 = boxes
-                bbox = (int(x0), int(y0), int(x1 - x0), int(y1 - y0))
-                return bbox, label_name, float(score)
+                results = processor.post_process_object_detection(outputs, threshold=min(min_score, 0.05), target_sizes=target_sizes)[0]
+                return _top_candidates(
+                    results,
+                    top_k,
+                    min_score,
+                    lambda label: processor.tokenizer.decode([label]) if hasattr(processor, "tokenizer") else "owlvit",
+                )
         except Exception:
-            pass
+            # Falling back to torch: do not keep the broken ORT model resident alongside it.
+            RESIDENCY.unload(("onnx", model_to_load), "onnx_failed")
 
     # Torch pipeline fallback
     try:
-        device_pref = os.environ.get("OWLVIT_DEVICE", "auto").lower()
-        if device_pref == "cpu":
-            device = -1
-        elif device_pref == "mps":
-            device = torch.device("mps") if torch.backends.mps.is_available() else -1
-        elif device_pref == "cuda":
-            device = 0 if torch.cuda.is_available() else -1
-        else:
-            device = 0 if torch.cuda.is_available() else (torch.device("mps") if torch.backends.mps.is_available() else -1)
+        device = _torch_device()
         det = _load_torch_pipeline(model_id, device, hf_token)
-        outputs = det(img, candidate_labels=[user_task])
-        if not outputs:
-            return None
-        best = max(outputs, key=lambda r: r.get("score", 0))
-        if best.get("score", 0) < min_score:
-            return None
-        box = best.get("box", {})
-        x0, y0 = int(box.get("xmin", 0)), int(box.get("ymin", 0))
-        x1, y1 = int(box.get("xmax", 0)), int(box.get("ymax", 0))
-        bbox = (x0, y0, max(0, x1 - x0), max(0, y1 - y0))
-        return bbox, best.get("label", "owlvit"), float(best.get("score", 0.0))
+        threshold = min(min_score, 0.1)
+        if features and features["backend"] == "torch" and features["model"] == model_id:
+            results = _torch_from_features(det, features, user_task, threshold)
+            return _top_candidates(results, top_k, min_score, lambda _label: user_task)
+        if hasattr(det, "detect"):  # OwlViTTorchCPU
+            results = det.detect(img, [user_task], threshold=threshold)
+            return _top_candidates(results, top_k, min_score, lambda _label: user_task)
+        outputs = det(img, candidate_labels=[user_task], threshold=threshold)
+        candidates = []
+        for r in sorted(outputs or [], key=lambda r: r.get("score", 0), reverse=True)[:top_k]:
+            if r.get("score", 0) < min_score:
+                break
+            box = r.get("box", {})
+            x0, y0 = int(box.get("xmin", 0)), int(box.get("ymin", 0))
+            x1, y1 = int(box.get("xmax", 0)), int(box.get("ymax", 0))
+            bbox = (x0, y0, max(0, x1 - x0), max(0, y1 - y0))
+            candidates.append((bbox, r.get("label", "owlvit"), float(r.get("score", 0.0))))
+        return candidates
     except Exception:
-        return None
+        return []
+
+
+def detect_owlvit(
+    img: Image.Image,
+    user_task: str,
+    prefer_onnx: bool = True,
+    model_id: str = "google/owlvit-base-patch32",
+    hf_token: Optional[str] = None,
+    onnx_path: Optional[str] = None,
+    min_score: float = 0.2,
+    features: Optional[dict] = None,
+) -> Optional[Tuple[tuple[int, int, int, int], str, float]]:
+    """
+    Returns (bbox, label, score) where bbox = (x,y,w,h), or None on failure.
+    """
+    candidates = detect_owlvit_candidates(
+        img,
+        user_task,
+        prefer_onnx=prefer_onnx,
+        model_id=model_id,
+        hf_token=hf_token,
+        onnx_path=onnx_path,
+        min_score=min_score,
+        top_k=1,
+        features=features,
+    )
+    return candidates[0] if candidates else None
+
 
+def warmup_owlvit(
+    prefer_onnx: bool = True,
+    model_id: str = "google/owlvit-base-patch32",
+    hf_token: Optional[str] = None,
+    onnx_path: Optional[str] = None,
+) -> None:
+    """
+    Import the backends, load the model and run one tiny inference so the first real query
+    does not pay for it. Best effort (failures surface on the first real query); meant to run
+    on a background thread after the UI is up.
+    """
+    probe = Image.new("RGB", (64, 64), (255, 255, 255))
+    detect_owlvit_candidates(
+        probe,
+        "button",
+        prefer_onnx=prefer_onnx,
+        model_id=model_id,
+        hf_token=hf_token,
+        onnx_path=onnx_path,
+        min_score=1.0,
+        top_k=1,
+    )
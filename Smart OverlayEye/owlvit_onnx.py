@@ -0,0 +1,143 @@
+"""
+Torch-free OWL-ViT inference on an exported ONNX model.
+
+Only numpy, onnxruntime and tokenizers are needed: image preprocessing (resize, center crop,
+rescale, normalize), CLIP tokenization, box decoding and score post-processing mirror
+OwlViTProcessor / OwlViTImageProcessor in NumPy against a plain `onnxruntime.InferenceSession`.
+Works on exports from export_owlvit_onnx.py (model.onnx or model.quant.onnx plus the processor
+files saved next to it: tokenizer.json, tokenizer_config.json, preprocessor_config.json).
+"""
+import json
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+# OwlViTImageProcessor defaults, used when preprocessor_config.json leaves a field out.
+_CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+_CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+_PROCESSOR_FILES = ("tokenizer.json", "preprocessor_config.json")
+
+
+def model_files(onnx_path: str) -> Optional[tuple[str, str]]:
+    """(onnx file, processor dir) for an exported .onnx file or export dir, or None if incomplete."""
+    if os.path.isdir(onnx_path):
+        model_dir = onnx_path
+        onnx_file = next((os.path.join(model_dir, f) for f in ("model.onnx", "model.quant.onnx") if os.path.isfile(os.path.join(model_dir, f))), None)
+    else:
+        model_dir, onnx_file = os.path.dirname(onnx_path) or ".", onnx_path
+    if not onnx_file or not os.path.isfile(onnx_file):
+        return None
+    if not all(os.path.isfile(os.path.join(model_dir, f)) for f in _PROCESSOR_FILES):
+        return None
+    return onnx_file, model_dir
+
+
+def _size_hw(value, default: int) -> tuple[int, int]:
+    if isinstance(value, dict):
+        if "height" in value and "width" in value:
+            return int(value["height"]), int(value["width"])
+        side = value.get("shortest_edge") or value.get("longest_edge") or default
+        return int(side), int(side)
+    if isinstance(value, (list, tuple)):
+        return int(value[0]), int(value[1])
+    side = int(value or default)
+    return side, side
+
+
+class OwlViTOnnx:
+    def __init__(self, onnx_file: str, model_dir: str, providers: Optional[Sequence[str]] = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        available = set(ort.get_available_providers())
+        providers = [p for p in (providers or ["CPUExecutionProvider"]) if p in available] or ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(onnx_file, providers=providers)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+        with open(os.path.join(model_dir, "preprocessor_config.json"), encoding="utf-8") as fh:
+            cfg = json.load(fh)
+        self.do_resize = cfg.get("do_resize", True)
+        self.size = _size_hw(cfg.get("size"), 768)
+        self.resample = int(cfg.get("resample", Image.BICUBIC))
+        self.do_center_crop = cfg.get("do_center_crop", True)
+        self.crop_size = _size_hw(cfg.get("crop_size"), 768)
+        self.rescale_factor = float(cfg.get("rescale_factor", 1 / 255)) if cfg.get("do_rescale", True) else 1.0
+        normalize = cfg.get("do_normalize", True)
+        self.mean = np.asarray(cfg.get("image_mean", _CLIP_MEAN) if normalize else (0.0, 0.0, 0.0), dtype=np.float32)
+        self.std = np.asarray(cfg.get("image_std", _CLIP_STD) if normalize else (1.0, 1.0, 1.0), dtype=np.float32)
+
+        tok_cfg = {}
+        tok_cfg_path = os.path.join(model_dir, "tokenizer_config.json")
+        if os.path.isfile(tok_cfg_path):
+            with open(tok_cfg_path, encoding="utf-8") as fh:
+                tok_cfg = json.load(fh)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        # OwlViTProcessor pads every query to model_max_length (16) with the pad token ("!", id 0).
+        self.max_length = int(tok_cfg.get("model_max_length") or 16)
+        pad_token = tok_cfg.get("pad_token") or "!"
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content", "!")
+        pad_id = self.tokenizer.token_to_id(pad_token)
+        self.tokenizer.enable_padding(length=self.max_length, pad_id=0 if pad_id is None else pad_id, pad_token=pad_token)
+        self.tokenizer.enable_truncation(self.max_length)
+
+    def preprocess_image(self, img: Image.Image) -> np.ndarray:
+        """(1, 3, H, W) float32 pixel_values, as OwlViTImageProcessor produces them."""
+        img = img.convert("RGB")
+        if self.do_resize:
+            h, w = self.size
+            img = img.resize((w, h), self.resample)
+        arr = np.asarray(img, dtype=np.float32)
+        if self.do_center_crop:
+            ch, cw = self.crop_size
+            top, left = max(0, (arr.shape[0] - ch) // 2), max(0, (arr.shape[1] - cw) // 2)
+            arr = arr[top : top + ch, left : left + cw]
+        arr = (arr * np.float32(self.rescale_factor) - self.mean) / self.std
+        return np.ascontiguousarray(arr.transpose(2, 0, 1)[None])
+
+    def tokenize(self, queries: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        """(input_ids, attention_mask) int64 arrays of shape (num_queries, max_length)."""
+        encodings = self.tokenizer.encode_batch(list(queries))
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        return input_ids, attention_mask
+
+    def run(self, pixel_values: np.ndarray, input_ids: np.ndarray, attention_mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(logits (1, patches, queries), pred_boxes (1, patches, 4) as normalized cx, cy, w, h)."""
+        feeds = {"pixel_values": pixel_values, "input_ids": input_ids, "attention_mask": attention_mask}
+        outputs = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})
+        named = dict(zip(self.output_names, outputs))
+        return named["logits"], named["pred_boxes"]
+
+    def detect(
+        self,
+        img: Image.Image,
+        queries: Sequence[str],
+        threshold: float = 0.05,
+        pixel_values: Optional[np.ndarray] = None,
+        size: Optional[tuple[int, int]] = None,
+    ) -> dict:
+        """
+        post_process_object_detection-style result for one image: {"scores", "labels", "boxes"}
+        as numpy arrays, boxes (x0, y0, x1, y1) in pixels of `size` (default img.size).
+        """
+        if pixel_values is None:
+            pixel_values = self.preprocess_image(img)
+        input_ids, attention_mask = self.tokenize(queries)
+        logits, pred_boxes = self.run(pixel_values, input_ids, attention_mask)
+        return post_process(logits[0], pred_boxes[0], size or img.size, threshold)
+
+
+def post_process(logits: np.ndarray, pred_boxes: np.ndarray, size: tuple[int, int], threshold: float) -> dict:
+    """Best query per patch, sigmoid score, center -> corner boxes scaled to size = (width, height)."""
+    labels = logits.argmax(axis=-1)
+    best = np.take_along_axis(logits, labels[:, None], axis=-1)[:, 0].astype(np.float64)
+    scores = 1.0 / (1.0 + np.exp(-best))
+    cx, cy, w, h = (pred_boxes[:, i].astype(np.float64) for i in range(4))
+    width, height = size
+    boxes = np.stack([(cx - 0.5 * w) * width, (cy - 0.5 * h) * height, (cx + 0.5 * w) * width, (cy + 0.5 * h) * height], axis=-1)
+    keep = scores > threshold
+    return {"scores": scores[keep], "labels": labels[keep], "boxes": boxes[keep]}
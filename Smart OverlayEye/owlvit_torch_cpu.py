@@ -0,0 +1,93 @@
+"""
+CPU-tuned torch OWL-ViT for when no ONNX model is available.
+
+Instead of a `transformers.pipeline` call per query, the model runs directly under
+`torch.inference_mode` with inputs of a fixed shape (768 x 768 pixels, queries padded to
+the tokenizer's 16 tokens), which avoids the pipeline's per-call overhead. Options:
+  - threads: intra-op thread count (0 keeps torch's default)
+  - precision: "int8" = dynamic int8 quantization of the nn.Linear layers (most of the
+    ViT and text tower), "bf16" = bfloat16 autocast (only faster on CPUs with native
+    bf16, e.g. AVX512-BF16 / AMX), "fp32" = unchanged weights (default; int8 moves scores
+    relative to the thresholds tuned on fp32, so check it with bench_owlvit_torch.py first)
+  - compile: torch.compile the forward pass and run a warmup inference so the compile cost is
+    paid at load time rather than on the first hotkey
+The attribute names match the pipeline (`model`, `image_processor`, `tokenizer`), so the
+cached-features path in owlvit_detector works with either.
+"""
+import contextlib
+from typing import Optional, Sequence
+
+from PIL import Image
+
+PRECISIONS = ("fp32", "int8", "bf16")
+_threads_set = False
+
+
+def set_torch_threads(threads: int):
+    """Intra-op threads for this process (0 = torch default); inter-op is pinned to 1 once."""
+    global _threads_set
+    import torch
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if not _threads_set:
+        _threads_set = True
+        try:
+            # One image per call: inter-op parallelism only adds scheduling overhead.
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already fixed once parallel work has started
+
+
+class OwlViTTorchCPU:
+    def __init__(
+        self,
+        model_id: str,
+        hf_token: Optional[str] = None,
+        threads: int = 0,
+        precision: str = "fp32",
+        compile: bool = False,
+    ):
+        import torch
+        from transformers import OwlViTForObjectDetection, OwlViTProcessor
+
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+        set_torch_threads(threads)
+        self.precision = precision
+        processor = OwlViTProcessor.from_pretrained(model_id, token=hf_token)
+        self.image_processor = processor.image_processor
+        self.tokenizer = processor.tokenizer
+        model = OwlViTForObjectDetection.from_pretrained(model_id, token=hf_token).eval()
+        # Text tower length (16 for the released checkpoints); tokenizers may report a huge sentinel.
+        self.max_length = min(int(self.tokenizer.model_max_length or 16), model.config.text_config.max_position_embeddings)
+        if precision == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self._forward = torch.compile(model) if compile else model
+        if compile:
+            self.detect(Image.new("RGB", (64, 64), (255, 255, 255)), ["button"], threshold=1.0)
+
+    def _autocast(self):
+        import torch
+
+        if self.precision == "bf16":
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def detect(self, img: Image.Image, queries: Sequence[str], threshold: float = 0.05) -> dict:
+        """post_process_object_detection result for one image: {"scores", "labels", "boxes"} tensors."""
+        import torch
+
+        with torch.inference_mode():
+            pixel_values = self.image_processor(images=img.convert("RGB"), return_tensors="pt")["pixel_values"]
+            text = self.tokenizer(
+                list(queries), padding="max_length", truncation=True, max_length=self.max_length, return_tensors="pt"
+            )
+            with self._autocast():
+                outputs = self._forward(pixel_values=pixel_values, input_ids=text["input_ids"], attention_mask=text["attention_mask"])
+            outputs.logits = outputs.logits.float()
+            outputs.pred_boxes = outputs.pred_boxes.float()
+            return self.image_processor.post_process_object_detection(
+                outputs, threshold=threshold, target_sizes=torch.tensor([[img.height, img.width]])
+            )[0]
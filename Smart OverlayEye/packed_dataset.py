@@ -0,0 +1,200 @@
+"""
+Packed evaluation datasets: pre-decoded frames in one memory-mapped file plus columnar labels.
+
+A regression folder (PNG screenshots + labels.json) is decoded once by `pack`; evaluation then
+maps the frames instead of PNG-decoding every screenshot on every run. Layout of a pack dir:
+  frames.bin      raw RGB frames, each starting at a 4 KiB-aligned offset
+  frames.idx.npy  offset index: one (offset, height, width) row per frame
+  labels.npz      label columns: image (file name), task, bbox (N x 4), frame (row in the index),
+                  dpr (capture device-pixel ratio from labels.json "dpr"; NaN when not recorded)
+  pack.json       format version and source
+`PackedDataset.array(i)` is a read-only view into the mapping (no copy); `image(i)` builds a PIL
+image from it with a single unpack and no decode. Threads share one mapping; a pickled
+PackedDataset re-opens the file in the child, so process pools share the page cache, not copies.
+`FolderDataset` reads the original folder through the same interface.
+
+Examples:
+  python packed_dataset.py pack regression_dataset regression_dataset.pack
+  python packed_dataset.py bench regression_dataset regression_dataset.pack
+  python eval_regression.py --dataset regression_dataset.pack
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+PACK_VERSION = 1
+ALIGN = 4096
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("height", "<u4"), ("width", "<u4")])
+
+
+def is_packed(path: Union[str, Path]) -> bool:
+    return (Path(path) / "pack.json").exists()
+
+
+def pack(src: Union[str, Path], dst: Union[str, Path]) -> dict:
+    """Decode every labelled image of a labels.json folder into a pack at `dst`; returns pack.json."""
+    src, dst = Path(src), Path(dst)
+    labels_path = src / "labels.json"
+    if not labels_path.exists():
+        raise FileNotFoundError(f"No labels.json in {src}")
+    labels = json.loads(labels_path.read_text())
+    dst.mkdir(parents=True, exist_ok=True)
+    index, files, tasks, bboxes, frames, dprs = [], [], [], [], [], []
+    offset = 0
+    with (dst / "frames.bin").open("wb") as out:
+        for fname, meta in labels.items():
+            img_path = src / fname
+            if not img_path.exists():
+                continue
+            with Image.open(img_path) as im:
+                rgb = im.convert("RGB")
+            pad = -offset % ALIGN
+            out.write(b"\0" * pad)
+            offset += pad
+            data = rgb.tobytes()
+            out.write(data)
+            index.append((offset, rgb.height, rgb.width))
+            offset += len(data)
+            files.append(fname)
+            tasks.append(meta.get("task") or "")
+            bboxes.append(tuple(meta["bbox"]))
+            frames.append(len(index) - 1)
+            dprs.append(float(meta["dpr"]) if meta.get("dpr") else np.nan)
+    np.save(dst / "frames.idx.npy", np.array(index, dtype=INDEX_DTYPE))
+    np.savez(
+        dst / "labels.npz",
+        image=np.array(files, dtype=str),
+        task=np.array(tasks, dtype=str),
+        bbox=np.array(bboxes, dtype=np.int32).reshape(-1, 4),
+        frame=np.array(frames, dtype=np.int32),
+        dpr=np.array(dprs, dtype=np.float32),
+    )
+    info = {"version": PACK_VERSION, "source": str(src), "frames": len(index), "labels": len(files), "bytes": offset, "mode": "RGB"}
+    (dst / "pack.json").write_text(json.dumps(info, indent=2))
+    return info
+
+
+class PackedDataset:
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        info = json.loads((self.path / "pack.json").read_text())
+        if info.get("version") != PACK_VERSION:
+            raise ValueError(f"Unsupported pack version {info.get('version')} in {self.path}")
+        self.info = info
+        self.index = np.load(self.path / "frames.idx.npy")
+        with np.load(self.path / "labels.npz") as cols:
+            self.files, self.tasks, self.bboxes, self.frames = (cols[k] for k in ("image", "task", "bbox", "frame"))
+            self.dprs = cols["dpr"] if "dpr" in cols.files else np.full(len(self.files), np.nan, np.float32)
+        size = (self.path / "frames.bin").stat().st_size
+        self._frames = np.memmap(self.path / "frames.bin", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def label(self, i: int) -> dict:
+        dpr = float(self.dprs[i])
+        return {
+            "file": str(self.files[i]),
+            "task": str(self.tasks[i]),
+            "bbox": tuple(int(v) for v in self.bboxes[i]),
+            "dpr": None if np.isnan(dpr) else dpr,
+        }
+
+    def array(self, i: int) -> np.ndarray:
+        """(H, W, 3) uint8 read-only view of label i's frame inside the mapping."""
+        offset, h, w = (int(v) for v in self.index[self.frames[i]])
+        return self._frames[offset : offset + h * w * 3].reshape(h, w, 3)
+
+    def image(self, i: int) -> Image.Image:
+        arr = self.array(i)
+        return Image.frombuffer("RGB", (arr.shape[1], arr.shape[0]), arr, "raw", "RGB", 0, 1)
+
+
+class FolderDataset:
+    """labels.json folder behind the PackedDataset interface (PNG decode on every image())."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        labels_path = self.path / "labels.json"
+        if not labels_path.exists():
+            raise FileNotFoundError(f"No labels.json in {self.path}")
+        labels = json.loads(labels_path.read_text())
+        self.rows = [(fname, meta) for fname, meta in labels.items() if (self.path / fname).exists()]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def label(self, i: int) -> dict:
+        fname, meta = self.rows[i]
+        dpr = meta.get("dpr")
+        return {"file": fname, "task": meta.get("task") or "", "bbox": tuple(meta["bbox"]), "dpr": float(dpr) if dpr else None}
+
+    def array(self, i: int) -> np.ndarray:
+        return np.asarray(self.image(i))
+
+    def image(self, i: int) -> Image.Image:
+        with Image.open(self.path / self.rows[i][0]) as im:
+            return im.convert("RGB")
+
+
+def open_dataset(path: Union[str, Path]):
+    """PackedDataset for a pack dir, else FolderDataset for a labels.json folder."""
+    return PackedDataset(path) if is_packed(path) else FolderDataset(path)
+
+
+def _time_loads(ds, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        for i in range(len(ds)):
+            ds.image(i).getpixel((0, 0))
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a regression dataset into a memory-mapped frame file")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_pack = sub.add_parser("pack", help="Decode a labels.json folder into a pack dir")
+    p_pack.add_argument("src")
+    p_pack.add_argument("dst")
+    p_bench = sub.add_parser("bench", help="Time loading every image from the folder vs the pack")
+    p_bench.add_argument("src")
+    p_bench.add_argument("dst")
+    p_bench.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.cmd == "pack":
+        t0 = time.perf_counter()
+        info = pack(args.src, args.dst)
+        info["pack_s"] = round(time.perf_counter() - t0, 2)
+        print(json.dumps(info, indent=2))
+        return
+    folder, packed = FolderDataset(args.src), PackedDataset(args.dst)
+    folder_ms, packed_ms = _time_loads(folder, args.repeat), _time_loads(packed, args.repeat)
+    print(
+        json.dumps(
+            {
+                "images": len(packed),
+                "folder_ms": round(folder_ms, 1),
+                "packed_ms": round(packed_ms, 1),
+                "speedup": round(folder_ms / packed_ms, 1) if packed_ms else None,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Idle-time prefetch of the task-independent work for the next hotkey.
+
+A daemon thread grabs the screen at a low rate and compares a tiny grayscale signature with the
+previous grab. Once the screen has been stable for `stable_s`, it runs `compute(img)` (OCR word data
+and OWL-ViT image features in the overlay) and keeps the result for that screen. A hotkey whose fresh
+capture is pixel-identical to the cached one then skips straight to the task-dependent steps. The
+signature only decides when the screen has settled: a new 200x60 button on a 1440p screen barely
+moves it, so reuse always needs an exact full-resolution match.
+
+Work is capped at `cpu_budget` of one core (after a compute taking T seconds the loop rests
+T * (1 / budget - 1)), and the loop backs off while the machine is loaded or a request is running.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+from PIL import Image, ImageChops, ImageStat
+
+SIGNATURE_SIZE = (64, 36)
+
+
+def screen_signature(img: Image.Image) -> Image.Image:
+    return img.convert("L").resize(SIGNATURE_SIZE, Image.BILINEAR)
+
+
+def signature_diff(a: Image.Image, b: Image.Image) -> float:
+    """Mean absolute difference (0-255) between two signatures."""
+    return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+
+
+def same_pixels(a: Image.Image, b: Image.Image) -> bool:
+    """Exact full-resolution equality (size, mode and every pixel)."""
+    if a.size != b.size or a.mode != b.mode:
+        return False
+    return ImageChops.difference(a, b).getbbox() is None
+
+
+def system_load() -> float:
+    """1-minute load average per core (0 where unavailable)."""
+    try:
+        return os.getloadavg()[0] / max(1, os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+class Prefetched(NamedTuple):
+    image: Image.Image
+    signature: Image.Image
+    result: Any
+    computed_at: float
+    compute_ms: float
+
+
+class IdlePrefetcher:
+    def __init__(
+        self,
+        capture: Callable[[], Image.Image],
+        compute: Callable[[Image.Image], Any],
+        interval_s: float = 1.0,
+        stable_s: float = 1.5,
+        cpu_budget: float = 0.25,
+        busy_load: float = 0.75,
+        max_diff: float = 1.0,
+        is_busy: Optional[Callable[[], bool]] = None,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ):
+        self.capture = capture
+        self.compute = compute
+        self.interval_s = interval_s
+        self.stable_s = stable_s
+        self.cpu_budget = max(0.01, min(1.0, cpu_budget))
+        self.busy_load = busy_load
+        self.max_diff = max_diff
+        self.is_busy = is_busy
+        self.on_event = on_event
+        self.stats = {"computed": 0, "hits": 0, "misses": 0, "backoffs": 0}
+        self._entry: Optional[Prefetched] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="overlay-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def lookup(self, img: Image.Image) -> Optional[Prefetched]:
+        """The cached entry if `img` is pixel-for-pixel the screen it was computed for."""
+        with self._lock:
+            entry = self._entry
+        if entry is not None and same_pixels(entry.image, img):
+            self.stats["hits"] += 1
+            self._emit("hit", {"age_s": round(time.monotonic() - entry.computed_at, 1)})
+            return entry
+        self.stats["misses"] += 1
+        return None
+
+    def _busy(self) -> bool:
+        if self.is_busy is not None and self.is_busy():
+            return True
+        return system_load() > self.busy_load
+
+    def _loop(self):
+        delay = backoff = self.interval_s
+        prev_sig: Optional[Image.Image] = None
+        stable_since: Optional[float] = None
+        while not self._stop.wait(delay):
+            if self._busy():
+                # Exponential back-off while the machine (or our own pipeline) is busy.
+                self.stats["backoffs"] += 1
+                backoff = min(self.interval_s * 16, backoff * 2)
+                delay, prev_sig, stable_since = backoff, None, None
+                continue
+            delay = backoff = self.interval_s
+            try:
+                img = self.capture()
+            except Exception as exc:
+                self._emit("capture_error", {"error": str(exc)})
+                delay = self.interval_s * 8
+                continue
+            sig = screen_signature(img)
+            now = time.monotonic()
+            if prev_sig is None or prev_sig.size != sig.size or signature_diff(prev_sig, sig) > self.max_diff:
+                prev_sig, stable_since = sig, now
+                continue
+            with self._lock:
+                entry = self._entry
+            if entry is not None and same_pixels(entry.image, img):
+                continue  # already computed for this screen
+            if stable_since is None or now - stable_since < self.stable_s:
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.compute(img)
+            except Exception as exc:
+                self._emit("compute_error", {"error": str(exc)})
+                continue
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._entry = Prefetched(img, sig, result, time.monotonic(), round(elapsed * 1000, 1))
+            self.stats["computed"] += 1
+            self._emit("computed", {"compute_ms": round(elapsed * 1000, 1), "size": img.size})
+            # Stay within the CPU budget: rest in proportion to the work just done.
+            delay = max(self.interval_s, elapsed * (1.0 / self.cpu_budget - 1.0))
+
+    def _emit(self, event: str, data: dict):
+        if self.on_event is not None:
+            try:
+                self.on_event(event, data)
+            except Exception:
+                pass
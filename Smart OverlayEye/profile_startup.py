@@ -0,0 +1,88 @@
+"""
+Import-time profile for the overlay entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter per module and reports
+the total import time plus the slowest top-level packages, and whether heavy backends
+(torch, transformers, onnxruntime, numpy) were pulled in at import time.
+
+Examples:
+  python profile_startup.py
+  python profile_startup.py --modules overlay_mvp --top 15 --json artifacts/startup_profile.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_PACKAGES = ("torch", "transformers", "onnxruntime", "numpy", "optimum")
+DEFAULT_MODULES = ("overlay_mvp", "eval_regression", "test_hotkey_sim")
+
+
+def profile_import(module: str) -> dict:
+    env = dict(os.environ)
+    # Importing overlay_mvp must not need a display or a keyboard hook.
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parent,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    # Lines look like: "import time:   self [us] |  cumulative | imported package"
+    top_level: dict[str, int] = {}
+    seen: set[str] = set()
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue
+        raw_name = parts[2]
+        name = raw_name.strip()
+        seen.add(name.split(".")[0])
+        # One space after the bar, then two spaces per nesting level.
+        depth = (len(raw_name) - len(raw_name.lstrip(" ")) - 1) // 2
+        if depth == 1:
+            # Direct imports made by a top-level module (the profiled one, or interpreter startup).
+            top_level[name] = max(top_level.get(name, 0), cumulative_us)
+        if name == module:
+            total_us = cumulative_us
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else None,
+        "total_ms": round(total_us / 1000, 1),
+        "top": sorted(((n, round(us / 1000, 1)) for n, us in top_level.items() if n != module), key=lambda x: -x[1]),
+        "heavy_loaded": [p for p in HEAVY_PACKAGES if p in seen],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile for overlay entry points")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=10, help="How many top-level imports to list")
+    parser.add_argument("--json", default=None, help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    reports = [profile_import(m) for m in args.modules]
+    for r in reports:
+        status = "ok" if r["ok"] else f"FAILED ({r['error']})"
+        print(f"{r['module']}: {r['total_ms']} ms [{status}]")
+        print(f"  heavy backends at import: {', '.join(r['heavy_loaded']) or 'none'}")
+        for name, ms in r["top"][: args.top]:
+            print(f"  {ms:>9.1f} ms  {name}")
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Replay recorded pipeline runs (run_store.py) through the current selection logic.
+
+Nothing is captured, OCR'd, detected or sent to the LLM again: each run's recorded OWL-ViT
+candidates, OCR word dict and raw LLM replies go back through the selection code in overlay_mvp
+(OWLVIT_MIN_SCORE + is_valid_bbox, parse_choice_index, parse_bbox_json, find_bbox_via_ocr) in the
+recorded stage order, and the replayed box is compared with the one the run showed.
+
+A run is "incomplete" when the new logic needs an output the original run never produced (e.g.
+the LLM answer is now rejected but no retry was recorded, or OWL-ViT now misses and the OCR
+stage never ran). Template hits are skipped. While recording, OWL-ViT keeps its top
+RECORD_OWL_TOP_K candidates down to RECORD_OWL_FLOOR (default 0.01), so OWLVIT_MIN_SCORE can be
+lowered to that floor; a run that recorded no candidate above a floor higher than the replayed
+threshold counts as incomplete.
+
+Examples:
+  RECORD_RUNS=1 python overlay_mvp.py                   # record while using the overlay
+  python test_hotkey_sim.py --batch shots/ --record     # or record a headless batch
+  python replay_runs.py
+  OWLVIT_MIN_SCORE=0.3 python replay_runs.py --changed artifacts/replay_changed.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+
+import overlay_mvp
+from cascade import DEFAULT_ORDER
+from overlay_mvp import RUN_STORE_DIR, find_bbox_via_ocr, is_valid_bbox, parse_bbox_json, parse_choice_index, write_log
+from run_store import RunStore
+
+
+class Incomplete(Exception):
+    """The replay needs a stage output the recorded run does not have."""
+
+
+def _steps(run: dict, stage: str) -> list[dict]:
+    return [s for s in run.get("steps") or [] if s.get("stage") == stage]
+
+
+def replay_owlvit(store: RunStore, run: dict, img_size: tuple[int, int]):
+    steps = _steps(run, "owlvit")
+    if not steps:
+        raise Incomplete("owlvit")
+    step = steps[0]
+    cands = store.get_json(step["candidates"]) if step.get("candidates") else []
+    if not cands:
+        if step.get("min_score", 0.0) > overlay_mvp.OWLVIT_MIN_SCORE:
+            raise Incomplete("owlvit_floor")
+        return None
+    bbox, label, score = cands[0]
+    if score < overlay_mvp.OWLVIT_MIN_SCORE or not is_valid_bbox(tuple(bbox), label, img_size, log=False):
+        return None
+    return tuple(bbox), f"owl:{label}", "owlvit"
+
+
+def replay_llava(store: RunStore, run: dict, img_size: tuple[int, int]):
+    verify = _steps(run, "verify")
+    if verify:
+        cands = store.get_json(verify[0]["candidates"])
+        idx = parse_choice_index(store.get_json(verify[0]["content"]), len(cands))
+        if idx is not None:
+            bbox, label, _score = cands[idx - 1]
+            return tuple(bbox), f"verify:{label}", "llava"
+    steps = _steps(run, "llm")
+    if not steps:
+        raise Incomplete("llava")
+    for n, step in enumerate(steps):
+        if "content" not in step:
+            continue  # request failed
+        parsed = parse_bbox_json(store.get_json(step["content"]), tuple(step["img_size"]))
+        if not parsed:
+            continue
+        (x, y, w, h), label = parsed
+        ox, oy = step.get("offset") or (0, 0)
+        bbox = (x + ox, y + oy, w, h)
+        if is_valid_bbox(bbox, label, img_size, log=False):
+            return bbox, label, "llava" if n == 0 else "llava_retry"
+    if len(steps) == 1 and (run.get("final") or {}).get("stage") in ("llava", "llava_retry"):
+        raise Incomplete("llava_retry")
+    return None
+
+
+def replay_ocr(store: RunStore, run: dict, img_size: tuple[int, int], ocr_data):
+    steps = _steps(run, "ocr")
+    if not steps:
+        raise Incomplete("ocr")
+    refined = store.get_json(steps[0]["refined"]) if steps[0].get("refined") else []
+    for bbox, label, _score in refined:
+        if is_valid_bbox(tuple(bbox), label, img_size, log=False):
+            return tuple(bbox), label, "ocr"
+    found = find_bbox_via_ocr(None, run["task"], ocr_data) if ocr_data is not None else None
+    if found and is_valid_bbox(found[0], found[1], img_size, log=False):
+        return tuple(found[0]), found[1], "ocr"
+    return None
+
+
+def replay_run(store: RunStore, run: dict) -> dict:
+    """Replayed outcome of one run: {"status", "bbox", "label", "stage"} (+ "missing" when incomplete)."""
+    final = run.get("final") or {}
+    if final.get("stage") == "template":
+        return {"status": "skipped"}
+    img_size = tuple(run["img_size"])
+    ocr_data = store.get_json(run["ocr_data"]) if run.get("ocr_data") else None
+    result = None
+    try:
+        for stage in run.get("order") or DEFAULT_ORDER:
+            if stage == "owlvit":
+                result = replay_owlvit(store, run, img_size)
+            elif stage == "llava":
+                result = replay_llava(store, run, img_size)
+            elif stage == "ocr":
+                result = replay_ocr(store, run, img_size, ocr_data)
+            if result:
+                break
+    except Incomplete as exc:
+        return {"status": "incomplete", "missing": str(exc)}
+    bbox, label, stage = result if result else (None, None, None)
+    was = (tuple(final["bbox"]) if final.get("bbox") else None, final.get("label"))
+    if (bbox, label) == was:
+        status = "same"
+    elif bbox is None:
+        status = "new_miss"
+    elif was[0] is None:
+        status = "new_hit"
+    else:
+        status = "changed"
+    return {"status": status, "bbox": bbox, "label": label, "stage": stage}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded runs through the current selection logic")
+    parser.add_argument("--store", default=str(RUN_STORE_DIR), help="Run store directory (RUN_STORE_DIR)")
+    parser.add_argument("--source", default=None, help="Only runs from this source (overlay / sim / sim_batch)")
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many runs")
+    parser.add_argument("--changed", default=None, help="Write runs whose outcome differs to this JSONL file")
+    parser.add_argument("--log", action="store_true", help="Keep debug_agent.log logging and parser output on (slow for large stores)")
+    args = parser.parse_args()
+
+    # parse_bbox_json and friends log every call; thousands of replays would mostly be log I/O.
+    overlay_mvp.LOG_ENABLED = args.log
+    store = RunStore(Path(args.store))
+    counts: dict[str, int] = {}
+    stages: dict[str, int] = {}
+    diffs = []
+    start = time.perf_counter()
+    n = 0
+    with contextlib.ExitStack() as quiet:
+        if not args.log:
+            # ... and print on every unparseable reply.
+            quiet.enter_context(contextlib.redirect_stdout(quiet.enter_context(open(os.devnull, "w"))))
+        for run in store.iter_runs():
+            if args.source and run.get("source") != args.source:
+                continue
+            if args.limit is not None and n >= args.limit:
+                break
+            n += 1
+            try:
+                out = replay_run(store, run)
+            except Exception as exc:
+                out = {"status": "error", "error": str(exc)}
+            counts[out["status"]] = counts.get(out["status"], 0) + 1
+            if out.get("stage"):
+                stages[out["stage"]] = stages.get(out["stage"], 0) + 1
+            if out["status"] not in ("same", "skipped"):
+                diffs.append({"id": run.get("id"), "task": run.get("task"), "source": run.get("source"), "recorded": run.get("final"), "replayed": out})
+    elapsed = time.perf_counter() - start
+
+    overlay_mvp.LOG_ENABLED = True
+    summary = {
+        "store": args.store,
+        "runs": n,
+        "outcomes": dict(sorted(counts.items())),
+        "replayed_stages": dict(sorted(stages.items())),
+        "elapsed_s": round(elapsed, 2),
+        "runs_per_s": round(n / elapsed, 1) if elapsed > 0 else None,
+        "config": overlay_mvp.selection_config(),
+    }
+    if args.changed:
+        Path(args.changed).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.changed, "w", encoding="utf-8") as f:
+            for d in diffs:
+                f.write(json.dumps(d, ensure_ascii=False) + "\n")
+        summary["changed_file"] = args.changed
+    write_log("H_eval", "replay:done", "replayed recorded runs", summary)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Content-addressed record store for pipeline runs (see replay_runs.py for the replay side).
+
+A recorded run keeps what the selection logic consumed: the capture, the OCR word dict, OWL-ViT
+candidates with scores, every raw LLM reply (bbox answers, retries, contact-sheet choices) and the
+final choice. Large values are blobs under `<root>/objects/`, zlib-compressed and named by the
+sha256 of their uncompressed bytes, so repeated screens and OCR results are stored once. Each run
+is one JSON line in `<root>/runs/<YYYY-MM-DD>.jsonl` referencing its blobs by digest.
+
+Recording is per thread of control: `recording(rec)` makes `rec` current (a ContextVar, so stage
+calls submitted with a copied context see it too) and `note_step(...)` adds a step to it, or does
+nothing when no run is being recorded. Blobs are hashed, compressed and written on a background
+thread after `finish`, off the hotkey path.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from PIL import Image
+
+_IMAGE_MAGIC = b"OEIMG1"
+
+
+def _canonical_json(obj) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class RunStore:
+    def __init__(self, root: Path, level: int = 1, cache_size: int = 256):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.runs_dir = self.root / "runs"
+        self.level = level
+        self.cache_size = cache_size
+        self._cache: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:]
+
+    def put(self, data: bytes) -> str:
+        """Store bytes once; returns their sha256 hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(zlib.compress(data, self.level))
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return zlib.decompress(self._path(digest).read_bytes())
+
+    def has(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def put_json(self, obj) -> str:
+        return self.put(_canonical_json(obj))
+
+    def get_json(self, digest: str):
+        """Decoded JSON blob; recently read digests come from a small cache (replays reuse them a lot)."""
+        with self._lock:
+            if digest in self._cache:
+                return self._cache[digest]
+        value = json.loads(self.get(digest))
+        with self._lock:
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[digest] = value
+        return value
+
+    def put_image(self, img: Image.Image) -> str:
+        """Raw pixels (not PNG): identical captures dedupe and encoding stays cheap."""
+        img = img if img.mode in ("RGB", "L") else img.convert("RGB")
+        header = _IMAGE_MAGIC + f" {img.mode} {img.width} {img.height}\n".encode("ascii")
+        return self.put(header + img.tobytes())
+
+    def get_image(self, digest: str) -> Image.Image:
+        data = self.get(digest)
+        end = data.index(b"\n")
+        _magic, mode, w, h = data[:end].decode("ascii").split(" ")
+        return Image.frombytes(mode, (int(w), int(h)), data[end + 1 :])
+
+    def append_run(self, record: dict):
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        path = self.runs_dir / f"{time.strftime('%Y-%m-%d', time.localtime(record.get('ts') or time.time()))}.jsonl"
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+    def iter_runs(self) -> Iterator[dict]:
+        if not self.runs_dir.exists():
+            return
+        for path in sorted(self.runs_dir.glob("*.jsonl")):
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line of a crashed writer
+
+    def stats(self) -> dict:
+        blobs = [p for p in self.objects.glob("*/*") if not p.name.endswith(".tmp")] if self.objects.exists() else []
+        return {"runs": sum(1 for _ in self.iter_runs()), "blobs": len(blobs), "bytes": sum(p.stat().st_size for p in blobs)}
+
+
+class RunRecorder:
+    """
+    One run being recorded. Steps keep raw Python values until the background write;
+    `blobs` fields go to the object store, other fields stay inline in the run line.
+    """
+
+    def __init__(self, store: RunStore, source: str, config: Optional[dict] = None):
+        self.store = store
+        self.record = {"id": uuid.uuid4().hex, "ts": time.time(), "source": source, "config": config or {}, "steps": []}
+        self._image: Optional[Image.Image] = None
+        self._ocr_data = None
+        self._blobs: list[tuple[dict, str, object]] = []
+        self._lock = threading.Lock()
+        self.finished = False
+
+    def begin(self, task: str, img: Image.Image):
+        self.record.update({"task": task, "img_size": list(img.size)})
+        self._image = img
+
+    def ocr(self, ocr_text: str, ocr_data: Optional[dict]):
+        self.record["ocr_text"] = ocr_text or ""
+        self._ocr_data = ocr_data
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def step(self, stage: str, blobs: Optional[dict] = None, **meta):
+        with self._lock:
+            if self.finished:
+                return  # an abandoned stage call finishing after the run was written
+            entry = {"stage": stage, **meta}
+            for key, value in (blobs or {}).items():
+                self._blobs.append((entry, key, value))
+            self.record["steps"].append(entry)
+
+    def update_last(self, stage: str, **meta):
+        """Add fields to the latest step of `stage` (e.g. the crop offset of a cropped LLM retry)."""
+        with self._lock:
+            for entry in reversed(self.record["steps"]):
+                if entry["stage"] == stage:
+                    entry.update(meta)
+                    return
+
+    def finish(self, bbox=None, label=None, stage=None):
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            self.record["final"] = {"bbox": list(bbox) if bbox else None, "label": label, "stage": stage}
+        if self._image is not None:
+            _writer().submit(self._write)
+
+    def _write(self):
+        try:
+            store = self.store
+            self.record["capture"] = store.put_image(self._image)
+            if self._ocr_data is not None:
+                self.record["ocr_data"] = store.put_json(self._ocr_data)
+            for entry, key, value in self._blobs:
+                entry[key] = store.put_json(value)
+            store.append_run(self.record)
+        except Exception as exc:
+            print(f"[run store] write failed: {exc}")
+
+
+_current: contextvars.ContextVar[Optional[RunRecorder]] = contextvars.ContextVar("run_recorder", default=None)
+_writer_pool: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+
+
+def _writer() -> ThreadPoolExecutor:
+    global _writer_pool
+    with _writer_lock:
+        if _writer_pool is None:
+            _writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-store")
+        return _writer_pool
+
+
+def flush(timeout: Optional[float] = None):
+    """Wait for pending run writes (call before a short-lived process exits)."""
+    with _writer_lock:
+        pool = _writer_pool
+    if pool is not None:
+        pool.submit(lambda: None).result(timeout)
+
+
+def current_run() -> Optional[RunRecorder]:
+    return _current.get()
+
+
+@contextmanager
+def recording(rec: Optional[RunRecorder], finish: bool = True):
+    """
+    Make `rec` the current recorder (None records nothing). On exit an unfinished run is finished
+    as a miss, unless finish=False (the run continues elsewhere, e.g. on an LLM pool thread).
+    """
+    token = _current.set(rec)
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+        if rec is not None and finish:
+            rec.finish()
+
+
+def note_step(stage: str, blobs: Optional[dict] = None, **meta):
+    rec = _current.get()
+    if rec is not None:
+        rec.step(stage, blobs, **meta)
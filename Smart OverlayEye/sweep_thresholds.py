@@ -0,0 +1,382 @@
+"""
+Threshold and cascade-policy sweep over cached raw backend outputs.
+
+Step 1 (once per dataset): every backend runs once per image and its raw output is cached. That is
+OCR lines ranked with their keyword score and confidence, OWL-ViT candidates down to a low score
+floor, and the LLM answer (plus the strict retry with --llm-retry), each with its latency.
+Step 2: a grid of OWLVIT_MIN_SCORE x MAX_BOX_FRAC x MAX_BOX_AREA_FRAC x OCR min line score x
+OCR min confidence is evaluated against those outputs for every cascade policy (stage order,
+and whether OWL-ViT takes its top box or the best valid one). The selection rules of
+is_valid_bbox / try_owlvit_detect / find_bbox_via_ocr are evaluated as NumPy array operations
+over the whole grid, so thousands of configurations cost about as much as one evaluation run.
+
+Output: hits@0.5, mean IoU and mean / p95 latency per configuration (`--csv`), the
+latency-vs-accuracy Pareto frontier, and where the current settings sit.
+
+Examples:
+  python sweep_thresholds.py --dataset regression_dataset --llm-retry
+  python sweep_thresholds.py --dataset regression_dataset.pack --no-llm --csv artifacts/sweep.csv
+  python sweep_thresholds.py --owl-min-score 0.1:0.6:0.05 --box-frac 0.25,0.33,0.5
+"""
+import argparse
+import itertools
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from cascade import DEFAULT_ORDER
+from overlay_mvp import (
+    MAX_BOX_AREA_FRAC,
+    MAX_BOX_FRAC,
+    OWLVIT_MIN_SCORE,
+    USE_OWLVIT,
+    _owlvit_kwargs,
+    call_vision_llm,
+    encode_image_png,
+    keyword_hit,
+    rank_ocr_lines,
+    read_prompt,
+    require_capture_dpr,
+    run_ocr_data,
+    strict_retry_llm,
+    task_keywords,
+    worker_owlvit_candidates,
+    write_log,
+)
+from owlvit_detector import detect_owlvit_candidates
+from packed_dataset import open_dataset
+
+# Current OCR rule: the top ranked line (every cached line has score > 0), regardless of confidence.
+OCR_MIN_LINE_SCORE = 0.0
+OCR_MIN_CONF = 0.0
+
+
+def _ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+
+def collect_image(img, task: str, gt, args, dpr=None) -> dict:
+    """Raw output and latency of every backend for one image (selection rules not applied)."""
+    row = {"task": task, "gt": list(gt), "img_size": list(img.size), "lat": {}}
+    t0 = time.perf_counter()
+    ocr_text, ocr_data = run_ocr_data(img, dpr=dpr)
+    row["lat"]["prep"] = _ms(t0)
+    t0 = time.perf_counter()
+    keywords = task_keywords(task)
+    ranked = [r for r in rank_ocr_lines(ocr_data or {}, keywords) if keyword_hit(r[3], keywords)]
+    row["lat"]["ocr"] = _ms(t0)
+    row["ocr"] = [[float(score), float(conf), list(bbox)] for score, conf, bbox, _label, _line in ranked[: args.ocr_lines]]
+
+    row["owl"] = []
+    if USE_OWLVIT:
+        t0 = time.perf_counter()
+        cands = worker_owlvit_candidates(img, task, args.owl_floor, args.owl_top_k)
+        if cands is None:
+            cands = detect_owlvit_candidates(img, task, min_score=args.owl_floor, top_k=args.owl_top_k, **_owlvit_kwargs())
+        row["lat"]["owlvit"] = _ms(t0)
+        row["owl"] = [[list(bbox), float(score)] for bbox, _label, score in cands]
+
+    if not args.no_llm:
+        context: dict = {}
+        t0 = time.perf_counter()
+        image_bytes = encode_image_png(img)
+        first = call_vision_llm(image_bytes, task, ocr_text or "", img.size, context=context, ocr_data=ocr_data)
+        row["lat"]["llava"] = _ms(t0)
+        row["llava"] = [list(first[0]), first[1]] if first else None
+        if args.llm_retry:
+            t0 = time.perf_counter()
+            retry = strict_retry_llm(img, image_bytes, task, ocr_text or "", rejected_bbox=first[0] if first else None, context=context, ocr_data=ocr_data)
+            row["lat"]["llava_retry"] = _ms(t0)
+            row["llava_retry"] = [list(retry[0]), retry[1]] if retry else None
+    return row
+
+
+def collect(dataset_path: str, cache: Path, args) -> list[dict]:
+    dataset = open_dataset(dataset_path)
+    # No screen here to read the DPR from; guessing 1.0 would skip the Retina OCR downscale.
+    require_capture_dpr(args.dpr, labelled=all(dataset.label(i)["dpr"] for i in range(len(dataset))))
+    rows = []
+    with cache.open("w", encoding="utf-8") as f:
+        for i in range(len(dataset)):
+            label = dataset.label(i)
+            task = label["task"] or read_prompt().strip() or "Highlight the primary action button."
+            row = {"file": label["file"], **collect_image(dataset.image(i), task, label["bbox"], args, label["dpr"])}
+            f.write(json.dumps(row) + "\n")
+            rows.append(row)
+            write_log("H_eval", "sweep:collect", "cached raw backend outputs", {"file": row["file"], "lat": row["lat"]})
+    return rows
+
+
+# --- Vectorized evaluation --------------------------------------------------
+def _pad(rows: list, key: str, width: int, fill) -> np.ndarray:
+    out = np.full((len(rows), width) + np.shape(fill), fill, dtype=float)
+    for n, items in enumerate(rows):
+        for k, value in enumerate(items[key][:width]):
+            out[n, k] = value
+    return out
+
+
+def _box_arrays(boxes: np.ndarray, size: np.ndarray, gt: np.ndarray):
+    """(width frac, height frac, area frac, min-size ok, IoU with gt) for boxes (N, ..., 4)."""
+    extra = boxes.ndim - 2
+    shape = (len(boxes),) + (1,) * extra
+    img_w, img_h = size[:, 0].reshape(shape), size[:, 1].reshape(shape)
+    x, y, w, h = (boxes[..., i] for i in range(4))
+    gx, gy, gw, gh = (gt[:, i].reshape(shape) for i in range(4))
+    iw = np.clip(np.minimum(x + w, gx + gw) - np.maximum(x, gx), 0, None)
+    ih = np.clip(np.minimum(y + h, gy + gh) - np.maximum(y, gy), 0, None)
+    inter = iw * ih
+    iou = inter / np.maximum(w * h + gw * gh - inter, 1e-6)
+    return w / img_w, h / img_h, (w * h) / (img_w * img_h), (w >= 4) & (h >= 4), iou
+
+
+def _valid(wf, hf, af, ok, frac: np.ndarray, area: np.ndarray) -> np.ndarray:
+    """bbox_reject_reason == None for every (frac, area) pair: shape (F, A) + box shape."""
+    f = frac.reshape((-1, 1) + (1,) * wf.ndim)
+    a = area.reshape((1, -1) + (1,) * wf.ndim)
+    return ok & (wf <= f) & (hf <= f) & (af <= a)
+
+
+class Outputs:
+    """Cached rows as arrays: N images, K OWL-ViT candidates, L OCR lines."""
+
+    def __init__(self, rows: list[dict]):
+        self.n = len(rows)
+        self.size = np.array([r["img_size"] for r in rows], dtype=float)
+        self.gt = np.array([r["gt"] for r in rows], dtype=float)
+        lat = lambda key: np.array([r["lat"].get(key, 0.0) for r in rows], dtype=float)  # noqa: E731
+        self.lat = {k: lat(k) for k in ("prep", "ocr", "owlvit", "llava", "llava_retry")}
+        k = max(1, max(len(r["owl"]) for r in rows))
+        self.owl_box = _pad([{"v": [c[0] for c in r["owl"]]} for r in rows], "v", k, (0.0, 0.0, 0.0, 0.0))
+        self.owl_score = _pad([{"v": [c[1] for c in r["owl"]]} for r in rows], "v", k, -np.inf)
+        self.owl_geo = _box_arrays(self.owl_box, self.size, self.gt)
+        lines = max(1, max(len(r["ocr"]) for r in rows))
+        self.ocr_score = _pad([{"v": [c[0] for c in r["ocr"]]} for r in rows], "v", lines, -np.inf)
+        self.ocr_conf = _pad([{"v": [c[1] for c in r["ocr"]]} for r in rows], "v", lines, -np.inf)
+        self.ocr_box = _pad([{"v": [c[2] for c in r["ocr"]]} for r in rows], "v", lines, (0.0, 0.0, 0.0, 0.0))
+        self.ocr_geo = _box_arrays(self.ocr_box, self.size, self.gt)
+        self.has_llava = any("llava" in r["lat"] for r in rows)
+        self.has_retry = any("llava_retry" in r["lat"] for r in rows)
+        self.llm = {}
+        for key in ("llava", "llava_retry"):
+            box = np.array([(r.get(key) or [[0, 0, 0, 0]])[0] for r in rows], dtype=float)
+            found = np.array([bool(r.get(key)) and str(r[key][1]).lower() != "not_found" for r in rows])
+            wf, hf, af, ok, iou = _box_arrays(box, self.size, self.gt)
+            self.llm[key] = (wf, hf, af, ok & found, iou)
+
+
+def stage_tables(out: Outputs, s: float, frac, area, ocr_score, ocr_conf, owl_pick: str) -> dict:
+    """
+    Per stage: (ok, iou, latency) arrays of shape (F, A, O, C, N) for one OWL-ViT threshold `s`,
+    i.e. whether the stage returns a valid box under each threshold combination.
+    """
+    F, A, O, C, N = len(frac), len(area), len(ocr_score), len(ocr_conf), out.n
+    grid = (F, A, O, C, N)
+    tables = {}
+
+    wf, hf, af, ok, iou = out.owl_geo
+    valid = _valid(wf, hf, af, ok, frac, area)  # (F, A, N, K)
+    above = out.owl_score >= s  # (N, K); scores are sorted, so this is a prefix
+    if owl_pick == "top":
+        owl_ok, owl_iou = valid[..., 0] & above[:, 0], np.broadcast_to(iou[:, 0], (F, A, N))
+    else:  # best valid candidate above the threshold
+        mask = valid & above
+        idx = mask.argmax(-1)
+        owl_ok = mask.any(-1)
+        owl_iou = np.take_along_axis(np.broadcast_to(iou, mask.shape), idx[..., None], -1)[..., 0]
+    tables["owlvit"] = (
+        np.broadcast_to(owl_ok[:, :, None, None, :], grid),
+        np.broadcast_to(owl_iou[:, :, None, None, :], grid),
+        np.broadcast_to(out.lat["owlvit"], grid),
+    )
+
+    if out.has_llava:
+        v1 = _valid(*out.llm["llava"][:4], frac, area)  # (F, A, N)
+        iou1 = out.llm["llava"][4]
+        if out.has_retry:
+            v2 = _valid(*out.llm["llava_retry"][:4], frac, area)
+            llm_ok, llm_iou = v1 | v2, np.where(v1, iou1, out.llm["llava_retry"][4])
+            llm_lat = out.lat["llava"] + np.where(v1, 0.0, out.lat["llava_retry"])
+        else:
+            llm_ok, llm_iou = v1, np.broadcast_to(iou1, v1.shape)
+            llm_lat = np.broadcast_to(out.lat["llava"], v1.shape)
+        tables["llava"] = tuple(np.broadcast_to(a[:, :, None, None, :], grid) for a in (llm_ok, llm_iou, llm_lat))
+
+    # OCR: the best-ranked line passing the score / confidence floors; it must itself be valid.
+    eligible = (out.ocr_score >= ocr_score.reshape(-1, 1, 1, 1)) & (out.ocr_conf >= ocr_conf.reshape(1, -1, 1, 1))  # (O, C, N, L)
+    idx = eligible.argmax(-1)  # (O, C, N)
+    has = eligible.any(-1)
+    wf, hf, af, ok, iou = out.ocr_geo
+    valid = _valid(wf, hf, af, ok, frac, area)  # (F, A, N, L)
+    picked_valid = np.take_along_axis(valid[:, :, None, None], np.broadcast_to(idx, (F, A) + idx.shape)[..., None], -1)[..., 0]
+    picked_iou = np.take_along_axis(np.broadcast_to(iou, (O, C) + iou.shape), idx[..., None], -1)[..., 0]
+    tables["ocr"] = (
+        picked_valid & has,
+        np.broadcast_to(picked_iou, grid),
+        np.broadcast_to(out.lat["ocr"], grid),
+    )
+    return tables
+
+
+def run_policy(tables: dict, order: tuple, prep_lat: np.ndarray):
+    """Cascade `order` over every grid point at once: (hit, iou, latency) arrays (F, A, O, C, N)."""
+    shape = next(iter(tables.values()))[0].shape
+    reached = np.ones(shape, dtype=bool)
+    iou = np.zeros(shape)
+    lat = np.broadcast_to(prep_lat, shape).copy()
+    for stage in order:
+        ok, stage_iou, stage_lat = tables[stage]
+        lat += np.where(reached, stage_lat, 0.0)
+        iou = np.where(reached & ok, stage_iou, iou)
+        reached &= ~ok
+    return iou >= 0.5, iou, lat
+
+
+def all_orders(stages) -> list[tuple]:
+    return [p for r in range(1, len(stages) + 1) for c in itertools.combinations(stages, r) for p in itertools.permutations(c)]
+
+
+def sweep(out: Outputs, grids: dict, orders: list[tuple], picks: list[str]) -> list[dict]:
+    frac, area, ocr_score, ocr_conf = (np.asarray(grids[k], dtype=float) for k in ("box_frac", "area_frac", "ocr_score", "ocr_conf"))
+    configs = []
+    for s in grids["owl_min_score"]:
+        for pick in picks:
+            tables = stage_tables(out, s, frac, area, ocr_score, ocr_conf, pick)
+            for order in orders:
+                if any(stage not in tables for stage in order):
+                    continue
+                hit, iou, lat = run_policy(tables, order, out.lat["prep"])
+                hits, mean_iou = hit.mean(-1), iou.mean(-1)
+                mean_lat, p95_lat = lat.mean(-1), np.percentile(lat, 95, axis=-1)
+                for fi, ai, oi, ci in np.ndindex(hits.shape):
+                    configs.append(
+                        {
+                            "order": ">".join(order),
+                            "owl_pick": pick,
+                            "owl_min_score": round(float(s), 4),
+                            "box_frac": float(frac[fi]),
+                            "area_frac": float(area[ai]),
+                            "ocr_min_score": float(ocr_score[oi]),
+                            "ocr_min_conf": float(ocr_conf[ci]),
+                            "hit_rate": round(float(hits[fi, ai, oi, ci]), 4),
+                            "mean_iou": round(float(mean_iou[fi, ai, oi, ci]), 4),
+                            "mean_ms": round(float(mean_lat[fi, ai, oi, ci]), 1),
+                            "p95_ms": round(float(p95_lat[fi, ai, oi, ci]), 1),
+                        }
+                    )
+    return configs
+
+
+def pareto_frontier(configs: list[dict]) -> list[dict]:
+    """Configs no other config beats on both mean latency and hit rate (ties: higher mean IoU)."""
+    frontier, best = [], -1.0
+    for c in sorted(configs, key=lambda c: (c["mean_ms"], -c["hit_rate"], -c["mean_iou"])):
+        if c["hit_rate"] > best:
+            frontier.append(c)
+            best = c["hit_rate"]
+    return frontier
+
+
+def parse_grid(spec: str, current: float) -> list[float]:
+    """"a,b,c" or "start:stop:step" (stop inclusive); the current setting is always included."""
+    if ":" in spec:
+        start, stop, step = (float(v) for v in spec.split(":"))
+        values = list(np.arange(start, stop + step / 2, step))
+    else:
+        values = [float(v) for v in spec.split(",") if v.strip()]
+    return sorted({round(v, 6) for v in values} | {current})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep thresholds and cascade policies over cached backend outputs")
+    parser.add_argument("--dataset", default="regression_dataset", help="labels.json folder or packed_dataset.py pack dir")
+    parser.add_argument("--cache", default="artifacts/sweep_cache.jsonl", help="Raw backend outputs (collected if missing)")
+    parser.add_argument("--recollect", action="store_true", help="Run the backends again even if --cache exists")
+    parser.add_argument("--no-llm", action="store_true", help="Collect without the vision LLM")
+    parser.add_argument("--llm-retry", action="store_true", help="Also collect the strict retry for every image")
+    parser.add_argument("--dpr", type=float, default=None, help='Capture DPR of images without a "dpr" label (default: OCR_DPR)')
+    parser.add_argument("--owl-floor", type=float, default=0.01, help="Lowest OWL-ViT score kept in the cache")
+    parser.add_argument("--owl-top-k", type=int, default=20)
+    parser.add_argument("--ocr-lines", type=int, default=10)
+    parser.add_argument("--owl-min-score", default="0.05:0.5:0.05")
+    parser.add_argument("--box-frac", default="0.2,0.25,0.33,0.4,0.5")
+    parser.add_argument("--area-frac", default="0.15,0.25,0.35,0.5")
+    parser.add_argument("--ocr-min-score", default="0,1,2,3,4")
+    parser.add_argument("--ocr-min-conf", default="0,50,70")
+    parser.add_argument("--orders", default=None, help='Stage orders to try, e.g. "owlvit,llava,ocr;ocr,owlvit" (default: all)')
+    parser.add_argument("--owl-pick", default="top,best_valid", help="OWL-ViT pick rules: top (current) and/or best_valid")
+    parser.add_argument("--csv", default=None, help="Write every configuration to this CSV")
+    parser.add_argument("--out", default="artifacts/sweep_results.json")
+    args = parser.parse_args()
+
+    cache = Path(args.cache)
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    if cache.exists() and not args.recollect:
+        rows = [json.loads(line) for line in cache.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        rows = collect(args.dataset, cache, args)
+    collect_s = time.perf_counter() - t0
+    if not rows:
+        raise SystemExit("No images to sweep")
+
+    t0 = time.perf_counter()
+    out = Outputs(rows)
+    grids = {
+        "owl_min_score": parse_grid(args.owl_min_score, OWLVIT_MIN_SCORE),
+        "box_frac": parse_grid(args.box_frac, MAX_BOX_FRAC),
+        "area_frac": parse_grid(args.area_frac, MAX_BOX_AREA_FRAC),
+        "ocr_score": parse_grid(args.ocr_min_score, OCR_MIN_LINE_SCORE),
+        "ocr_conf": parse_grid(args.ocr_min_conf, OCR_MIN_CONF),
+    }
+    stages = [s for s in DEFAULT_ORDER if s != "llava" or out.has_llava]
+    orders = [tuple(o.split(",")) for o in args.orders.split(";")] if args.orders else all_orders(stages)
+    picks = [p.strip() for p in args.owl_pick.split(",") if p.strip()]
+    configs = sweep(out, grids, orders, picks)
+    sweep_s = time.perf_counter() - t0
+
+    current = next(
+        (
+            c
+            for c in configs
+            if c["order"] == ">".join(DEFAULT_ORDER if out.has_llava else stages)
+            and c["owl_pick"] == "top"
+            and c["owl_min_score"] == round(OWLVIT_MIN_SCORE, 4)
+            and c["box_frac"] == MAX_BOX_FRAC
+            and c["area_frac"] == MAX_BOX_AREA_FRAC
+            and c["ocr_min_score"] == OCR_MIN_LINE_SCORE
+            and c["ocr_min_conf"] == OCR_MIN_CONF
+        ),
+        None,
+    )
+    frontier = pareto_frontier(configs)
+    summary = {
+        "images": out.n,
+        "configs": len(configs),
+        "collect_s": round(collect_s, 1),
+        "sweep_s": round(sweep_s, 2),
+        "llm": {"collected": out.has_llava, "retry": out.has_retry},
+        "grids": grids,
+        "current": current,
+        "current_on_frontier": current in frontier,
+        "frontier": frontier,
+    }
+    if args.csv:
+        import csv
+
+        Path(args.csv).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(configs[0].keys()))
+            writer.writeheader()
+            writer.writerows(configs)
+        summary["csv"] = args.csv
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(summary, indent=2))
+    write_log("H_eval", "sweep:done", "threshold sweep finished", {k: v for k, v in summary.items() if k not in ("frontier", "grids")})
+    print(json.dumps({k: v for k, v in summary.items() if k != "grids"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Persistent template store for the hotkey fast path.
+
+After a confident detection the target crop is saved under a task key. On later
+hotkeys the crop is located again with normalized cross-correlation: first on a
+downscaled grayscale capture, then refined at full resolution around the coarse peak.
+
+Templates are not trusted forever: an entry expires `max_age_s` after a detector last
+confirmed it (template hits do not count), and is dropped after `max_misses` queries in a
+row at its capture size where no template for the task matched (the UI has changed).
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+def _window_sums(a: np.ndarray, th: int, tw: int) -> np.ndarray:
+    # Integral image: sum of every th x tw window at each valid top-left position.
+    s = np.pad(a, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    return s[th:, tw:] - s[:-th, tw:] - s[th:, :-tw] + s[:-th, :-tw]
+
+
+def ncc_map(image: np.ndarray, tmpl: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Normalized cross-correlation of `tmpl` at every valid position of `image` (2D float arrays).
+    Returns an array of shape (ih - th + 1, iw - tw + 1) in [-1, 1], or None if the template is flat
+    or larger than the image.
+    """
+    ih, iw = image.shape
+    th, tw = tmpl.shape
+    if th > ih or tw > iw or th < 2 or tw < 2:
+        return None
+    t = tmpl.astype(np.float64) - float(tmpl.mean())
+    t_norm = float(np.sqrt((t * t).sum()))
+    if t_norm < 1e-6:
+        return None
+    img = image.astype(np.float64)
+    fh, fw = ih + th - 1, iw + tw - 1
+    spec = np.fft.rfft2(img, s=(fh, fw)) * np.fft.rfft2(t[::-1, ::-1], s=(fh, fw))
+    corr = np.fft.irfft2(spec, s=(fh, fw))[th - 1 : ih, tw - 1 : iw]
+    n = th * tw
+    s1 = _window_sums(img, th, tw)
+    s2 = _window_sums(img * img, th, tw)
+    var = np.maximum(s2 - (s1 * s1) / n, 0.0)
+    denom = np.sqrt(var) * t_norm
+    out = np.zeros_like(corr)
+    np.divide(corr, denom, out=out, where=denom > 1e-6 * t_norm)
+    return np.clip(out, -1.0, 1.0, out=out)
+
+
+def _to_gray(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def _downscale(gray: np.ndarray, factor: int) -> np.ndarray:
+    if factor <= 1:
+        return gray
+    h, w = gray.shape
+    small = Image.fromarray(gray.astype(np.uint8)).resize(
+        (max(1, w // factor), max(1, h // factor)), Image.BOX
+    )
+    return np.asarray(small, dtype=np.float32)
+
+
+class TemplateStore:
+    """
+    Templates on disk: `<root>/index.json` maps task keys to entries, crops live in `<root>/crops/`.
+    Only templates recorded at the same capture size are matched (same pixel scale / DPR).
+    Entries without a "confirmed" time (stored before expiry existed) count as expired.
+    """
+
+    def __init__(self, root: Path, max_per_task: int = 4, max_age_s: Optional[float] = 7 * 86400, max_misses: int = 5):
+        self.root = Path(root)
+        self.crops_dir = self.root / "crops"
+        self.index_path = self.root / "index.json"
+        self.max_per_task = max_per_task
+        self.max_age_s = max_age_s
+        self.max_misses = max_misses
+        self._index: dict[str, list[dict]] = {}
+        self._gray_cache: dict[str, np.ndarray] = {}
+        if self.index_path.exists():
+            try:
+                self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except Exception:
+                self._index = {}
+
+    def _save_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._index, indent=1), encoding="utf-8")
+        tmp.replace(self.index_path)
+
+    def _load_gray(self, fname: str) -> Optional[np.ndarray]:
+        arr = self._gray_cache.get(fname)
+        if arr is None:
+            path = self.crops_dir / fname
+            if not path.exists():
+                return None
+            with Image.open(path) as crop:
+                arr = _to_gray(crop)
+            self._gray_cache[fname] = arr
+        return arr
+
+    def entries(self, key: str) -> list[dict]:
+        return list(self._index.get(key, []))
+
+    def add(self, key: str, img: Image.Image, bbox: tuple[int, int, int, int], label: str) -> Optional[dict]:
+        x, y, w, h = (int(v) for v in bbox)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(img.width, x + w), min(img.height, y + h)
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            return None
+        crop = img.crop((x0, y0, x1, y1)).convert("RGB")
+        digest = hashlib.sha1(crop.tobytes()).hexdigest()[:16]
+        fname = f"{digest}_{crop.width}x{crop.height}.png"
+        self.crops_dir.mkdir(parents=True, exist_ok=True)
+        path = self.crops_dir / fname
+        if not path.exists():
+            crop.save(path, format="PNG")
+
+        items = [e for e in self._index.get(key, []) if e.get("file") != fname]
+        entry = {
+            "file": fname,
+            "bbox": [x0, y0, x1 - x0, y1 - y0],
+            "img_size": [img.width, img.height],
+            "label": label,
+            "hits": 0,
+            "misses": 0,
+            "confirmed": time.time(),
+            "last_used": time.time(),
+        }
+        items.insert(0, entry)
+        self._index[key] = items[: self.max_per_task]
+        self._save_index()
+        return entry
+
+    def match(
+        self,
+        key: str,
+        img: Image.Image,
+        min_score: float = 0.92,
+        downscale: int = 4,
+        coarse_slack: float = 0.15,
+    ) -> Optional[tuple[tuple[int, int, int, int], str, float]]:
+        """
+        Returns (bbox, label, score) for the best template above `min_score`, else None.
+        Expired entries are dropped; on a miss, every entry at this size counts one more miss.
+        """
+        if self._expire(key):
+            self._save_index_quietly()
+        items = [e for e in self._index.get(key, []) if tuple(e.get("img_size", ())) == img.size]
+        if not items:
+            return None
+        gray = _to_gray(img)
+        small_cache: dict[int, np.ndarray] = {}
+        best = None
+        for entry in items:
+            tmpl = self._load_gray(entry["file"])
+            if tmpl is None:
+                continue
+            th, tw = tmpl.shape
+            # Keep at least ~8px of template after downscaling.
+            factor = max(1, min(downscale, th // 8, tw // 8))
+            if factor not in small_cache:
+                small_cache[factor] = _downscale(gray, factor)
+            coarse = ncc_map(small_cache[factor], _downscale(tmpl, factor))
+            if coarse is None:
+                continue
+            cy, cx = np.unravel_index(int(np.argmax(coarse)), coarse.shape)
+            if coarse[cy, cx] < min_score - coarse_slack:
+                continue
+
+            # Refine at full resolution in a small window around the coarse peak.
+            margin = 2 * factor + 2
+            rx0 = max(0, cx * factor - margin)
+            ry0 = max(0, cy * factor - margin)
+            rx1 = min(gray.shape[1], cx * factor + tw + margin)
+            ry1 = min(gray.shape[0], cy * factor + th + margin)
+            fine = ncc_map(gray[ry0:ry1, rx0:rx1], tmpl)
+            if fine is None:
+                continue
+            fy, fx = np.unravel_index(int(np.argmax(fine)), fine.shape)
+            score = float(fine[fy, fx])
+            if best is None or score > best[2]:
+                best = ((int(rx0 + fx), int(ry0 + fy), int(tw), int(th)), entry, score)
+
+        if best is None or best[2] < min_score:
+            for entry in items:
+                entry["misses"] = int(entry.get("misses", 0)) + 1
+            self._index[key] = [e for e in self._index.get(key, []) if int(e.get("misses", 0)) < self.max_misses]
+            self._save_index_quietly()
+            return None
+        bbox, entry, score = best
+        entry["hits"] = int(entry.get("hits", 0)) + 1
+        entry["misses"] = 0
+        entry["last_used"] = time.time()
+        self._save_index_quietly()
+        return bbox, str(entry.get("label") or "target"), score
+
+    def _expire(self, key: str) -> bool:
+        """Drop entries of `key` not confirmed by a detector within max_age_s; True if any were dropped."""
+        if self.max_age_s is None or key not in self._index:
+            return False
+        cutoff = time.time() - self.max_age_s
+        kept = [e for e in self._index[key] if float(e.get("confirmed", 0)) >= cutoff]
+        if len(kept) == len(self._index[key]):
+            return False
+        self._index[key] = kept
+        return True
+
+    def _save_index_quietly(self):
+        try:
+            self._save_index()
+        except Exception:
+            pass
@@ -1,6 +1,10 @@
 import argparse
+import hashlib
+import json
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import mss
@@ -9,17 +13,24 @@ from PIL import ImageDraw, ImageFont, Image
 from overlay_mvp import (
     capture_screen,
     run_ocr,
-    encode_image_png,
-    call_vision_llm,
     read_prompt,
+    require_capture_dpr,
     write_log,
     reset_log,
     ARTIFACTS_DIR,
     Overlay,
     run_ocr_data,
-    find_bbox_via_ocr,
-    is_valid_bbox,
+    cascade_stages,
+    get_cascade_planner,
+    locate_cascade,
+    plan_cascade,
+    llm_stats,
+    record_run_inputs,
+    start_run_recording,
+    use_isolated_cascade_planner,
+    use_llm_slots,
 )
+from run_store import flush as flush_run_store, recording
 from PySide6 import QtWidgets, QtCore
 
 
@@ -36,6 +47,166 @@ def draw_overlay(img, bbox, label, output_path):
     img.save(output_path)
 
 
+# --- Batch mode ---------------------------------------------------------------
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+
+
+def iter_batch_items(args):
+    """
+    Yield {"id", "image", "task", "dpr"} from a JSONL manifest, or from a screenshot folder crossed
+    with a task list (one task per line; falls back to --task). "dpr" is None unless the manifest sets it.
+    """
+    if args.manifest:
+        manifest = Path(args.manifest)
+        with manifest.open("r", encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                image = Path(item["image"])
+                if not image.is_absolute():
+                    image = manifest.parent / image
+                task = item.get("task") or args.task
+                dpr = float(item["dpr"]) if item.get("dpr") else None
+                yield {"id": str(item.get("id") or f"{n}:{image.name}:{task}"), "image": image, "task": task, "dpr": dpr}
+        return
+    tasks = [args.task]
+    if args.tasks:
+        tasks = [t.strip() for t in Path(args.tasks).read_text(encoding="utf-8").splitlines() if t.strip()]
+    images = sorted(p for p in Path(args.batch).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    for image in images:
+        for ti, task in enumerate(tasks):
+            yield {"id": f"{image.name}#{ti}", "image": image, "task": task, "dpr": None}
+
+
+def stage_timings(plan) -> dict:
+    return {f"{o['stage']}_ms": o["ms"] for o in plan.outcomes}
+
+
+def run_batch(args):
+    """
+    Replay saved screenshots headlessly. Detector/OCR run on this thread with warm models (OCR once
+    per image, shared across its tasks); LLM work goes to a pool bounded by --concurrency.
+    Results stream to --results as JSONL; existing artifacts are kept.
+    """
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    results_path = Path(args.results) if args.results else outdir / f"batch_{int(time.time() * 1000)}.jsonl"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    done_ids = set()
+    if args.resume and results_path.exists():
+        with results_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done_ids.add(json.loads(line)["id"])
+                except Exception:
+                    continue
+
+    write_log("H_sim", "sim:batch_start", "batch start", {"results": str(results_path), "skip": len(done_ids)})
+    # One llama.cpp slot per concurrent request, so they neither serialize nor evict each other's KV cache.
+    use_llm_slots(args.concurrency)
+    write_lock = threading.Lock()
+    # Bounds both in-flight LLM requests and queued work (images held in memory).
+    slots = threading.BoundedSemaphore(args.concurrency * 2)
+    counts = {"done": 0, "errors": 0}
+    start = time.perf_counter()
+
+    out = results_path.open("a", encoding="utf-8")
+
+    def emit(record: dict, img: Image.Image | None = None):
+        if args.render and img is not None and record.get("bbox"):
+            render_path = outdir / "batch_overlays" / f"{Path(record['image']).stem}.{hashlib.sha1(record['id'].encode()).hexdigest()[:10]}.overlay.png"
+            render_path.parent.mkdir(parents=True, exist_ok=True)
+            draw_overlay(img.copy(), record["bbox"], record["label"], render_path)
+            record["overlay"] = str(render_path)
+        with write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts["done"] += 1
+            if counts["done"] % 50 == 0:
+                rate = counts["done"] / max(1e-6, time.perf_counter() - start)
+                print(f"[batch] {counts['done']} done ({rate:.2f}/s)")
+
+    def llm_job(record, img, plan, stages, remaining, rec):
+        try:
+            t0 = time.perf_counter()
+            with recording(rec) as rec:
+                result, _stage = planner.run(plan, stages, order=remaining, task=record["task"])
+                if rec is not None:
+                    rec.finish(*(result or ()))
+            bbox, label, backend = result if result else (None, None, "none")
+            record.update({"bbox": bbox, "label": label, "backend": backend, "plan": plan.id, "bucket": plan.bucket})
+            record["timings"].update(stage_timings(plan))
+            record["timings"]["total_ms"] = round(record["timings"].get("detect_ms", 0) + (time.perf_counter() - t0) * 1000, 1)
+            emit(record, img)
+        except Exception as exc:
+            with write_lock:
+                counts["errors"] += 1
+            record["error"] = str(exc)
+            emit(record)
+        finally:
+            slots.release()
+
+    planner = get_cascade_planner()
+    cached_path, cached_img, cached_ocr = None, None, (None, None)
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch-llm") as pool:
+        for item in iter_batch_items(args):
+            if item["id"] in done_ids:
+                continue
+            record = {"id": item["id"], "image": str(item["image"]), "task": item["task"], "timings": {}}
+            try:
+                if item["image"] != cached_path:
+                    t0 = time.perf_counter()
+                    with Image.open(item["image"]) as im:
+                        cached_img = im.convert("RGB")
+                    ocr_text, ocr_data = run_ocr_data(cached_img, dpr=item["dpr"])
+                    cached_path, cached_ocr = item["image"], (ocr_text or "", ocr_data)
+                    record["timings"]["ocr_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                img = cached_img
+                record["img_size"] = img.size
+                # Local stages planned ahead of the LLM run here; the LLM and anything after it go to the pool.
+                plan = plan_cascade(item["task"], cached_ocr[0])
+                stages = cascade_stages(img, item["task"], *cached_ocr)
+                local, remaining = plan.split_at("llava")
+                t0 = time.perf_counter()
+                rec = start_run_recording("sim_batch", force=args.record)
+                with recording(rec, finish=False):
+                    record_run_inputs(img, item["task"], cached_ocr[0], cached_ocr[1], plan)
+                    result, _stage = planner.run(plan, stages, order=local, task=item["task"], finish=not remaining)
+                if rec is not None and (result or not remaining):
+                    rec.finish(*(result or ()))
+                record["timings"].update(stage_timings(plan))
+                record["timings"]["detect_ms"] = record["timings"].get("ocr_ms", 0) + round((time.perf_counter() - t0) * 1000, 1)
+            except Exception as exc:
+                with write_lock:
+                    counts["errors"] += 1
+                record["error"] = str(exc)
+                emit(record)
+                continue
+            if result or not remaining:
+                bbox, label, backend = result if result else (None, None, "none")
+                record.update({"bbox": bbox, "label": label, "backend": backend, "plan": plan.id, "bucket": plan.bucket})
+                record["timings"]["total_ms"] = record["timings"]["detect_ms"]
+                emit(record, img)
+                continue
+            slots.acquire()
+            pool.submit(llm_job, record, img, plan, stages, remaining, rec)
+    out.close()
+    flush_run_store()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "results": str(results_path),
+        "done": counts["done"],
+        "errors": counts["errors"],
+        "elapsed_s": round(elapsed, 1),
+        "llm": llm_stats(),
+    }
+    write_log("H_sim", "sim:batch_done", "batch complete", summary)
+    print(json.dumps(summary, indent=2))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Headless hotkey simulation for overlay pipeline.")
     parser.add_argument(
@@ -48,7 +219,27 @@ def main():
         default="artifacts",
         help="Directory to store input/overlay screenshots",
     )
+    parser.add_argument("--batch", default=None, help="Batch mode: folder of saved screenshots (no live capture)")
+    parser.add_argument("--tasks", default=None, help="Batch mode: text file with one task per line (crossed with --batch images)")
+    parser.add_argument("--manifest", default=None, help='Batch mode: JSONL manifest of {"image", "task", "id"?} lines')
+    parser.add_argument("--results", default=None, help="Batch mode: JSONL output (default: <outdir>/batch_<ts>.jsonl)")
+    parser.add_argument("--dpr", type=float, default=None, help='Batch mode: capture DPR of the screenshots (default: manifest "dpr", then OCR_DPR)')
+    parser.add_argument("--concurrency", type=int, default=2, help="Batch mode: max concurrent LLM requests")
+    parser.add_argument("--render", action="store_true", help="Batch mode: also save rendered overlay PNGs")
+    parser.add_argument("--resume", action="store_true", help="Batch mode: skip ids already present in --results")
+    parser.add_argument("--record", action="store_true", help="Record runs for replay_runs.py (same as RECORD_RUNS=1)")
+    parser.add_argument(
+        "--adaptive", action="store_true", help="Let the cascade planner reorder backends (in-memory history only; default: fixed order)"
+    )
     args = parser.parse_args()
+    # Simulated runs neither read nor feed the overlay's cascade history.
+    use_isolated_cascade_planner(adaptive=args.adaptive)
+
+    if args.batch or args.manifest:
+        # Saved screenshots: no screen to read their DPR from, and 1.0 would skip the Retina OCR downscale.
+        require_capture_dpr(args.dpr, labelled=bool(args.manifest) and all(item["dpr"] for item in iter_batch_items(args)))
+        run_batch(args)
+        return
 
     outdir = Path(args.outdir)
     # clean all artifacts on start
@@ -70,45 +261,27 @@ def main():
 
     write_log("H_sim", "sim:start", "simulation start", {"task": args.task, "outdir": str(outdir)})
 
+    # The OCR preprocessing reads this screen's DPR through Qt.
+    QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
     img = capture_screen()
     img.save(input_path, format="PNG")
     ocr_text, ocr_data = run_ocr_data(img)
     if ocr_text is None:
         ocr_text = ""
     user_task = args.task or read_prompt().strip() or "Highlight the primary action button."
-    image_bytes = encode_image_png(img)
-
-    result = call_vision_llm(image_bytes, user_task, ocr_text, img.size)
-    if result:
-        bbox, label = result
-    else:
-        bbox, label = (0, 0, 0, 0), "not_found"
-
-    if not is_valid_bbox(bbox, label, img.size):
-        strict_task = user_task + " (Return a tight box under one-third width/height/area; avoid full-screen; if unsure return not_found.)"
-        retry = call_vision_llm(image_bytes, strict_task, ocr_text, img.size)
-        if retry:
-            bbox, label = retry
-        write_log(
-            "H_sim",
-            "sim:retry_strict",
-            "retry with stricter constraints",
-            {"bbox": bbox, "label": label, "img_size": img.size},
-        )
-
-    if not is_valid_bbox(bbox, label, img.size):
-        fallback = find_bbox_via_ocr(img, user_task, ocr_data)
-        if fallback:
-            bbox, label = fallback
-            write_log(
-                "H_sim",
-                "sim:fallback_ocr",
-                "using ocr fallback",
-                {"bbox": bbox, "label": label, "img_size": img.size},
-            )
-        else:
-            write_log("H_sim", "sim:no_result", "no bbox result", {})
-            return
+
+    with recording(start_run_recording("sim", force=args.record)):
+        bbox, label, backend, plan = locate_cascade(img, user_task, ocr_text, ocr_data)
+    flush_run_store()
+    write_log(
+        "H_sim",
+        "sim:cascade",
+        "planned backend order finished",
+        {"bbox": bbox, "label": label, "backend": backend, "order": plan.order, "outcomes": plan.outcomes, "img_size": img.size},
+    )
+    if bbox is None:
+        write_log("H_sim", "sim:no_result", "no bbox result", {})
+        return
     draw_overlay(img.copy(), bbox, label, overlay_path)
     # Simulate "after overlay shown" screenshot by using the composited overlay image
     draw_overlay(img.copy(), bbox, label, after_path)
@@ -116,7 +289,7 @@ def main():
         "H_sim",
         "sim:done",
         "simulation complete",
-        {"bbox": bbox, "label": label, "input": str(input_path), "overlay": str(overlay_path), "after": str(after_path)},
+        {"bbox": bbox, "label": label, "backend": backend, "input": str(input_path), "overlay": str(overlay_path), "after": str(after_path)},
     )
 
     # Optional live capture via Qt overlay to mimic interactive path (default on; set HEADLESS_LIVE_CAPTURE=0 to disable)
@@ -146,7 +319,7 @@ def main():
                         "live capture failed",
                         {"error": str(exc2)},
                     )
-                overlay.hide()
+                overlay.clear_box()
                 app.quit()
 
             QtCore.QTimer.singleShot(400, grab_and_quit)
@@ -34,36 +34,64 @@ def generate_tmr_cue(output_path="tmr_cue.wav", duration=1.5, frequency=440, sam
     print(f"Generated TMR cue: {output_path}")
     return output_path
 
-def generate_pink_noise(output_path="pink_noise.wav", duration=300, sample_rate=44100):
+def pink_noise_blocks(num_samples, sample_rate=44100, block_size=65536, rows=16, seed=None):
+    """
+    Yield pink noise (unit variance, float64) in blocks of at most `block_size` samples.
+    
+    Voss-McCartney: row k holds a white value that is redrawn every 2^(k+1) samples, and the
+    rows plus one per-sample white value are summed, giving ~1/f down to about
+    sample_rate / 2^(rows+1) Hz. Only the current value of each row is carried between blocks,
+    so memory does not depend on duration.
+    """
+    rng = np.random.default_rng(seed)
+    # Per row: update index and value of the value currently held
+    held_index = np.full(rows, -1, dtype=np.int64)
+    held_value = np.zeros(rows)
+    scale = 1 / np.sqrt(rows + 1)
+    for start in range(0, num_samples, block_size):
+        n = np.arange(start, min(start + block_size, num_samples), dtype=np.int64)
+        block = rng.standard_normal(len(n))
+        for k in range(rows):
+            # Row k is redrawn at samples n = 2^k (mod 2^(k+1)); m counts its redraws so far
+            m = (n + (1 << k)) >> (k + 1)
+            first, last = m[0], m[-1]
+            values = rng.standard_normal(last - first + 1)
+            if first == held_index[k]:
+                values[0] = held_value[k]
+            block += values[m - first]
+            held_index[k], held_value[k] = last, values[-1]
+        yield block * scale
+
+def generate_pink_noise(output_path="pink_noise.wav", duration=300, sample_rate=44100,
+                        subtype="PCM_16", amplitude=0.3, fade_duration=2.0,
+                        block_size=65536, seed=None):
     """
     Generate pink noise for background during sleep.
     Pink noise enhances slow-wave activity and can improve TMR effectiveness.
-    """
-    # Generate white noise
-    white_noise = np.random.randn(int(sample_rate * duration))
     
-    # Apply pink noise filter (1/f filter)
-    # Simplified pink noise generation
-    fft = np.fft.rfft(white_noise)
-    frequencies = np.fft.rfftfreq(len(white_noise), 1/sample_rate)
-    # Avoid division by zero
-    frequencies[0] = 1
-    pink_filter = 1 / np.sqrt(frequencies)
-    pink_filter[0] = 0
-    pink_fft = fft * pink_filter
-    pink_noise = np.fft.irfft(pink_fft, len(white_noise))
+    Streams block by block (see pink_noise_blocks) into the file, so memory stays constant
+    and all-night tracks are fine. subtype: "PCM_16" (int16) or "FLOAT" (float32).
+    Files over 4 GB are written as RF64, since plain WAV cannot hold them.
+    """
+    num_samples = int(sample_rate * duration)
+    fade_samples = max(1, min(int(fade_duration * sample_rate), num_samples // 2))
+    # Peak ~4.5 standard deviations; the rare sample beyond is clipped
+    gain = amplitude / 4.5
     
-    # Normalize
-    pink_noise = pink_noise / np.max(np.abs(pink_noise)) * 0.3  # Low volume
+    sample_bytes = 2 if subtype == "PCM_16" else 4
+    file_format = "RF64" if num_samples * sample_bytes >= 2**32 - 1024 else "WAV"
     
-    # Apply fade in/out
-    fade_samples = int(2 * sample_rate)  # 2 second fade
-    envelope = np.ones_like(pink_noise)
-    envelope[:fade_samples] = np.linspace(0, 1, fade_samples)
-    envelope[-fade_samples:] = np.linspace(1, 0, fade_samples)
-    pink_noise = pink_noise * envelope
+    position = 0
+    with sf.SoundFile(output_path, "w", samplerate=sample_rate, channels=1,
+                      subtype=subtype, format=file_format) as f:
+        for block in pink_noise_blocks(num_samples, sample_rate, block_size, seed=seed):
+            n = np.arange(position, position + len(block))
+            # Fade in/out envelope, computed only for this block's samples
+            envelope = np.clip(np.minimum(n, num_samples - 1 - n) / fade_samples, 0, 1)
+            block = np.clip(block * gain * envelope, -amplitude, amplitude)
+            f.write(block.astype(np.float32))
+            position += len(block)
     
-    sf.write(output_path, pink_noise, sample_rate)
     print(f"Generated pink noise: {output_path}")
     return output_path
 